@@ -0,0 +1,14 @@
+"""
+Script della pipeline delle novità librarie.
+
+I moduli si importano tra loro per nome semplice (`from catalog_db import ...`),
+come quando vengono lanciati direttamente: importando il pacchetto la cartella
+viene aggiunta a sys.path, così funziona anche `python -m scripts <comando>`.
+"""
+
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
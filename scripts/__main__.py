@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Punto d'ingresso unico della pipeline:
+
+    python -m scripts <comando> [argomenti]
+
+Ogni comando importa solo il modulo che gli serve, e quindi carica pandas,
+python-docx o BeautifulSoup solo se li usa davvero: i passaggi leggeri
+(link Anna's Archive, esportazione del catalogo, ...) partono in pochi
+millisecondi. I moduli restano importabili come libreria e lanciabili
+singolarmente come prima.
+"""
+
+import os
+import sys
+import importlib
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+if SCRIPT_DIR not in sys.path:
+    sys.path.insert(0, SCRIPT_DIR)
+
+# comando: (modulo o file .py relativo a scripts/, funzione, accetta argomenti, descrizione)
+COMMANDS = {
+    "scraper-it": ("scraper_libri_italiani_links", "main", False, "scraping delle novità IBS nel CSV"),
+    "scraper-us": ("scraper_libri_americani_links", "main", False, "scraping delle novità Amazon nel CSV"),
+    "report-docx": ("organizza_dati_links", "main", False, "documento Word con le novità dai CSV"),
+    "catalogo": ("genera_books_json", "main", False, "unisce i CSV al catalogo SQLite"),
+    "schede-ibs": ("ibs_details", "main", False, "ISBN, data, copertina, editore e pagine dalle schede IBS"),
+    "annas-archive": ("aggiungi_annas_archive", "enrich_books_with_annas_archive", False,
+                      "link di ricerca su Anna's Archive"),
+    "date-uscita": ("update_release_dates", "main", False, "date di uscita da Google"),
+    "cerca-copertine": ("../data/aggiungi_copertine.py", "main", False, "URL delle copertine mancanti"),
+    "copertine": ("aggiungi_copertine", "main", False, "scarica le immagini delle copertine"),
+    "db": ("catalog_db", "main", True, "export/import di books.json dal catalogo"),
+    "shards": ("site_shards", "main", True, "shard JSON precompressi per il sito"),
+    "wire": ("wire_format", "main", True, "formato compatto del catalogo (encode/decode)"),
+    "prezzi": ("prices", "main", True, "ribassi di prezzo e serie storiche per libro"),
+    "storico": ("catalog_history", "main", True, "storico dei delta del catalogo e query per data"),
+    "update-books": ("update_books", "main", True, "pipeline completa come DAG di stadi"),
+    "build": ("build_cache", "main", True, "passaggi del workflow saltati se gli input non cambiano"),
+    "metriche": ("run_metrics", "main", True, "confronto delle metriche tra esecuzioni"),
+    "replay": ("http_replay", "main", True, "server locale che riproduce le risposte HTTP registrate"),
+    "bench-parser": ("bench_parser", "main", True, "benchmark dei parser degli elenchi"),
+    "bench-normalize": ("bench_normalize", "main", True, "benchmark della normalizzazione dei CSV"),
+    "bench-docx": ("bench_docx", "main", True, "benchmark delle tabelle del report DOCX"),
+    "bench-wire": ("bench_wire", "main", True, "benchmark del formato compatto contro books.json"),
+    "bench-pipeline": ("bench_pipeline", "main", True, "pipeline completa offline su risposte registrate"),
+    "bench-startup": ("bench_startup", "main", True, "tempo di avvio e di import di ogni comando"),
+}
+
+
+def _import(target):
+    if not target.endswith(".py"):
+        return importlib.import_module(target)
+    path = os.path.normpath(os.path.join(SCRIPT_DIR, target))
+    name = os.path.splitext(os.path.basename(path))[0] + "_" + os.path.basename(os.path.dirname(path))
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_command(name):
+    """Importa il modulo del comando e restituisce (funzione, accetta_argomenti)."""
+    target, function, takes_args, _ = COMMANDS[name]
+    return getattr(_import(target), function), takes_args
+
+
+def usage():
+    lines = ["Uso: python -m scripts <comando> [argomenti]", "", "Comandi:"]
+    for name, (_, _, _, description) in COMMANDS.items():
+        lines.append(f"  {name:<16}{description}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(usage())
+        return 0 if argv else 2
+    if argv[0] not in COMMANDS:
+        print(f"[!] Comando sconosciuto: {argv[0]}\n")
+        print(usage())
+        return 2
+
+    function, takes_args = load_command(argv[0])
+    if takes_args:
+        result = function(argv[1:])
+    elif len(argv) > 1:
+        print(f"[!] Il comando {argv[0]} non accetta argomenti")
+        return 2
+    else:
+        result = function()
+    return result if isinstance(result, int) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
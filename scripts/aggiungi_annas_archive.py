@@ -1,28 +1,25 @@
-import json
-import os
 from urllib.parse import quote
 
-BOOKS_PATH = os.path.join(os.path.dirname(__file__), "../data/books.json")
+from catalog_db import open_catalog
+import run_metrics
 
 def build_annas_link(title, author):
     query = quote(f"{title} {author}")
     return f"https://annas-archive.org/search?q={query}"
 
 def enrich_books_with_annas_archive():
-    if not os.path.exists(BOOKS_PATH):
-        print("[!] File books.json non trovato")
-        return
+    with run_metrics.stage("annas_archive"), open_catalog() as catalog:
+        # Solo i libri nuovi o modificati dall'ultima importazione (o ancora senza link)
+        books = list(catalog.books("COALESCE(dirty, 1) = 1 OR annas_link IS NULL OR annas_link = ''"))
 
-    with open(BOOKS_PATH, "r", encoding="utf-8") as f:
-        books = json.load(f)
+        for book in books:
+            annas_url = build_annas_link(book["title"], book["author"])
+            catalog.update(book["id"], annas_link=annas_url)  # Aggiungiamo il link sempre, anche se il risultato può essere vuoto
+        run_metrics.incr("records_in", len(books))
+        run_metrics.incr("records_out", len(books))
 
-    for book in books:
-        annas_url = build_annas_link(book["title"], book["author"])
-        book["annas_link"] = annas_url  # Aggiungiamo il link sempre, anche se il risultato può essere vuoto
-
-    with open(BOOKS_PATH, "w", encoding="utf-8") as f:
-        json.dump(books, f, ensure_ascii=False, indent=2)
-        print("[✓] books.json aggiornato con link Anna's Archive")
+    run_metrics.write_report()
+    print(f"[✓] Catalogo aggiornato con link Anna's Archive ({len(books)} libri)")
 
 if __name__ == "__main__":
     enrich_books_with_annas_archive()
@@ -1,34 +1,15 @@
 import os
-import json
-import time
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import quote_plus, urljoin
-from concurrent.futures import ThreadPoolExecutor
 import re
 
-BOOKS_PATH = os.path.join(os.path.dirname(__file__), "../data/books.json")
+from catalog_db import open_catalog
+from cover_downloader import CoverDownloader
+import run_metrics
 
 
 def sanitize_filename(filename):
     return re.sub(r'[\/*?:"<>|]', "", filename)
 
-def download_image(url, filename):
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, stream=True)
-        if response.status_code == 200:
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(1024):
-                    f.write(chunk)
-            print(f"Downloaded: {filename}")
-            return True
-        return False
-    except Exception as e:
-        print(f"Download error: {e}")
-        return False
-
-def process_book(book):
+def process_book(book, downloader):
     title = book.get('title', '')
     author = book.get('author', '')
     cover_url = book.get('cover') or book.get('cover_url')
@@ -38,30 +19,40 @@ def process_book(book):
         return
 
     file_name = f"{sanitize_filename(title)}_{sanitize_filename(author)}.jpg"
-    path = os.path.join(os.path.dirname(__file__), "..", "book_covers", file_name)
+    path = os.path.join(downloader.covers_dir, file_name)
 
+    # Il nome leggibile viene creato solo a download completato
     if os.path.exists(path):
         print(f"Copertina già esistente per: {title}")
+        downloader.stats.add(skipped=1)
         return
 
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    download_image(cover_url, path)
+    object_path = downloader.download(cover_url)
+    if object_path:
+        downloader.link(object_path, file_name)
+        print(f"Downloaded: {path}")
 
 def main():
-    if not os.path.exists(BOOKS_PATH):
-        print(f"File non trovato: {BOOKS_PATH}")
-        return
-
     try:
-        with open(BOOKS_PATH, 'r', encoding='utf-8') as f:
-            books = json.load(f)
+        with open_catalog() as catalog:
+            books = list(catalog.books("cover IS NOT NULL AND cover != ''"))
     except Exception as e:
-        print(f"Errore nel caricamento del file JSON: {e}")
+        print(f"Errore nel caricamento del catalogo: {e}")
         return
 
+    with run_metrics.stage("copertine"):
+        download_covers(books)
+    run_metrics.write_report()
+
+def download_covers(books):
+    """Scarica le copertine dei libri indicati e restituisce le statistiche."""
     print(f"Trovati {len(books)} libri. Inizio download copertine...")
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        executor.map(process_book, books)
+    downloader = CoverDownloader()
+    downloader.map(lambda book: process_book(book, downloader), books)
+    print(downloader.stats.summary())
+    run_metrics.incr("records_in", len(books))
+    run_metrics.incr("records_out", downloader.stats.downloaded + downloader.stats.deduplicated)
+    return downloader.stats
 
 if __name__ == "__main__":
     main()
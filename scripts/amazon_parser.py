@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Estrattore lineare per le pagine "new releases" di Amazon basato su lxml.
+
+Invece di risalire da ogni link /dp/ fino a 5 antenati cercando prezzo o
+stelle nell'intero sottoalbero, un primo passaggio marca gli antenati di ogni
+testo con prezzo o valutazione; un secondo passaggio sui link trova il
+contenitore del prodotto come primo antenato marcato (stessa regola di
+scraper_libri_americani_links.parse_book_data_bs4). I libri vengono
+deduplicati per ASIN, che non cambia con i parametri ref/tracking del link.
+"""
+
+import re
+import logging
+from urllib.parse import urljoin
+
+from lxml import etree, html as lxml_html
+
+from book_ids import extract_asin
+
+# Testi che identificano un contenitore di prodotto
+XP_MARKER_TEXTS = etree.XPath("//text()[contains(., '$') or contains(., 'out of 5 stars')]")
+RE_MARKER = re.compile(r'\$\d+\.\d+|out of 5 stars')
+
+XP_PRODUCT_LINKS = etree.XPath("//a[contains(@href, '/dp/')]")
+XP_FIRST_IMG = etree.XPath(".//img[1]")
+XP_TITLE = etree.XPath(".//*[(self::div or self::span) and contains(@class, 'title')]")
+XP_AUTHOR = etree.XPath(
+    ".//*[(self::a and contains(@href, 'field-author'))"
+    " or ((self::span or self::div) and contains(@class, 'author'))]"
+)
+
+RE_PRICE = re.compile(r'\$(\d+\.\d+)')
+
+MAX_RISALITA = 5
+
+
+def _marked_ancestors(root):
+    """Insieme degli elementi che contengono un prezzo o una valutazione.
+    Ogni elemento viene visitato al più una volta: la risalita si ferma al primo
+    antenato già marcato."""
+    marked = set()
+    for text in XP_MARKER_TEXTS(root):
+        if not RE_MARKER.search(text):
+            continue
+        # Il testo "tail" appartiene al genitore dell'elemento che lo precede
+        element = text.getparent().getparent() if text.is_tail else text.getparent()
+        while element is not None and element not in marked:
+            marked.add(element)
+            element = element.getparent()
+    return marked
+
+
+def _find_tiles(root):
+    """Restituisce (contenitore, link, asin) per ogni prodotto, una sola volta per ASIN."""
+    marked = _marked_ancestors(root)
+    seen = set()
+    tiles = []
+    for link in XP_PRODUCT_LINKS(root):
+        href = link.get('href', '')
+        if any(nav in href for nav in ['javascript', '#']) or not XP_FIRST_IMG(link):
+            continue
+        asin = extract_asin(href)
+        if not asin or asin in seen:
+            continue
+        container = link.getparent()
+        for _ in range(MAX_RISALITA):
+            if container is None:
+                break
+            if container in marked:
+                seen.add(asin)
+                tiles.append((container, link, asin))
+                break
+            container = container.getparent()
+    return tiles
+
+
+def parse_books(html_content, categoria, base_url):
+    """Estrae i libri della pagina, con la stessa firma di parse_book_data."""
+    if not html_content:
+        return []
+
+    root = lxml_html.fromstring(html_content)
+    tiles = _find_tiles(root)
+    logging.info(f"Trovati {len(tiles)} possibili contenitori di libri")
+
+    books = []
+    for container, link, asin in tiles:
+        try:
+            title = XP_FIRST_IMG(link)[0].get('alt', '').strip()
+            if not title:
+                title_elems = XP_TITLE(container)
+                title = title_elems[0].text_content().strip() if title_elems else "Titolo non disponibile"
+
+            purchase_link = urljoin(base_url, link.get('href'))
+
+            author_elems = XP_AUTHOR(container)
+            author = author_elems[0].text_content().strip() if author_elems else "Autore non disponibile"
+
+            price_match = RE_PRICE.search(container.text_content())
+            price = f"${price_match.group(1)}" if price_match else "Prezzo non disponibile"
+
+            books.append({
+                'titolo': title,
+                'autore': author,
+                'prezzo': price,
+                'categoria': categoria,
+                'link_acquisto': purchase_link,
+                'asin': asin
+            })
+        except Exception as e:
+            logging.error(f"Errore durante l'estrazione dei dati di un libro: {e}")
+
+    return books
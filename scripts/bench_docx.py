@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del report DOCX: tabelle riga per riga contro costruzione in blocco.
+
+Replica i CSV degli scraper fino a `--rows` righe (per ogni valore indicato) e
+confronta la versione precedente di create_document (`add_row` e `.text` su
+ogni cella, tenuta qui come riferimento) con organizza_dati_links.build_document
+(docx_tables): tempo di costruzione, tempo di salvataggio e dimensione del file.
+Verifica che il testo delle tabelle sia identico e che ogni link d'acquisto sia
+diventato un hyperlink.
+
+Uso:
+    python -m scripts bench-docx [--rows 1000 10000] [--repeat 1]
+"""
+
+import io
+import sys
+import time
+import zipfile
+import argparse
+
+import pandas as pd
+
+import organizza_dati_links as report
+from bench_normalize import synthetic_sources
+
+
+def _legacy_table(doc, books, headers, columns):
+    """Tabella costruita come prima: una riga e una cella alla volta."""
+    from docx.shared import RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.enum.table import WD_ALIGN_VERTICAL
+
+    table = doc.add_table(rows=1, cols=len(headers))
+    table.style = 'Table Grid'
+    header_cells = table.rows[0].cells
+    for cell, header in zip(header_cells, headers):
+        cell.text = header
+        cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
+        for run in cell.paragraphs[0].runs:
+            run.bold = True
+    for book in books.itertuples(index=False):
+        row_cells = table.add_row().cells
+        for i, column in enumerate(columns):
+            value = getattr(book, column)
+            row_cells[i].text = value if not pd.isna(value) else report.MISSING_TEXT[column]
+        link_cell = row_cells[len(columns)]
+        if book.link_acquisto and not pd.isna(book.link_acquisto):
+            link_cell.text = ""
+            p = link_cell.paragraphs[0]
+            run = p.add_run("Link")
+            run.font.color.rgb = RGBColor(0, 0, 255)
+            run.underline = True
+            p.add_run(" (Clicca per acquistare)")
+        else:
+            link_cell.text = "Non disponibile"
+        for cell in row_cells:
+            cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
+    doc.add_paragraph()
+
+
+def legacy_document(df_italian, df_american):
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading('Novità Libri degli Ultimi 30 Giorni', level=0)
+    for categoria in report.CATEGORIE:
+        doc.add_page_break()
+        doc.add_heading(f"Categoria: {categoria.capitalize()}", level=1)
+        for label, df, headers, columns in (
+                ("Libri Italiani", df_italian, report.ITALIAN_HEADERS, report.ITALIAN_COLUMNS),
+                ("Libri Americani", df_american, report.AMERICAN_HEADERS, report.AMERICAN_COLUMNS)):
+            books = df[df['categoria'] == categoria] if not df.empty else df
+            if not books.empty:
+                doc.add_heading(label, level=2)
+                _legacy_table(doc, books, headers, columns)
+    return doc
+
+
+def table_texts(doc):
+    return [[[cell.text for cell in row.cells] for row in table.rows] for table in doc.tables]
+
+
+def saved(doc):
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def hyperlinks(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.read('word/document.xml').count(b'<w:hyperlink ')
+
+
+def measure(build, repeat):
+    best_build = best_save = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        doc = build()
+        built = time.perf_counter()
+        data = saved(doc)
+        done = time.perf_counter()
+        best_build = built - start if best_build is None else min(best_build, built - start)
+        best_save = done - built if best_save is None else min(best_save, done - built)
+    return best_build, best_save, doc, data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark delle tabelle del report DOCX")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    ok = True
+    print(f"{'righe':>7}  {'versione':<9}{'costruzione':>12}{'salvataggio':>12}{'file':>10}{'link':>8}  speedup  tabelle identiche")
+    for rows in args.rows:
+        df_italian, df_american = report.clean_data(*synthetic_sources(rows))
+        links = int(df_italian['link_acquisto'].notna().sum() + df_american['link_acquisto'].notna().sum())
+        results = {}
+        for name, build in (("righe", lambda: legacy_document(df_italian, df_american)),
+                            ("blocco", lambda: report.build_document(df_italian, df_american))):
+            results[name] = measure(build, args.repeat)
+        same = table_texts(results["righe"][2]) == table_texts(results["blocco"][2])
+        ok = ok and same and hyperlinks(results["blocco"][3]) == links
+        base = results["righe"][0] + results["righe"][1]
+        for name, (build_s, save_s, _, data) in results.items():
+            speedup = base / (build_s + save_s)
+            check = ("sì" if same else "NO") if name == "blocco" else ""
+            print(f"{len(df_italian) + len(df_american):>7}  {name:<9}{build_s * 1000:>10.0f}ms{save_s * 1000:>10.0f}ms"
+                  f"{len(data) / 1024:>8.0f}KiB{hyperlinks(data):>8}  {speedup:>6.1f}x  {check}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark della normalizzazione CSV → catalogo su cataloghi pluriennali.
+
+Replica i CSV degli scraper fino a `--rows` righe (titoli resi distinti per
+ogni "giorno" simulato) e confronta la versione riga per riga precedente
+(`apply`/`iterrows`, tenuta qui come riferimento) con quella colonnare di
+book_frames: tempo, picco di memoria (tracemalloc) e memoria del DataFrame
+risultante, verificando che l'output sia identico.
+
+Uso:
+    python scripts/bench_normalize.py [--rows 50000] [--repeat 3]
+"""
+
+import sys
+import time
+import argparse
+import tracemalloc
+
+import pandas as pd
+
+import book_frames
+import genera_books_json
+import organizza_dati_links
+
+
+def _records_rowwise(df_italian, df_american):
+    """records_from_frames con annas_link calcolato da apply(axis=1), come prima."""
+    df_list = []
+    if df_italian is not None and not df_italian.empty:
+        df_italian = df_italian.copy()
+        df_italian["origin"] = "IT"
+        df_italian = df_italian.rename(columns={"titolo": "title", "autore": "author"})
+        df_list.append(df_italian[["title", "author", "categoria", "link_acquisto", "origin"]])
+    if df_american is not None and not df_american.empty:
+        df_american = df_american.copy()
+        df_american["origin"] = "US"
+        df_american = df_american.rename(columns={"titolo": "title", "autore": "author"})
+        df_american["categoria"] = df_american.get("categoria", "Various")
+        df_list.append(df_american[["title", "author", "categoria", "link_acquisto", "origin"]])
+    df_all = pd.concat(df_list, ignore_index=True).fillna("")
+    df_all["annas_link"] = df_all.apply(
+        lambda row: genera_books_json.build_annas_link(row["title"], row["author"]), axis=1)
+    return df_all
+
+
+def _clean_rowwise(df_italian, df_american):
+    """clean_data riga per riga, come prima."""
+    df_italian = df_italian[df_italian['titolo'].notna()].copy()
+    df_italian['titolo'] = df_italian['titolo'].apply(
+        lambda x: x.strip() if isinstance(x, str) else "Titolo non disponibile")
+    df_italian['link_acquisto'] = df_italian['link_acquisto'].apply(
+        lambda x: x if isinstance(x, str) and x.strip() else None)
+    df_italian['paese'] = 'Italia'
+
+    df_american = df_american[df_american['titolo'].notna()].copy()
+    df_american['titolo'] = df_american['titolo'].apply(
+        lambda x: x if x != "Titolo non disponibile" else "Libro americano")
+    df_american['link_acquisto'] = df_american['link_acquisto'].apply(
+        lambda x: x if isinstance(x, str) and x.strip() else None)
+    df_american['paese'] = 'USA'
+    return df_italian, df_american
+
+
+def _rows_rowwise(df):
+    return [tuple(book) for _, book in df.iterrows()]
+
+
+def _rows_columnar(df):
+    return [tuple(book) for book in df.itertuples(index=False)]
+
+
+def synthetic_sources(rows):
+    """CSV degli scraper replicati fino a circa `rows` righe complessive."""
+    df_italian = pd.read_csv(genera_books_json.ITALIAN_CSV, dtype=str)
+    df_american = pd.read_csv(genera_books_json.AMERICAN_CSV, dtype=str)
+    days = max(1, rows // (len(df_italian) + len(df_american)))
+    frames = []
+    for df in (df_italian, df_american):
+        copies = []
+        for day in range(days):
+            copy = df.copy()
+            copy["titolo"] = copy["titolo"] + f" (vol. {day})"
+            copies.append(copy)
+        frames.append(pd.concat(copies, ignore_index=True))
+    return frames
+
+
+def measure(fn, repeat):
+    """Restituisce (secondi migliori, picco di memoria in byte, risultato)."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def _canonical_frame(df):
+    """DataFrame confrontabile: categorie come stringhe, mancanti come None."""
+    df = df.astype(object)
+    return df.where(df.notna(), None).to_dict(orient="records")
+
+
+def frame_bytes(result):
+    frames = result if isinstance(result, tuple) else (result,)
+    return sum(int(df.memory_usage(deep=True).sum()) for df in frames)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark della normalizzazione dei CSV")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    df_italian, df_american = synthetic_sources(args.rows)
+    # Come li legge la pipeline: categoria categoriale già dal CSV
+    typed_italian, typed_american = (
+        df.astype({column: dtype for column, dtype in book_frames.SOURCE_DTYPES.items() if column in df})
+        for df in (df_italian, df_american))
+    print(f"{len(df_italian) + len(df_american)} righe, {args.repeat} ripetizioni")
+
+    cases = [
+        ("catalogo", lambda: _records_rowwise(df_italian, df_american),
+         lambda: book_frames.catalog_frame(typed_italian, typed_american),
+         lambda r: _canonical_frame(r.drop(columns=book_frames.PRICE_COLUMNS, errors="ignore"))),
+        ("pulizia", lambda: _clean_rowwise(df_italian, df_american),
+         lambda: organizza_dati_links.clean_data(typed_italian, typed_american),
+         lambda r: [_canonical_frame(df) for df in r]),
+    ]
+
+    print(f"{'fase':<10}{'versione':<11}{'tempo':>10}{'picco':>11}{'DataFrame':>12}{'speedup':>9}  identici")
+    for name, rowwise, columnar, canonical in cases:
+        base_time, base_peak, base = measure(rowwise, args.repeat)
+        new_time, new_peak, new = measure(columnar, args.repeat)
+        same = canonical(base) == canonical(new)
+        print(f"{name:<10}{'righe':<11}{base_time * 1000:>8.0f}ms{base_peak / 2**20:>8.1f}MiB"
+              f"{frame_bytes(base) / 2**20:>9.1f}MiB{1:>8.2f}x")
+        print(f"{name:<10}{'colonne':<11}{new_time * 1000:>8.0f}ms{new_peak / 2**20:>8.1f}MiB"
+              f"{frame_bytes(new) / 2**20:>9.1f}MiB{base_time / new_time:>8.2f}x  {'sì' if same else 'NO'}")
+
+    # Rendering: iterrows contro itertuples sulle righe pulite
+    cleaned_italian, _ = organizza_dati_links.clean_data(typed_italian, typed_american)
+    base_time, _, base = measure(lambda: _rows_rowwise(cleaned_italian), args.repeat)
+    new_time, _, new = measure(lambda: _rows_columnar(cleaned_italian), args.repeat)
+    print(f"{'righe doc':<10}iterrows {base_time * 1000:>8.0f}ms, itertuples {new_time * 1000:.0f}ms "
+          f"({base_time / new_time:.1f}x), identici: {'sì' if base == new else 'NO'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark dei parser degli elenchi sulle pagine HTML salvate in fixtures/.
+Per ogni parser riporta pagine al secondo e memoria allocata (picco medio per
+pagina, misurato con tracemalloc), e verifica che i record coincidano con
+quelli dell'implementazione di riferimento (la prima della suite). Eseguito
+a ogni modifica dei parser fa da benchmark di regressione sulle pagine salvate.
+
+Uso:
+    python scripts/bench_parser.py [--suite ibs|amazon] [--repeat 20] [fixture.html ...]
+"""
+
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+import tracemalloc
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(SCRIPT_DIR, "fixtures")
+
+
+def _ibs_parsers():
+    import scraper_libri_italiani_links as ibs
+    return [
+        ('bs4', lambda html: ibs.parse_book_data_bs4(html, 'bench', ibs.BASE_URL)),
+        ('lxml', lambda html: ibs.parse_book_data(html, 'bench', ibs.BASE_URL)),
+    ]
+
+
+def _amazon_parsers():
+    import scraper_libri_americani_links as amazon
+    return [
+        ('bs4', lambda html: amazon.parse_book_data_bs4(html, 'bench', amazon.BASE_URL)),
+        ('lxml', lambda html: amazon.parse_book_data(html, 'bench', amazon.BASE_URL)),
+    ]
+
+
+def _amazon_canonical(records):
+    """Il riferimento deduplica per link grezzo, il parser lineare per ASIN:
+    si confrontano i record unici per ASIN, senza il campo asin."""
+    from book_ids import extract_asin
+    unique = {}
+    for record in records:
+        unique.setdefault(extract_asin(record['link_acquisto']), record)
+    return [{k: v for k, v in record.items() if k != 'asin'} for record in unique.values()]
+
+
+# Suite disponibili: pattern delle fixture, parser da confrontare e
+# normalizzazione opzionale dei record prima del confronto
+SUITES = {
+    'ibs': ('ibs_*.html', _ibs_parsers, None),
+    'amazon': ('amazon_*.html', _amazon_parsers, _amazon_canonical),
+}
+
+
+def measure(parse, pages, repeat):
+    """Restituisce (pagine al secondo, picco medio di memoria per pagina in byte)."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for page in pages:
+            parse(page)
+    elapsed = time.perf_counter() - start
+
+    peaks = []
+    tracemalloc.start()
+    for page in pages:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        parse(page)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    return repeat * len(pages) / elapsed, sum(peaks) / len(peaks)
+
+
+def run_suite(name, paths, repeat):
+    pattern, load_parsers, canonical = SUITES[name]
+    canonical = canonical or (lambda records: records)
+    paths = paths or sorted(glob.glob(os.path.join(FIXTURES_DIR, pattern)))
+    if not paths:
+        print(f"[!] Nessuna fixture trovata per la suite {name}")
+        return
+    pages = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            pages.append(f.read())
+
+    parsers = load_parsers()
+    reference = [canonical(parsers[0][1](page)) for page in pages]
+    records = sum(len(r) for r in reference)
+
+    print(f"Suite {name}: {len(pages)} pagine, {records} record, {repeat} ripetizioni")
+    print(f"{'parser':<10}{'pagine/s':>12}{'KiB/pagina':>14}{'speedup':>10}{'record':>8}  identici")
+    baseline = None
+    for parser_name, parse in parsers:
+        rate, peak = measure(parse, pages, repeat)
+        baseline = baseline or rate
+        results = [parse(page) for page in pages]
+        same = [canonical(r) for r in results] == reference
+        count = sum(len(r) for r in results)
+        print(f"{parser_name:<10}{rate:>12.1f}{peak / 1024:>14.1f}{rate / baseline:>9.2f}x{count:>8}  {'sì' if same else 'NO'}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark dei parser degli elenchi")
+    parser.add_argument('--suite', choices=sorted(SUITES), action='append',
+                        help="suite da eseguire (predefinito: tutte)")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('fixtures', nargs='*', help="pagine HTML salvate da usare al posto di fixtures/")
+    args = parser.parse_args(argv)
+
+    # I parser registrano una riga per pagina: qui sarebbe solo rumore
+    logging.disable(logging.INFO)
+    for name in args.suite or sorted(SUITES):
+        run_suite(name, args.fixtures, args.repeat)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
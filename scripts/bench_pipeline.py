@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark end-to-end della pipeline (update_books.py) senza rete.
+
+`record` esegue una volta la pipeline reale registrando ogni risposta HTTP
+(vedi http_replay.py); `run` la riesegue offline contro un server locale che
+riproduce la registrazione, con latenza ed errori iniettati a piacere.
+
+Ogni esecuzione avviene in una copia temporanea del repository (scripts/ e
+data/books.json), con cache HTTP e cache di build disattivate e le variabili
+NEWBOOKS_* del chiamante ignorate: il repository non viene toccato e due
+esecuzioni partono dallo stesso stato. Con --polite si mantengono i budget di
+cortesia reali, altrimenti gli host registrati non hanno limiti di frequenza
+e si misura il lavoro della pipeline, non le pause.
+
+Il risultato (tempo totale, durata degli stadi, richieste, byte, esiti HTTP,
+latenze per host, impronte degli output) viene salvato in data/bench/ e
+confrontato con l'esecuzione precedente: libri aggiunti, rimossi o cambiati
+in books.json, CSV e file del sito diversi.
+
+Uso:
+    python -m scripts bench-pipeline record data/http_capture
+    python -m scripts bench-pipeline run data/http_capture [--latency-ms 50] [--jitter-ms 20]
+        [--error-rate 0.02] [--seed 1] [--polite] [--baseline risultati.json] [--keep]
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import urlparse
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+RESULTS_PATH = os.path.join(ROOT_DIR, "data", "bench", "pipeline.json")
+PREVIOUS_RESULTS_PATH = os.path.join(ROOT_DIR, "data", "bench", "pipeline_previous.json")
+
+# Campi che cambiano a ogni esecuzione e non contano come differenze
+VOLATILE_FIELDS = {"addedToday"}
+
+OUTPUT_CSVS = ["scripts/libri_italiani_links.csv", "scripts/libri_americani_links.csv"]
+
+
+def prepare_workspace():
+    """Copia temporanea del repository con il solo stato che la pipeline legge."""
+    workspace = tempfile.mkdtemp(prefix="newbooks-bench-")
+    shutil.copytree(SCRIPT_DIR, os.path.join(workspace, "scripts"),
+                    ignore=shutil.ignore_patterns("__pycache__", "*.log", "fixtures"))
+    os.makedirs(os.path.join(workspace, "data"))
+    shutil.copyfile(os.path.join(ROOT_DIR, "data", "books.json"), os.path.join(workspace, "data", "books.json"))
+    return workspace
+
+
+def child_env(extra):
+    env = {name: value for name, value in os.environ.items() if not name.startswith("NEWBOOKS_")}
+    env.update({"NEWBOOKS_HTTP_CACHE": "off", "NEWBOOKS_RUN_ID": "bench"})
+    env.update(extra)
+    return env
+
+
+def run_pipeline(workspace, env):
+    """Esegue update_books nella copia; restituisce (secondi, esito del processo)."""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-m", "scripts", "update-books", "--no-cache"],
+                            cwd=workspace, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, result
+
+
+def _sha256(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def output_fingerprints(workspace):
+    """Impronte degli output: un hash per libro di books.json, per CSV e per file del sito."""
+    with open(os.path.join(workspace, "data", "books.json"), "r", encoding="utf-8") as f:
+        books = json.load(f)
+    records = {}
+    for book in books:
+        stable = {field: value for field, value in book.items() if field not in VOLATILE_FIELDS}
+        records[book["id"]] = hashlib.sha256(
+            json.dumps(stable, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    site_dir = os.path.join(workspace, "data", "site")
+    site = sorted(os.path.relpath(os.path.join(root, name), site_dir)
+                  for root, _, names in os.walk(site_dir) for name in names)
+    return {"books": records, "csv": {path: _sha256(os.path.join(workspace, path)) for path in OUTPUT_CSVS},
+            "site": site}
+
+
+def http_totals(report):
+    """Richieste, byte, esiti e latenze sommati su tutti gli stadi del run report."""
+    totals = {"requests": 0, "bytes": 0, "retries": 0, "fast_fail": 0, "captcha": 0,
+              "http_status": {}, "host_latency_ms": {}, "stages_s": {}}
+    for name, stage in report.get("stages", {}).items():
+        counters = stage.get("counters", {})
+        totals["requests"] += counters.get("requests", 0)
+        totals["bytes"] += counters.get("bytes", 0)
+        totals["retries"] += counters.get("http_retries", 0)
+        totals["fast_fail"] += counters.get("http_fast_fail", 0)
+        totals["captcha"] += counters.get("http_captcha", 0)
+        for status, count in stage.get("http_status", {}).items():
+            totals["http_status"][status] = totals["http_status"].get(status, 0) + count
+        totals["host_latency_ms"].update(stage.get("host_latency_ms", {}))
+        totals["stages_s"][name] = stage.get("duration_s", 0.0)
+    return totals
+
+
+def diff_outputs(before, after):
+    """Differenze tra le impronte degli output di due esecuzioni."""
+    old, new = before["books"], after["books"]
+    return {
+        "libri_aggiunti": sorted(set(new) - set(old)),
+        "libri_rimossi": sorted(set(old) - set(new)),
+        "libri_cambiati": sorted(book_id for book_id in set(old) & set(new) if old[book_id] != new[book_id]),
+        "csv_cambiati": sorted(path for path in after["csv"] if after["csv"][path] != before["csv"].get(path)),
+        "file_sito_diversi": len(set(before["site"]) ^ set(after["site"])),
+    }
+
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def print_result(result, baseline):
+    http = result["http"]
+    print(f"[✓] Pipeline in {result['wall_s']:.1f}s: {http['requests']} richieste, "
+          f"{http['bytes'] / 1024 / 1024:.1f} MiB, esiti {http['http_status']}, "
+          f"{http['retries']} nuovi tentativi, {http['fast_fail']} rifiutate dal circuito")
+    for name, seconds in sorted(http["stages_s"].items(), key=lambda item: -item[1]):
+        print(f"    {name:<16}{seconds:>8.1f}s")
+    for host, latency in sorted(http["host_latency_ms"].items()):
+        print(f"    {host:<32} p50 {latency['p50']:.0f}ms  p90 {latency['p90']:.0f}ms  p99 {latency['p99']:.0f}ms")
+    if result.get("replay"):
+        print(f"    server di riproduzione: {result['replay']}")
+    if baseline is None:
+        print("[✓] Nessuna esecuzione precedente con cui confrontare gli output")
+        return
+    changes = diff_outputs(baseline["outputs"], result["outputs"])
+    speedup = baseline["wall_s"] / result["wall_s"] if result["wall_s"] else 0.0
+    print(f"[✓] Rispetto a {baseline.get('at', 'precedente')}: {baseline['wall_s']:.1f}s → "
+          f"{result['wall_s']:.1f}s ({speedup:.2f}x), richieste {baseline['http']['requests']} → {http['requests']}")
+    if not any(changes.values()):
+        print("[✓] Output identici")
+    else:
+        print(f"[!] Output diversi: {len(changes['libri_aggiunti'])} libri aggiunti, "
+              f"{len(changes['libri_rimossi'])} rimossi, {len(changes['libri_cambiati'])} cambiati, "
+              f"CSV cambiati {changes['csv_cambiati'] or 'nessuno'}, "
+              f"{changes['file_sito_diversi']} file del sito diversi")
+
+
+def save_result(result, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if path == RESULTS_PATH and os.path.exists(path):
+        os.replace(path, PREVIOUS_RESULTS_PATH)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end offline della pipeline")
+    parser.add_argument("mode", choices=["record", "run"])
+    parser.add_argument("capture", help="cartella della registrazione HTTP")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--polite", action="store_true", help="mantiene i budget di cortesia reali")
+    parser.add_argument("--baseline", help="risultati con cui confrontare (predefinito: l'esecuzione precedente)")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--keep", action="store_true", help="non cancella la copia di lavoro")
+    args = parser.parse_args(argv)
+
+    capture = os.path.abspath(args.capture)
+    server = None
+    if args.mode == "record":
+        env = child_env({"NEWBOOKS_HTTP_RECORD": capture})
+    else:
+        from http_replay import ReplayServer
+        server = ReplayServer(capture, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                              error_rate=args.error_rate, seed=args.seed).start()
+        extra = {"NEWBOOKS_HTTP_REPLAY": server.url}
+        if not args.polite:
+            hosts = sorted({urlparse(url).netloc for url in server.responses})
+            extra["NEWBOOKS_POLITENESS"] = ",".join(f"{host}=1000:1000" for host in hosts)
+        env = child_env(extra)
+
+    workspace = prepare_workspace()
+    try:
+        wall, process = run_pipeline(workspace, env)
+        if process.returncode != 0:
+            print(f"[!] La pipeline è terminata con codice {process.returncode}:\n{process.stderr[-3000:]}")
+            return 1
+        report = _load(os.path.join(workspace, "data", "run_report.json")) or {}
+        result = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "mode": args.mode,
+            "settings": {"latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms,
+                         "error_rate": args.error_rate, "seed": args.seed, "polite": args.polite},
+            "wall_s": round(wall, 3),
+            "http": http_totals(report),
+            "replay": server.stats() if server else None,
+            "outputs": output_fingerprints(workspace),
+        }
+    finally:
+        if server is not None:
+            server.stop()
+        if args.keep:
+            print(f"[✓] Copia di lavoro conservata in {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    if server is not None and server.misses:
+        print(f"[!] {len(server.misses)} URL non presenti nella registrazione, es. {server.misses[0]}")
+    baseline = _load(args.baseline or args.output) if args.mode == "run" else None
+    print_result(result, baseline)
+    if args.mode == "run":
+        save_result(result, args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
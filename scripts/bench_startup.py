@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark dell'avvio dei comandi di `python -m scripts`.
+
+Per ogni comando lancia un interprete nuovo con `-X importtime`, importa solo
+ciò che il comando carica (senza eseguirlo) e riporta:
+- il tempo totale degli import e il tempo di avvio del processo;
+- quali dipendenze pesanti (pandas, python-docx, ...) vengono caricate.
+
+Uso:
+    python -m scripts bench-startup [--repeat N] [--output report.json] [comando ...]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SCRIPT_DIR)
+
+HEAVY_MODULES = ("pandas", "numpy", "docx", "bs4", "lxml", "requests", "PIL")
+
+RE_IMPORTTIME = re.compile(r'^import time:\s*(\d+)\s*\|\s*(\d+)\s*\|( *)(\S+)')
+
+# Importa il punto d'ingresso e risolve il comando senza eseguirlo
+PROBE = "import scripts.__main__ as cli; {load}"
+
+
+def parse_importtime(stderr):
+    """Restituisce (microsecondi totali, {modulo pesante: microsecondi cumulativi})."""
+    total = 0
+    heavy = {}
+    for line in stderr.splitlines():
+        match = RE_IMPORTTIME.match(line)
+        if not match:
+            continue
+        cumulative, indent, module = int(match.group(2)), len(match.group(3)), match.group(4)
+        if indent <= 1:
+            total += cumulative
+        if module in HEAVY_MODULES and module not in heavy:
+            heavy[module] = cumulative
+    return total, heavy
+
+
+def measure(command, repeat):
+    """Tempo migliore su `repeat` avvii di un interprete nuovo."""
+    load = f"cli.load_command({command!r})" if command else "pass"
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE.format(load=load)],
+                                cwd=ROOT_DIR, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if result.returncode != 0:
+            raise RuntimeError(f"Import fallito per {command or 'cli'}:\n{result.stderr[-2000:]}")
+        imports, heavy = parse_importtime(result.stderr)
+        sample = {"command": command or "(cli)", "wall_ms": round(wall * 1000, 1),
+                  "import_ms": round(imports / 1000, 1),
+                  "heavy": {name: round(us / 1000, 1) for name, us in heavy.items()}}
+        if best is None or sample["wall_ms"] < best["wall_ms"]:
+            best = sample
+    return best
+
+
+def main(argv=None):
+    sys.path.insert(0, ROOT_DIR)
+    from scripts.__main__ import COMMANDS
+
+    parser = argparse.ArgumentParser(description="Tempo di avvio dei comandi di python -m scripts")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', help="salva i risultati in JSON per confrontarli nel tempo")
+    parser.add_argument('commands', nargs='*', help="comandi da misurare (predefinito: tutti)")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.commands if name not in COMMANDS]
+    if unknown:
+        parser.error(f"comandi sconosciuti: {', '.join(unknown)}")
+
+    results = [measure(None, args.repeat)]
+    results += [measure(name, args.repeat) for name in args.commands or COMMANDS]
+
+    print(f"{'comando':<18}{'avvio':>10}{'import':>10}  dipendenze pesanti")
+    for row in results:
+        heavy = ", ".join(f"{name} {ms:.0f}ms" for name, ms in row["heavy"].items()) or "-"
+        print(f"{row['command']:<18}{row['wall_ms']:>8.0f}ms{row['import_ms']:>8.0f}ms  {heavy}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark del formato compatto (wire_format) contro books.json.
+
+Per il catalogo attuale, e per una sua replica fino a `--rows` record,
+confronta i byte trasferiti (JSON indentato come oggi, JSON minificato,
+formato compatto; grezzi, gzip e brotli se installato) e il tempo di
+decodifica lato client (json.loads contro json.loads + decode), verificando
+che il decodificatore restituisca esattamente i record canonici.
+
+Uso:
+    python -m scripts bench-wire [--rows 20000] [--repeat 5]
+"""
+
+import sys
+import gzip
+import json
+import time
+import argparse
+
+import wire_format
+
+
+def _compressed_sizes(data):
+    sizes = {"raw": len(data), "gzip": len(gzip.compress(data, compresslevel=9, mtime=0))}
+    try:
+        import brotli
+    except ImportError:
+        return sizes
+    sizes["brotli"] = len(brotli.compress(data, quality=11))
+    return sizes
+
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def replicate(books, rows):
+    """Catalogo replicato fino a `rows` record con titoli e link distinti.
+
+    Nelle copie dispari la copertina è vuota, come nei libri appena uniti al catalogo.
+    """
+    replicated = []
+    copy = 0
+    while len(replicated) < rows:
+        for book in books:
+            record = dict(book, title=f"{book['title']} ({copy})",
+                          link_acquisto=f"{book['link_acquisto']}#{copy}" if copy else book['link_acquisto'])
+            if copy % 2:
+                record["cover"] = ""
+            replicated.append(record)
+        copy += 1
+    return replicated[:rows]
+
+
+def run_case(label, books, repeat):
+    variants = {
+        "indentato": json.dumps(books, ensure_ascii=False, indent=2).encode("utf-8"),
+        "minificato": json.dumps(books, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        "compatto": wire_format.dumps(wire_format.encode(books)).encode("utf-8"),
+    }
+    expected = [wire_format.canonical(book) for book in books]
+    same = wire_format.decode(json.loads(variants["compatto"])) == expected
+
+    print(f"\n{label}: {len(books)} libri, round-trip identico: {'sì' if same else 'NO'}")
+    baseline = None
+    for name, data in variants.items():
+        sizes = _compressed_sizes(data)
+        parse = _best(lambda: json.loads(data), repeat)
+        timing = f"json.loads {parse * 1000:>7.2f} ms"
+        if name == "compatto":
+            # Ricostruzione dei record: link, id e annas_link derivati
+            total = _best(lambda: wire_format.decode(json.loads(data)), repeat)
+            timing += f", con decode {total * 1000:.2f} ms"
+        baseline = baseline or sizes
+        compressed = ", ".join(f"{kind} {size / 1024:>7.1f} KiB ({size / baseline[kind]:.0%})"
+                               for kind, size in sizes.items())
+        print(f"  {name:<11}{compressed}  {timing}")
+    return same
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del formato compatto del catalogo")
+    parser.add_argument('--books', default=wire_format.BOOKS_JSON)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with open(args.books, "r", encoding="utf-8") as f:
+        books = json.load(f)
+    same = run_case("books.json", books, args.repeat)
+    if args.rows > len(books):
+        same = run_case("replica", replicate(books, args.rows), args.repeat) and same
+    return 0 if same else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Identificatori stabili dei libri del catalogo.
+
+- IBS: l'ISBN presente negli URL /e/978...  -> "isbn:9788817173995"
+- Amazon: l'ASIN dei link /dp/...           -> "asin:0310368340"
+- altrimenti titolo e autore normalizzati   -> "ta:<hash>"
+"""
+
+import re
+import hashlib
+import unicodedata
+
+RE_ISBN = re.compile(r'/e/(97[89]\d{10})(?:[/?#]|$)')
+RE_ASIN = re.compile(r'/(?:dp|gp/product)/([A-Z0-9]{10})(?:[/?#]|$)')
+RE_NON_WORD = re.compile(r'[^\w]+')
+
+AUTORE_NON_DISPONIBILE = "Autore non disponibile"
+
+
+def extract_isbn(url):
+    """ISBN-13 contenuto in un link IBS, oppure None."""
+    match = RE_ISBN.search(url or '')
+    return match.group(1) if match else None
+
+
+def extract_asin(url):
+    """ASIN contenuto in un link prodotto Amazon, oppure None."""
+    match = RE_ASIN.search(url or '')
+    return match.group(1) if match else None
+
+
+def normalize_text(text):
+    """Minuscole, senza accenti né punteggiatura, spazi compattati."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return RE_NON_WORD.sub(' ', text.lower()).strip()
+
+
+def normalize_author(author):
+    """Autore normalizzato; il segnaposto "Autore non disponibile" diventa stringa vuota."""
+    if not author or str(author).strip() == AUTORE_NON_DISPONIBILE:
+        return ''
+    return normalize_text(author)
+
+
+def book_id(record):
+    """Identificatore stabile di un record (chiavi del CSV o di books.json)."""
+    link = record.get('link_acquisto') or ''
+    isbn = extract_isbn(link)
+    if isbn:
+        return f"isbn:{isbn}"
+    asin = record.get('asin') or extract_asin(link)
+    if asin:
+        return f"asin:{asin}"
+    title = record.get('title', record.get('titolo', ''))
+    author = record.get('author', record.get('autore', ''))
+    key = f"{normalize_text(title)}|{normalize_author(author)}"
+    return "ta:" + hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
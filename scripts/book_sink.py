@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Destinazioni (sink) per i record dei libri prodotti dagli scraper.
+I record vengono scritti man mano che arrivano, così la memoria resta costante
+al crescere delle pagine e un'interruzione conserva quanto già raccolto.
+"""
+
+import csv
+import threading
+
+
+class CsvSink:
+    """Scrive i record in un CSV, pagina per pagina, con flush dopo ogni blocco.
+
+    Il file viene aperto (e troncato) solo al primo record: un'esecuzione che non
+    trova nulla non cancella il CSV del giorno precedente.
+    """
+
+    def __init__(self, path, fieldnames):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.count = 0
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        self._file = open(self.path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        self._writer.writeheader()
+
+    def write_many(self, records):
+        """Aggiunge un blocco di record e lo rende subito persistente su disco."""
+        records = list(records)
+        if not records:
+            return
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._writer.writerows(records)
+            self._file.flush()
+            self.count += len(records)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ListSink:
+    """Sink in memoria, utile quando i record servono a un altro stadio nello stesso processo."""
+
+    def __init__(self):
+        self.records = []
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write_many(self, records):
+        with self._lock:
+            before = len(self.records)
+            self.records.extend(records)
+            self.count += len(self.records) - before
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TeeSink:
+    """Inoltra ogni blocco di record a più sink (ad esempio CSV e memoria)."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    @property
+    def count(self):
+        return self.sinks[0].count if self.sinks else 0
+
+    def write_many(self, records):
+        records = list(records)
+        for sink in self.sinks:
+            sink.write_many(records)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
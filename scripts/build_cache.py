@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache di build in stile make, basata sulle impronte del contenuto.
+
+Ogni stadio dichiara le sue dipendenze:
+- File(path): file o cartelle, letti dal contenuto (non dalla data di modifica);
+- Config(nome, valore): configurazione come CATEGORIE;
+- Code(moduli...): il sorgente dei moduli che implementano lo stadio;
+- View(nome, funzione): una proiezione dei dati condivisi (es. le colonne del
+  catalogo SQLite che lo stadio usa davvero).
+
+Prima di eseguire uno stadio si confrontano le impronte degli input con quelle
+registrate all'ultima esecuzione riuscita. Se coincidono e gli output sono
+ancora quelli prodotti allora, lo stadio viene saltato; gli output su file
+mancanti o modificati vengono ripristinati dall'archivio degli oggetti
+(data/build_cache/objects, indirizzato per contenuto). Gli output che sono
+viste del catalogo non si possono ripristinare: se differiscono, lo stadio
+riparte.
+
+Gli stadi che dipendono dalla rete o dalla data di esecuzione non dichiarano
+dipendenze e vengono sempre eseguiti. Con --explain ogni decisione viene
+motivata.
+
+Uso (passaggi del workflow):
+    python -m scripts build [--explain] annas-archive db-export shards
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import importlib
+import importlib.util
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('NEWBOOKS_BUILD_CACHE', os.path.join(SCRIPT_DIR, "..", "data", "build_cache"))
+MANIFEST_NAME = "manifest.json"
+
+
+# --- impronte -------------------------------------------------------------------
+
+def _sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _dir_files(path):
+    """{percorso relativo: sha256} dei file di una cartella (ordinati)."""
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            files[os.path.relpath(full, path).replace(os.sep, "/")] = _sha256_file(full)
+    return dict(sorted(files.items()))
+
+
+def path_files(path):
+    """{percorso relativo: sha256} di un file ("." ) o di una cartella; None se manca."""
+    if os.path.isdir(path):
+        return _dir_files(path)
+    if os.path.isfile(path):
+        return {".": _sha256_file(path)}
+    return None
+
+
+def fingerprint_value(value):
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def fingerprint_code(modules):
+    """Impronta del sorgente dei moduli (senza importarli)."""
+    digest = hashlib.sha256()
+    for module in modules:
+        spec = importlib.util.find_spec(module)
+        digest.update(module.encode("utf-8"))
+        if spec is not None and spec.origin and os.path.isfile(spec.origin):
+            digest.update(_sha256_file(spec.origin).encode("ascii"))
+    return digest.hexdigest()
+
+
+class Dep:
+    """Una dipendenza con nome e impronta calcolata al momento del controllo."""
+
+    def __init__(self, name, fingerprint, path=None):
+        self.name = name
+        self._fingerprint = fingerprint
+        self.path = path
+
+    def fingerprint(self):
+        return self._fingerprint()
+
+    def __repr__(self):
+        return f"Dep({self.name!r})"
+
+
+def _relative(path):
+    return os.path.relpath(os.path.abspath(path), os.path.join(SCRIPT_DIR, "..")).replace(os.sep, "/")
+
+
+def File(path):
+    return Dep(f"file:{_relative(path)}", lambda: fingerprint_value(path_files(path)), path=path)
+
+
+def Config(name, value):
+    return Dep(f"config:{name}", lambda: fingerprint_value(value))
+
+
+def Code(*modules):
+    return Dep(f"code:{','.join(modules)}", lambda: fingerprint_code(modules))
+
+
+def View(name, function):
+    return Dep(f"view:{name}", lambda: fingerprint_value(function()))
+
+
+def catalog_view(columns, where="1"):
+    """Funzione che legge alcune colonne del catalogo (per View)."""
+    def read():
+        from catalog_db import open_catalog
+        with open_catalog() as catalog:
+            return [[book.get(column) for column in columns] for book in catalog.books(where)]
+    return read
+
+
+# --- archivio -------------------------------------------------------------------
+
+class BuildCache:
+    """Impronte dell'ultima esecuzione di ogni stadio e archivio degli output."""
+
+    def __init__(self, path=CACHE_DIR):
+        self.path = path
+        self.objects = os.path.join(path, "objects")
+        self.manifest_path = os.path.join(path, MANIFEST_NAME)
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+
+    def fingerprints(self, deps):
+        return {dep.name: dep.fingerprint() for dep in deps}
+
+    def check(self, name, inputs, outputs):
+        """(aggiornato, motivo). `inputs` sono le impronte già calcolate.
+
+        Se gli input non sono cambiati, gli output su file diversi da quelli
+        registrati vengono ripristinati dall'archivio.
+        """
+        entry = self.manifest.get(name)
+        if entry is None:
+            return False, "nessuna esecuzione registrata"
+        changed = sorted(key for key in set(inputs) | set(entry["inputs"])
+                         if inputs.get(key) != entry["inputs"].get(key))
+        if changed:
+            return False, "input cambiati: " + ", ".join(changed)
+
+        restored = []
+        for dep in outputs:
+            recorded = entry["outputs"].get(dep.name)
+            if recorded is None:
+                return False, f"output non registrato: {dep.name}"
+            if dep.fingerprint() == recorded["fingerprint"]:
+                continue
+            if dep.path is None or not self._restore(dep.path, recorded["files"]):
+                return False, f"output modificato e non ripristinabile: {dep.name}"
+            restored.append(dep.name)
+        if "artifacts" in entry and not all(os.path.exists(self._object(h)) for h in entry["artifacts"].values()):
+            return False, "artefatti in memoria non più in archivio"
+        reason = "input invariati"
+        if restored:
+            reason += "; ripristinati " + ", ".join(restored)
+        return True, reason
+
+    def _object(self, digest):
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def _store_object(self, source_path, digest):
+        target = self._object(digest)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(source_path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+
+    def _restore(self, path, files):
+        if files is None:
+            return False
+        if any(not os.path.exists(self._object(digest)) for digest in files.values()):
+            return False
+        if "." in files:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            shutil.copyfile(self._object(files["."]), path)
+            return True
+        current = path_files(path) or {}
+        for relative in current:
+            if relative not in files:
+                os.remove(os.path.join(path, relative))
+        for relative, digest in files.items():
+            if current.get(relative) != digest:
+                target = os.path.join(path, relative)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(self._object(digest), target)
+        return True
+
+    def record(self, name, inputs, outputs, artifacts=None):
+        """Registra le impronte di una esecuzione riuscita e archivia i suoi output."""
+        entry = {"inputs": inputs, "outputs": {}}
+        for dep in outputs:
+            files = None
+            if dep.path is not None:
+                files = path_files(dep.path)
+                for relative, digest in (files or {}).items():
+                    source = dep.path if relative == "." else os.path.join(dep.path, relative)
+                    self._store_object(source, digest)
+            entry["outputs"][dep.name] = {"fingerprint": dep.fingerprint(), "files": files}
+        if artifacts is not None:
+            entry["artifacts"] = {}
+            for key, value in artifacts.items():
+                data = json.dumps(value, ensure_ascii=False, default=str).encode("utf-8")
+                digest = hashlib.sha256(data).hexdigest()
+                target = self._object(digest)
+                if not os.path.exists(target):
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    with open(target, "wb") as f:
+                        f.write(data)
+                entry["artifacts"][key] = digest
+        self.manifest[name] = entry
+        self._save()
+
+    def artifacts(self, name):
+        """Artefatti in memoria registrati per lo stadio."""
+        values = {}
+        for key, digest in self.manifest[name].get("artifacts", {}).items():
+            with open(self._object(digest), "r", encoding="utf-8") as f:
+                values[key] = json.load(f)
+        return values
+
+    def _save(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+
+def explain(name, ran, reason):
+    print(f"[{'→' if ran else '='}] {name}: {'eseguito' if ran else 'saltato'} ({reason})")
+
+
+# --- passaggi del workflow ------------------------------------------------------
+
+def _targets():
+    """Passaggi memorizzabili: nome -> (modulo, funzione, argomenti, input, output)."""
+    from catalog_db import BOOKS_JSON, EXPORT_WHERE, COLUMNS
+    from site_shards import SITE_DIR, _compressors
+    from prices import price_drops
+
+    exported = catalog_view(COLUMNS, EXPORT_WHERE)
+    return {
+        "annas-archive": ("aggiungi_annas_archive", "enrich_books_with_annas_archive", None,
+                          [Code("aggiungi_annas_archive"), View("titoli_autori", catalog_view(["id", "title", "author"]))],
+                          [View("annas_link", catalog_view(["id", "annas_link"]))]),
+        "db-export": ("catalog_db", "main", ["export"],
+                      [Code("catalog_db"), View("catalogo_esportato", exported)],
+                      [File(BOOKS_JSON)]),
+        "shards": ("site_shards", "main", [],
+                   [Code("site_shards", "search_index", "prices"), View("catalogo_esportato", exported),
+                    View("ribassi", price_drops),
+                    Config("compressioni", [suffix for suffix, _ in _compressors()])],
+                   [File(SITE_DIR)]),
+    }
+
+
+def run_target(cache, name, target, show):
+    module, function, args, inputs, outputs = target
+    fingerprints = cache.fingerprints(inputs)
+    fresh, reason = cache.check(name, fingerprints, outputs)
+    if show or fresh:
+        explain(name, not fresh, reason)
+    if fresh:
+        return 0
+    entry = getattr(importlib.import_module(module), function)
+    result = entry(args) if args is not None else entry()
+    if isinstance(result, int) and result != 0:
+        return result
+    cache.record(name, fingerprints, outputs)
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Esegue i passaggi del workflow solo se i loro input sono cambiati")
+    parser.add_argument('--explain', action='store_true', help="motiva l'esecuzione o il salto di ogni passaggio")
+    parser.add_argument('targets', nargs='+')
+    args = parser.parse_args(argv)
+
+    targets = _targets()
+    unknown = [name for name in args.targets if name not in targets]
+    if unknown:
+        print(f"[!] Passaggi sconosciuti: {', '.join(unknown)} (disponibili: {', '.join(targets)})")
+        return 2
+    cache = BuildCache()
+    for name in args.targets:
+        result = run_target(cache, name, targets[name], args.explain)
+        if result:
+            return result
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Catalogo dei libri in SQLite (modalità WAL).
+
+Gli stadi della pipeline leggono e aggiornano solo i record che li riguardano
+con query mirate; data/books.json è un prodotto derivato, scritto in streaming
+da export_json alla fine della pipeline.
+
+Se il database non esiste (ad esempio su un runner CI appena avviato) viene
+inizializzato dal books.json corrente.
+
+Uso da riga di comando:
+    python scripts/catalog_db.py export   # scrive data/books.json
+    python scripts/catalog_db.py import   # ricarica il catalogo da data/books.json
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+from book_ids import book_id
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "..", "data")
+DB_PATH = os.environ.get('NEWBOOKS_CATALOG_DB', os.path.join(DATA_DIR, "catalog.sqlite3"))
+BOOKS_JSON = os.path.join(DATA_DIR, "books.json")
+
+# Colonne del catalogo nell'ordine di books.json. I campi non elencati
+# vengono conservati nella colonna `extra` come JSON.
+COLUMNS = [
+    "title", "author", "categoria", "link_acquisto", "origin",
+    "releaseDate", "cover", "annas_link", "id", "isNew", "dirty", "addedToday",
+    "dateResolved", "work_id", "workPrimary",
+]
+BOOLEAN_COLUMNS = {"isNew", "dirty", "addedToday", "dateResolved", "workPrimary"}
+INDEXED_COLUMNS = ["categoria", "origin", "releaseDate", "addedToday", "work_id"]
+
+# books.json contiene un solo record per opera (vedi work_ids.py)
+EXPORT_WHERE = "COALESCE(workPrimary, 1) = 1"
+
+
+class Catalog:
+    """Accesso al catalogo: query mirate, aggiornamenti per campo ed esportazione JSON."""
+
+    def __init__(self, path=DB_PATH, json_path=BOOKS_JSON):
+        self.path = path
+        self.json_path = json_path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self._create_schema()
+        if self.count() == 0 and os.path.exists(json_path):
+            self.import_json(json_path)
+
+    def _create_schema(self):
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                id TEXT PRIMARY KEY,
+                position INTEGER NOT NULL,
+                extra TEXT
+            )
+        """)
+        existing = {row["name"] for row in self.db.execute("PRAGMA table_info(books)")}
+        for column in COLUMNS:
+            if column not in existing:
+                self.db.execute(f'ALTER TABLE books ADD COLUMN "{column}"')
+        self.db.execute("CREATE INDEX IF NOT EXISTS books_position ON books(position)")
+        for column in INDEXED_COLUMNS:
+            self.db.execute(f'CREATE INDEX IF NOT EXISTS books_{column} ON books("{column}")')
+        self.db.commit()
+
+    # --- conversione tra righe e record -----------------------------------
+
+    def _to_row(self, book, position):
+        extra = {k: v for k, v in book.items() if k not in COLUMNS}
+        values = [book.get(column) for column in COLUMNS]
+        return [book["id"], position, json.dumps(extra, ensure_ascii=False) if extra else None] + values
+
+    @staticmethod
+    def _to_book(row):
+        book = {}
+        keys = row.keys()
+        for column in COLUMNS:
+            if column not in keys or row[column] is None:
+                continue
+            value = row[column]
+            book[column] = bool(value) if column in BOOLEAN_COLUMNS else value
+        if "extra" in keys and row["extra"]:
+            book.update(json.loads(row["extra"]))
+        return book
+
+    # --- lettura ------------------------------------------------------------
+
+    def count(self, where="1", params=()):
+        return self.db.execute(f"SELECT COUNT(*) FROM books WHERE {where}", params).fetchone()[0]
+
+    def books(self, where="1", params=()):
+        """Itera i record che soddisfano la condizione SQL, nell'ordine del catalogo."""
+        cursor = self.db.execute(f"SELECT * FROM books WHERE {where} ORDER BY position", params)
+        for row in cursor:
+            yield self._to_book(row)
+
+    def get(self, book_id):
+        row = self.db.execute("SELECT * FROM books WHERE id = ?", (book_id,)).fetchone()
+        return self._to_book(row) if row else None
+
+    # --- scrittura ----------------------------------------------------------
+
+    def update(self, book_id, **fields):
+        """Aggiorna alcuni campi di un libro (senza commit)."""
+        columns = {k: v for k, v in fields.items() if k in COLUMNS}
+        extra = {k: v for k, v in fields.items() if k not in COLUMNS}
+        if columns:
+            assignments = ", ".join(f'"{k}" = ?' for k in columns)
+            self.db.execute(f"UPDATE books SET {assignments} WHERE id = ?", list(columns.values()) + [book_id])
+        if extra:
+            row = self.db.execute("SELECT extra FROM books WHERE id = ?", (book_id,)).fetchone()
+            if row is not None:
+                merged = json.loads(row["extra"]) if row["extra"] else {}
+                merged.update(extra)
+                self.db.execute("UPDATE books SET extra = ? WHERE id = ?",
+                                (json.dumps(merged, ensure_ascii=False), book_id))
+
+    def replace_all(self, books):
+        """Sostituisce il contenuto del catalogo con `books` (ordine compreso)."""
+        placeholders = ", ".join("?" for _ in range(len(COLUMNS) + 3))
+        columns = ", ".join(["id", "position", "extra"] + [f'"{c}"' for c in COLUMNS])
+        with self.db:
+            self.db.execute("DELETE FROM books")
+            self.db.executemany(f"INSERT INTO books ({columns}) VALUES ({placeholders})",
+                                (self._to_row(book, i) for i, book in enumerate(books)))
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    # --- import/export ------------------------------------------------------
+
+    def import_json(self, path=None):
+        with open(path or self.json_path, "r", encoding="utf-8") as f:
+            books = json.load(f)
+        unique = {}
+        for book in books:
+            book.setdefault("id", book_id(book))
+            unique.setdefault(book["id"], book)
+        self.replace_all(unique.values())
+
+    def export_json(self, path=None):
+        """Scrive il catalogo in streaming, un record alla volta, nello stesso
+        formato di json.dump(..., indent=2). Il file viene sostituito solo a fine scrittura.
+
+        Viene esportato solo il record primario di ogni opera: il sito riceve
+        dati già senza duplicati."""
+        path = path or self.json_path
+        tmp_path = path + ".tmp"
+        count = 0
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("[")
+            for book in self.books(EXPORT_WHERE):
+                book.pop("workPrimary", None)
+                f.write(",\n  " if count else "\n  ")
+                f.write(json.dumps(book, ensure_ascii=False, indent=2).replace("\n", "\n  "))
+                count += 1
+            f.write("\n]" if count else "]")
+        os.replace(tmp_path, path)
+        return count
+
+
+def open_catalog(path=DB_PATH):
+    """Apre il catalogo condiviso, creandolo da books.json se necessario."""
+    return Catalog(path)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "export"
+    with open_catalog() as catalog:
+        if command == "export":
+            count = catalog.export_json()
+            print(f"[✓] Esportati {count} libri in {catalog.json_path}")
+        elif command == "import":
+            catalog.import_json()
+            print(f"[✓] Importati {catalog.count()} libri da {catalog.json_path}")
+        else:
+            print(f"[!] Comando sconosciuto: {command} (usa export o import)")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
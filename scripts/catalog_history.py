@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Storico del catalogo: registro append-only dei delta tra un'esecuzione e l'altra.
+
+Ogni esecuzione aggiunge a data/history/log.jsonl una riga con i soli
+cambiamenti rispetto allo stato precedente:
+
+    {"seq": 12, "date": "2026-10-18", "run": "...",
+     "added": {id: record}, "removed": [id, ...], "changed": {id: {campo: valore}}}
+
+(in `changed` un valore null indica un campo rimosso). Ogni
+CHECKPOINT_EVERY righe viene scritto anche lo stato completo
+(checkpoint-<seq>.json.gz). index.json tiene data, posizione in byte e
+dimensione di ogni riga del log e l'elenco dei checkpoint, così le query
+leggono solo le righe che servono:
+
+- aggiunti/rimossi tra due date: solo le righe del log in quell'intervallo;
+- catalogo presente in una data: il checkpoint precedente più vicino e i
+  delta successivi fino a quella data;
+- storia di un libro: i delta, senza nessuno stato completo.
+
+Lo storico contiene i record esportati (un record per opera) senza i flag
+interni della pipeline né annas_link, che si ricava da titolo e autore.
+
+Uso:
+    python -m scripts storico registra
+    python -m scripts storico aggiunti 2026-10-01 [2026-10-18]
+    python -m scripts storico rimossi 2026-10-01 [2026-10-18]
+    python -m scripts storico presenti 2026-10-12
+    python -m scripts storico libro isbn:9788817173995
+"""
+
+import os
+import sys
+import gzip
+import json
+from datetime import date
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+HISTORY_DIR = os.environ.get('NEWBOOKS_HISTORY_DIR', os.path.join(SCRIPT_DIR, "..", "data", "history"))
+LOG_NAME = "log.jsonl"
+INDEX_NAME = "index.json"
+
+CHECKPOINT_EVERY = 30
+
+# Campi non storicizzati: flag della singola esecuzione e campi derivati
+SKIPPED_FIELDS = {"isNew", "dirty", "addedToday", "dateResolved", "workPrimary", "annas_link"}
+
+
+def history_record(book):
+    return {field: value for field, value in book.items() if field not in SKIPPED_FIELDS}
+
+
+def diff(before, after):
+    """Delta tra due stati {id: record}: (aggiunti, rimossi, campi cambiati)."""
+    added = {book_id: record for book_id, record in after.items() if book_id not in before}
+    removed = sorted(book_id for book_id in before if book_id not in after)
+    changed = {}
+    for book_id, record in after.items():
+        old = before.get(book_id)
+        if old is None or old == record:
+            continue
+        fields = {field: value for field, value in record.items() if old.get(field) != value}
+        fields.update({field: None for field in old if field not in record})
+        changed[book_id] = fields
+    return added, removed, changed
+
+
+def apply_delta(state, entry):
+    """Applica una riga del log a uno stato {id: record} (modificandolo)."""
+    for book_id in entry["removed"]:
+        state.pop(book_id, None)
+    for book_id, fields in entry["changed"].items():
+        record = state.setdefault(book_id, {})
+        for field, value in fields.items():
+            if value is None:
+                record.pop(field, None)
+            else:
+                record[field] = value
+    for book_id, record in entry["added"].items():
+        state[book_id] = dict(record)
+    return state
+
+
+class History:
+    """Registro dei delta con indice e checkpoint in una cartella."""
+
+    def __init__(self, path=HISTORY_DIR):
+        self.path = path
+        self.log_path = os.path.join(path, LOG_NAME)
+        self.index = self._load_index()
+
+    # --- indice ---------------------------------------------------------------
+
+    def _load_index(self):
+        try:
+            with open(os.path.join(self.path, INDEX_NAME), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = None
+        log_size = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        indexed_size = index["entries"][-1][2] + index["entries"][-1][3] if index and index["entries"] else 0
+        if index is None or indexed_size != log_size:
+            # Indice mancante o non allineato al log (es. commit parziale): si ricostruisce
+            index = self._rebuild_index()
+        return index
+
+    def _rebuild_index(self):
+        index = {"entries": [], "checkpoints": []}
+        if os.path.exists(self.log_path):
+            offset = 0
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    index["entries"].append(self._index_entry(entry, offset, len(line)))
+                    offset += len(line)
+        index["checkpoints"] = [entry[0] for entry in index["entries"]
+                                if os.path.exists(self._checkpoint_path(entry[0]))]
+        return index
+
+    @staticmethod
+    def _index_entry(entry, offset, length):
+        return [entry["seq"], entry["date"], offset, length,
+                len(entry["added"]), len(entry["removed"]), len(entry["changed"])]
+
+    def _write_index(self):
+        tmp_path = os.path.join(self.path, INDEX_NAME + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.index, f, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(self.path, INDEX_NAME))
+
+    def _checkpoint_path(self, seq):
+        return os.path.join(self.path, f"checkpoint-{seq:06d}.json.gz")
+
+    # --- lettura ----------------------------------------------------------------
+
+    def _read_entries(self, index_entries):
+        """Legge dal log solo le righe indicate, con un seek per ognuna."""
+        if not index_entries:
+            return
+        with open(self.log_path, "rb") as f:
+            for _, _, offset, length, *_ in index_entries:
+                f.seek(offset)
+                yield json.loads(f.read(length))
+
+    def _load_checkpoint(self, seq):
+        with gzip.open(self._checkpoint_path(seq), "rt", encoding="utf-8") as f:
+            return json.load(f)["books"]
+
+    def state_at(self, seq):
+        """Catalogo dopo la riga `seq` del log: checkpoint più vicino più i delta successivi."""
+        base = max((cp for cp in self.index["checkpoints"] if cp <= seq), default=0)
+        state = self._load_checkpoint(base) if base else {}
+        for entry in self._read_entries([e for e in self.index["entries"] if base < e[0] <= seq]):
+            apply_delta(state, entry)
+        return state
+
+    def latest(self):
+        entries = self.index["entries"]
+        return self.state_at(entries[-1][0]) if entries else {}
+
+    def present_on(self, day):
+        """Libri presenti nel catalogo alla fine del giorno `day` (stringa ISO)."""
+        seqs = [entry[0] for entry in self.index["entries"] if entry[1] <= day]
+        return self.state_at(seqs[-1]) if seqs else {}
+
+    def _between(self, start, end):
+        return self._read_entries([entry for entry in self.index["entries"] if start <= entry[1] <= end])
+
+    def added_between(self, start, end):
+        """[(data, id, record)] dei libri aggiunti tra `start` ed `end` (comprese)."""
+        return [(entry["date"], book_id, record)
+                for entry in self._between(start, end) for book_id, record in entry["added"].items()]
+
+    def removed_between(self, start, end):
+        """[(data, id)] dei libri usciti dal catalogo tra `start` ed `end` (comprese)."""
+        return [(entry["date"], book_id) for entry in self._between(start, end) for book_id in entry["removed"]]
+
+    def book_history(self, book_id):
+        """[(data, evento, campi)] per un libro: aggiunto, modificato, rimosso."""
+        events = []
+        for entry in self._read_entries(self.index["entries"]):
+            if book_id in entry["added"]:
+                events.append((entry["date"], "aggiunto", entry["added"][book_id]))
+            elif book_id in entry["changed"]:
+                events.append((entry["date"], "modificato", entry["changed"][book_id]))
+            elif book_id in entry["removed"]:
+                events.append((entry["date"], "rimosso", {}))
+        return events
+
+    # --- scrittura --------------------------------------------------------------
+
+    def record(self, books, run=None, day=None):
+        """Aggiunge al log il delta tra l'ultimo stato registrato e `books`.
+
+        Restituisce la riga aggiunta, oppure None se non è cambiato nulla.
+        """
+        current = {book["id"]: history_record(book) for book in books}
+        added, removed, changed = diff(self.latest(), current)
+        if not (added or removed or changed):
+            return None
+
+        entries = self.index["entries"]
+        seq = entries[-1][0] + 1 if entries else 1
+        entry = {"seq": seq, "date": day or date.today().isoformat(), "run": run or "",
+                 "added": added, "removed": removed, "changed": changed}
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+        os.makedirs(self.path, exist_ok=True)
+        offset = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        with open(self.log_path, "ab") as f:
+            f.write(line)
+        entries.append(self._index_entry(entry, offset, len(line)))
+
+        if seq % CHECKPOINT_EVERY == 0:
+            checkpoint = {"seq": seq, "date": entry["date"], "books": current}
+            data = json.dumps(checkpoint, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            with open(self._checkpoint_path(seq), "wb") as f:
+                f.write(gzip.compress(data, mtime=0))
+            self.index["checkpoints"].append(seq)
+        self._write_index()
+        return entry
+
+
+def record_catalog(books, run=None):
+    """Registra lo stato esportato del catalogo; stampa un riepilogo."""
+    entry = History().record(books, run=run)
+    if entry is None:
+        print("[✓] Storico: nessun cambiamento dall'ultima esecuzione")
+    else:
+        print(f"[✓] Storico #{entry['seq']}: {len(entry['added'])} aggiunti, "
+              f"{len(entry['removed'])} rimossi, {len(entry['changed'])} modificati")
+    return entry
+
+
+def _print_books(rows):
+    for row in rows:
+        print("  " + "  ".join(str(value) for value in row))
+    print(f"[✓] {len(rows)} libri")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else ""
+    today = date.today().isoformat()
+    history = History()
+
+    if command == "registra":
+        from catalog_db import open_catalog, EXPORT_WHERE
+        import run_metrics
+        with open_catalog() as catalog:
+            record_catalog(catalog.books(EXPORT_WHERE), run=run_metrics.run_id())
+    elif command in ("aggiunti", "rimossi") and len(argv) > 1:
+        end = argv[2] if len(argv) > 2 else today
+        if command == "aggiunti":
+            rows = [(day, book_id, record.get("title", "")) for day, book_id, record
+                    in history.added_between(argv[1], end)]
+        else:
+            rows = history.removed_between(argv[1], end)
+        _print_books(rows)
+    elif command == "presenti" and len(argv) > 1:
+        books = history.present_on(argv[1])
+        _print_books([(book_id, record.get("title", "")) for book_id, record in books.items()])
+    elif command == "libro" and len(argv) > 1:
+        for day, event, fields in history.book_history(argv[1]):
+            print(f"  {day} {event}: {json.dumps(fields, ensure_ascii=False)}")
+    else:
+        print("Uso: python -m scripts storico registra | aggiunti <da> [a] | rimossi <da> [a] "
+              "| presenti <data> | libro <id>")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
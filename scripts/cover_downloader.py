@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motore di download delle copertine.
+
+- Richieste tramite il motore di fetch condiviso (sessioni keep-alive,
+  timeout, nuovi tentativi e circuit breaker per host).
+- Limite di download contemporanei per host.
+- Un solo download per URL alla volta; ogni tentativo scrive sul proprio
+  file temporaneo .part, poi rename atomico: un file interrotto non viene
+  mai scambiato per una copertina completa.
+- Ripresa dei download parziali con l'header Range.
+- Archiviazione per hash del contenuto (book_covers/objects/ab/abcdef....jpg):
+  le immagini identiche vengono salvate una sola volta.
+- Riepilogo finale con file, byte e throughput.
+"""
+
+import os
+import time
+import uuid
+import shutil
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+from fetch_engine import get_engine
+import run_metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+COVERS_DIR = os.path.join(SCRIPT_DIR, "..", "book_covers")
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+CHUNK_SIZE = 256 * 1024
+TIMEOUT = (5, 30)
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 4
+
+
+class DownloadStats:
+    """Contatori condivisi tra i thread per il riepilogo finale."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.downloaded = 0
+        self.resumed = 0
+        self.deduplicated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.started
+        mib = self.bytes / (1024 * 1024)
+        rate = mib / elapsed if elapsed else 0.0
+        return (f"Copertine: {self.downloaded} scaricate ({self.resumed} riprese), "
+                f"{self.deduplicated} duplicate, {self.skipped} già presenti, {self.failed} errori - "
+                f"{mib:.2f} MiB in {elapsed:.1f}s ({rate:.2f} MiB/s)")
+
+
+class CoverDownloader:
+    """Scarica le immagini in un archivio indirizzato per contenuto."""
+
+    def __init__(self, covers_dir=COVERS_DIR, per_host_limit=PER_HOST_LIMIT):
+        self.covers_dir = covers_dir
+        self.objects_dir = os.path.join(covers_dir, "objects")
+        self.partial_dir = os.path.join(covers_dir, "partial")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.per_host_limit = per_host_limit
+        self.stats = DownloadStats()
+        self._host_slots = {}
+        self._downloads = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def object_path(self, digest, ext=".jpg"):
+        return os.path.join(self.objects_dir, digest[:2], digest + ext)
+
+    def _partial_path(self, url):
+        return os.path.join(self.partial_dir, hashlib.sha256(url.encode('utf-8')).hexdigest() + ".part")
+
+    def _claim_partial(self, url):
+        """File temporaneo riservato a questo tentativo.
+
+        Il parziale di un'esecuzione precedente viene rinominato (atomicamente)
+        sul file del tentativo, così da poter essere ripreso senza che altri
+        scrivano sullo stesso file.
+        """
+        attempt_path = self._partial_path(url)[:-len(".part")] + f".{uuid.uuid4().hex}.part"
+        try:
+            os.replace(self._partial_path(url), attempt_path)
+        except FileNotFoundError:
+            pass
+        return attempt_path
+
+    def _release_partial(self, url, attempt_path):
+        """Conserva il parziale di un tentativo fallito per riprenderlo alla prossima esecuzione."""
+        try:
+            os.replace(attempt_path, self._partial_path(url))
+        except OSError:
+            pass
+
+    def download(self, url):
+        """Scarica `url` e restituisce il percorso del file nell'archivio, oppure None.
+
+        Un solo download per URL alla volta: le richieste successive per lo
+        stesso URL (es. la copertina segnaposto) attendono e riusano l'esito.
+        """
+        with self._lock:
+            future = self._downloads.get(url)
+            owner = future is None
+            if owner:
+                future = self._downloads[url] = Future()
+        if not owner:
+            path = future.result()
+            if path is not None:
+                self.stats.add(deduplicated=1)
+            return path
+
+        path = None
+        try:
+            path = self._download(url)
+        finally:
+            future.set_result(path)
+        return path
+
+    def _download(self, url):
+        part_path = self._claim_partial(url)
+        # Al più due giri: il secondo solo se il server rifiuta la ripresa (416)
+        for _ in range(2):
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = dict(HEADERS, Range=f"bytes={offset}-") if offset else HEADERS
+            restart = False
+            try:
+                with self._slot(urlparse(url).netloc):
+                    # La concorrenza per host è già limitata dagli slot: niente token bucket
+                    with get_engine().get(url, headers=headers, polite=False, stream=True, timeout=TIMEOUT) as response:
+                        if response.status_code == 416:
+                            restart = True
+                        elif response.status_code not in (200, 206):
+                            self._release_partial(url, part_path)
+                            self.stats.add(failed=1)
+                            return None
+                        else:
+                            resumed = response.status_code == 206
+                            mode = 'ab' if resumed else 'wb'
+                            written = 0
+                            with open(part_path, mode) as f:
+                                for chunk in response.iter_content(CHUNK_SIZE):
+                                    f.write(chunk)
+                                    written += len(chunk)
+                if restart:
+                    # Il parziale è già completo (o non valido): si ricomincia da capo
+                    os.remove(part_path)
+                    continue
+                self.stats.add(bytes=written, resumed=int(resumed))
+                return self._commit(part_path)
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"Download error: {e}")
+                self._release_partial(url, part_path)
+                self.stats.add(failed=1)
+                return None
+        self.stats.add(failed=1)
+        return None
+
+    def _commit(self, part_path):
+        """Sposta il file completo nell'archivio con il nome dato dal suo hash."""
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(block)
+        final_path = self.object_path(digest.hexdigest())
+        if os.path.exists(final_path):
+            os.remove(part_path)
+            self.stats.add(deduplicated=1)
+            return final_path
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        os.replace(part_path, final_path)
+        self.stats.add(downloaded=1)
+        return final_path
+
+    def link(self, object_path, file_name):
+        """Espone l'oggetto con un nome leggibile (hard link, o copia se non supportato)."""
+        path = os.path.join(self.covers_dir, file_name)
+        if os.path.exists(path):
+            return path
+        # Nome temporaneo per chiamata: due libri con lo stesso nome leggibile
+        # possono arrivare qui insieme da thread diversi
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            shutil.copyfile(object_path, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def map(self, fn, items, max_workers=MAX_WORKERS):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run_metrics.bind(fn), items))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Catena di risolutori per le copertine dei libri.
+
+I risolutori vengono provati in ordine: prima quelli che costruiscono l'URL
+direttamente dall'identificatore del libro (ISBN per IBS, ASIN per Amazon),
+che costano una sola richiesta leggera e nessuna ricerca; la ricerca su
+Google Immagini resta come ultima risorsa.
+
+Gli esiti sono salvati in una LookupCache indicizzata per titolo, autore e id:
+i successi non costano più nulla, gli insuccessi vengono ritentati con backoff.
+Solo le risposte negative vere diventano insuccessi: errori di rete, host in
+pausa (circuito aperto) e risposte 429/5xx vengono sollevati come
+RequestException e la ricerca si ripete alla prossima esecuzione.
+"""
+
+import logging
+import threading
+from urllib.parse import quote_plus
+
+import requests
+
+from book_ids import book_id, extract_isbn, extract_asin
+from fetch_engine import get_engine, RETRY_STATUSES
+from http_cache import get_cache
+from lookup_cache import LookupCache, make_key, HIT, DAY
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0"
+}
+
+# Le immagini Amazon inesistenti sono GIF trasparenti da pochi byte
+MIN_IMAGE_BYTES = 1000
+
+
+def _image_exists(url):
+    """Verifica con una GET in streaming (senza scaricare il corpo) che l'URL sia un'immagine reale.
+
+    Gli errori temporanei (rete, 429, 5xx) non sono una risposta: vengono sollevati.
+    """
+    with get_engine().get(url, headers=HEADERS, stream=True, timeout=10) as response:
+        if response.status_code in RETRY_STATUSES:
+            response.raise_for_status()
+        if response.status_code != 200:
+            return False
+        if not response.headers.get('Content-Type', '').startswith('image/'):
+            return False
+        length = response.headers.get('Content-Length')
+        return length is None or int(length) >= MIN_IMAGE_BYTES
+
+
+class IsbnCoverResolver:
+    """Copertina Open Library dall'ISBN presente nel link IBS."""
+
+    name = "isbn"
+
+    def resolve(self, book):
+        isbn = extract_isbn(book.get("link_acquisto"))
+        if not isbn:
+            return None
+        url = f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg?default=false"
+        return url if _image_exists(url) else None
+
+
+class AsinCoverResolver:
+    """Copertina Amazon dall'ASIN del link prodotto."""
+
+    name = "asin"
+
+    def resolve(self, book):
+        asin = book.get("asin") or extract_asin(book.get("link_acquisto"))
+        if not asin:
+            return None
+        url = f"https://images-na.ssl-images-amazon.com/images/P/{asin}.01.LZZZZZZZ.jpg"
+        return url if _image_exists(url) else None
+
+
+def search_google_image(query):
+    from bs4 import BeautifulSoup
+
+    url = f"https://www.google.com/search?q={quote_plus(query)}&tbm=isch"
+    # Le ricerche già fatte vengono servite dalla cache HTTP su disco;
+    # gli errori di rete e HTTP vengono sollevati al chiamante
+    res = get_cache().get(url, headers=HEADERS, fetch=get_engine().get)
+    try:
+        soup = BeautifulSoup(res.text, "html.parser")
+        img_tags = soup.select("img")
+        for img in img_tags:
+            src = img.get("src") or img.get("data-src")
+            if src and src.startswith("http"):
+                return src
+    except Exception as e:
+        print(f"[❌] Errore ricerca Google per '{query}': {e}")
+    return None
+
+
+class GoogleImagesResolver:
+    """Ricerca su Google Immagini per titolo e autore (ultima risorsa)."""
+
+    name = "google"
+
+    def resolve(self, book):
+        title = book.get("title", "")
+        if not title:
+            return None
+        return search_google_image(f"{title} {book.get('author', '')} copertina libro")
+
+
+DEFAULT_RESOLVERS = [IsbnCoverResolver(), AsinCoverResolver(), GoogleImagesResolver()]
+
+
+class CoverResolverChain:
+    """Prova i risolutori in ordine, consultando e aggiornando la cache degli esiti."""
+
+    def __init__(self, resolvers=None, cache=None):
+        self.resolvers = DEFAULT_RESOLVERS if resolvers is None else resolvers
+        self.cache = cache or LookupCache("cover", hit_ttl=365 * DAY, miss_ttl=2 * DAY, max_miss_ttl=60 * DAY)
+        self.counters = {"cache_hit": 0, "cache_miss": 0, "lookup": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        # resolve viene chiamato da più thread
+        with self._lock:
+            self.counters[name] += 1
+
+    def key(self, book):
+        return make_key(book.get("title"), book.get("author"), book.get("id") or book_id(book))
+
+    def resolve(self, book):
+        """Restituisce (url, fonte) oppure (None, fonte). Con MISS in cache
+        la ricerca viene saltata fino al prossimo tentativo pianificato."""
+        key = self.key(book)
+        cached = self.cache.get(key)
+        if cached is not None:
+            status, value = cached
+            self._count("cache_hit" if status == HIT else "cache_miss")
+            return (value["url"], "cache") if status == HIT else (None, "cache")
+
+        self._count("lookup")
+        transient = False
+        for resolver in self.resolvers:
+            try:
+                url = resolver.resolve(book)
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Copertina {resolver.name} non verificabile per {book.get('title')}: {e}")
+                transient = True
+                continue
+            if url:
+                self.cache.put_hit(key, {"url": url, "resolver": resolver.name})
+                return url, resolver.name
+        if not transient:
+            # Insuccesso solo se ogni risolutore ha risposto davvero
+            self.cache.put_miss(key)
+        return None, None
+
+    def is_pending(self, book):
+        """True se il libro va (ri)cercato: nessun esito in cache o insuccesso scaduto."""
+        return self.cache.get(self.key(book)) is None
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Costruzione in blocco delle tabelle del report DOCX.
+
+Invece di aggiungere una riga alla volta con gli oggetti di python-docx
+(`add_row`, `.text` e `vertical_alignment` su ogni cella), il WordprocessingML
+di ogni tabella viene scritto come stringa in un solo passaggio e poi
+analizzato una volta da lxml. I link d'acquisto diventano veri hyperlink
+esterni (`w:hyperlink` con una relazione dedicata): le relazioni ricevono id
+propri (`rIdL<sezione>_<n>`), senza la ricerca lineare di `part.relate_to`
+che su migliaia di link diventa quadratica.
+
+Le tabelle delle diverse sezioni non dipendono l'una dall'altra e vengono
+generate in parallelo in processi separati (la generazione è puro Python e
+non guadagnerebbe nulla dai thread); sotto PARALLEL_MIN_ROWS righe il costo
+di avvio dei processi non vale la pena e si resta nel processo corrente.
+I processi sono avviati con "spawn" e non con fork: il report gira in un
+thread della pipeline mentre altri thread (motore di fetch, connessioni
+SQLite) sono attivi, e il fork di un processo multithread può bloccarsi su
+lock copiati nello stato "acquisito".
+"""
+
+import os
+import re
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from xml.sax.saxutils import escape
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+R_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+HYPERLINK_RELTYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/hyperlink"
+
+TABLE_STYLE = "TableGrid"
+LINK_TEXT = "Link"
+LINK_NOTE = " (Clicca per acquistare)"
+NO_LINK_TEXT = "Non disponibile"
+LINK_COLOR = "0000FF"
+
+PARALLEL_MIN_ROWS = 2000
+
+# Caratteri di controllo non ammessi in XML 1.0
+RE_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _text(value):
+    return escape(RE_INVALID_XML.sub('', value))
+
+
+def _run(text, properties=""):
+    rpr = f"<w:rPr>{properties}</w:rPr>" if properties else ""
+    return f'<w:r>{rpr}<w:t xml:space="preserve">{_text(text)}</w:t></w:r>'
+
+
+def _cell(content, width, valign=True):
+    valign_xml = '<w:vAlign w:val="center"/>' if valign else ""
+    return f'<w:tc><w:tcPr><w:tcW w:type="dxa" w:w="{width}"/>{valign_xml}</w:tcPr>{content}</w:tc>'
+
+
+def _header_row(headers, width):
+    cells = "".join(
+        _cell(f'<w:p><w:pPr><w:jc w:val="center"/></w:pPr>{_run(header, "<w:b/>")}</w:p>', width, valign=False)
+        for header in headers)
+    return f"<w:tr>{cells}</w:tr>"
+
+
+def _link_paragraph(rid):
+    link_run = _run(LINK_TEXT, f'<w:color w:val="{LINK_COLOR}"/><w:u w:val="single"/>')
+    return f'<w:p><w:hyperlink r:id="{rid}">{link_run}</w:hyperlink>{_run(LINK_NOTE)}</w:p>'
+
+
+def table_xml(headers, rows, col_width, rid_prefix):
+    """WordprocessingML di una tabella con intestazione e link nell'ultima colonna.
+
+    `rows` sono tuple di stringhe: le celle di testo seguite dall'URL (o None).
+    Restituisce (xml, [(rId, url), ...]) con le relazioni da registrare.
+    """
+    links = []
+    parts = [
+        f'<w:tbl xmlns:w="{W_NS}" xmlns:r="{R_NS}"><w:tblPr><w:tblStyle w:val="{TABLE_STYLE}"/>'
+        '<w:tblW w:type="auto" w:w="0"/>'
+        '<w:tblLook w:firstColumn="1" w:firstRow="1" w:lastColumn="0" w:lastRow="0" '
+        'w:noHBand="0" w:noVBand="1" w:val="04A0"/></w:tblPr><w:tblGrid>',
+        f'<w:gridCol w:w="{col_width}"/>' * len(headers),
+        '</w:tblGrid>',
+        _header_row(headers, col_width),
+    ]
+    for row in rows:
+        *texts, url = row
+        cells = [_cell(f"<w:p>{_run(text)}</w:p>", col_width) for text in texts]
+        if url:
+            rid = f"{rid_prefix}_{len(links) + 1}"
+            links.append((rid, url))
+            cells.append(_cell(_link_paragraph(rid), col_width))
+        else:
+            cells.append(_cell(f"<w:p>{_run(NO_LINK_TEXT)}</w:p>", col_width))
+        parts.append("<w:tr>" + "".join(cells) + "</w:tr>")
+    parts.append("</w:tbl>")
+    return "".join(parts), links
+
+
+def _build(job):
+    return table_xml(*job)
+
+
+def build_tables(jobs, workers=None):
+    """Genera le tabelle di tutte le sezioni, in parallelo se le righe sono tante.
+
+    `jobs` è una lista di argomenti di table_xml; il risultato è nello stesso ordine.
+    """
+    total_rows = sum(len(job[1]) for job in jobs)
+    workers = workers or min(len(jobs), os.cpu_count() or 1)
+    if workers <= 1 or total_rows < PARALLEL_MIN_ROWS:
+        return [_build(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return list(executor.map(_build, jobs))
+
+
+def insert_table(paragraph, xml, links):
+    """Inserisce la tabella prima di `paragraph` e registra i suoi hyperlink nel documento."""
+    from docx.oxml import parse_xml
+
+    rels = paragraph.part.rels
+    for rid, url in links:
+        rels.add_relationship(HYPERLINK_RELTYPE, url, rid, is_external=True)
+    table = parse_xml(xml)
+    paragraph._p.addprevious(table)
+    return table
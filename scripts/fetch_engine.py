@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Motore di fetch condiviso dagli scraper IBS e Amazon e dagli stadi di arricchimento.
+Le richieste vengono eseguite in parallelo su un pool di thread e ogni host ha
+un limite di frequenza a token bucket, al posto delle pause casuali fisse.
+
+Il budget di cortesia si configura in POLITENESS oppure con la variabile
+d'ambiente NEWBOOKS_POLITENESS, ad esempio:
+
+    NEWBOOKS_POLITENESS="www.ibs.it=0.5:2,www.amazon.com=0.25:1"
+
+dove ogni voce è host=richieste_al_secondo:burst.
+
+Ogni richiesta è protetta:
+- timeout di connessione e di lettura (TIMEOUT) se il chiamante non ne indica;
+- errori di rete, 429 e 5xx vengono ritentati con backoff esponenziale con
+  jitter, rispettando Retry-After; durante l'attesa l'intero host resta in
+  pausa, non solo il thread che ha ricevuto la risposta;
+- le pagine captcha (Amazon, Google, protezioni anti-bot) sollevano
+  CaptchaError senza nuovi tentativi;
+- un circuit breaker per host: dopo BREAKER_THRESHOLD errori consecutivi, un
+  captcha o un Retry-After troppo lungo, le richieste all'host falliscono
+  subito con HostUnavailable fino alla fine del periodo di pausa; poi una
+  sola richiesta di prova decide se riaprire il traffico.
+
+`stats()` restituisce per host latenze (p50/p90/p99/max), tentativi,
+errori e stato del circuito; le latenze per host finiscono anche nel report
+delle metriche.
+
+Con NEWBOOKS_HTTP_RECORD le risposte vengono registrate, con
+NEWBOOKS_HTTP_REPLAY servite da un server locale di riproduzione
+(vedi http_replay.py).
+"""
+
+import os
+import random
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+
+import run_metrics
+
+# Budget di cortesia per host: (richieste al secondo, burst massimo)
+POLITENESS = {
+    'www.ibs.it': (0.5, 2),
+    'www.amazon.com': (0.25, 1),
+    'www.google.com': (0.66, 1),
+    'covers.openlibrary.org': (5, 5),
+    'images-na.ssl-images-amazon.com': (5, 5),
+}
+
+# Limite usato per gli host non presenti in POLITENESS
+DEFAULT_POLITENESS = (0.5, 1)
+
+# Numero massimo di richieste in volo contemporaneamente
+MAX_WORKERS = int(os.environ.get('NEWBOOKS_FETCH_WORKERS', '8'))
+
+# Timeout predefinito (connessione, lettura) in secondi
+TIMEOUT = (5, 20)
+
+# Nuovi tentativi e backoff esponenziale con jitter
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+# Un Retry-After più lungo non si attende: il circuito dell'host si apre
+MAX_RETRY_AFTER = 120.0
+
+# Circuit breaker per host
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 60.0
+BREAKER_MAX_COOLDOWN = 900.0
+CAPTCHA_COOLDOWN = 900.0
+
+# Frammenti delle pagine di verifica anti-bot (cercati solo all'inizio del corpo)
+CAPTCHA_MARKERS = [
+    b'/errors/validateCaptcha',
+    b'Type the characters you see in this image',
+    b'Our systems have detected unusual traffic',
+    b'captcha-delivery.com',
+    b'cf-chl-',
+]
+CAPTCHA_URL_MARKERS = ['google.com/sorry/']
+CAPTCHA_SCAN_BYTES = 32 * 1024
+
+
+class CaptchaError(requests.exceptions.RequestException):
+    """L'host ha risposto con una pagina di verifica anti-bot."""
+
+
+class HostUnavailable(requests.exceptions.RequestException):
+    """Circuito aperto: l'host ha fallito di recente e la richiesta non viene tentata."""
+
+
+def load_politeness(env_value=None):
+    """Restituisce il budget per host, applicando gli override da NEWBOOKS_POLITENESS."""
+    politeness = dict(POLITENESS)
+    env_value = env_value if env_value is not None else os.environ.get('NEWBOOKS_POLITENESS', '')
+    for item in env_value.split(','):
+        if '=' not in item:
+            continue
+        host, budget = item.split('=', 1)
+        rate, _, burst = budget.partition(':')
+        try:
+            politeness[host.strip()] = (float(rate), int(burst or 1))
+        except ValueError:
+            logging.warning(f"Budget di cortesia non valido ignorato: {item}")
+    return politeness
+
+
+class TokenBucket:
+    """Limitatore a token bucket: `rate` token al secondo, al massimo `capacity` accumulati."""
+
+    def __init__(self, rate, capacity=1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocca finché non è disponibile un token e lo consuma."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Nessun token per `seconds` secondi (es. dopo un 429 con Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class CircuitBreaker:
+    """Circuito di un host: chiuso, aperto (fallisce subito) o semiaperto (una prova)."""
+
+    CLOSED, OPEN, HALF_OPEN = "chiuso", "aperto", "semiaperto"
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, cooldown=BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True se la richiesta può partire."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self._opened_until:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def retry_in(self):
+        with self._lock:
+            return max(0.0, self._opened_until - time.monotonic())
+
+    def success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                # Pausa che raddoppia a ogni nuova apertura consecutiva
+                self._open(min(self.cooldown * 2 ** self.trips, BREAKER_MAX_COOLDOWN))
+
+    def trip(self, seconds):
+        """Apre subito il circuito (captcha, Retry-After molto lungo)."""
+        with self._lock:
+            self._open(seconds)
+
+    def _open(self, seconds):
+        self.state = self.OPEN
+        self.trips += 1
+        self._probing = False
+        self._opened_until = max(self._opened_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value):
+    """Secondi indicati da Retry-After (numero o data HTTP), oppure None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Attesa prima del tentativo `attempt` + 1: jitter pieno su un tetto esponenziale,
+    mai meno di quanto chiesto da Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def is_captcha(response):
+    """True se la risposta è una pagina di verifica anti-bot."""
+    if any(marker in (response.url or '') for marker in CAPTCHA_URL_MARKERS):
+        return True
+    head = response.content[:CAPTCHA_SCAN_BYTES]
+    return any(marker in head for marker in CAPTCHA_MARKERS)
+
+
+class HostStats:
+    """Latenze ed esiti delle richieste verso un host."""
+
+    def __init__(self):
+        self.latencies_ms = []
+        self.retries = 0
+        self.errors = 0
+        self.captchas = 0
+        self.fast_failures = 0
+
+
+class FetchEngine:
+    """Pool di thread con una sessione HTTP per thread, un token bucket e un
+    circuit breaker per host."""
+
+    def __init__(self, politeness=None, max_workers=MAX_WORKERS, max_retries=MAX_RETRIES, sleep=time.sleep,
+                 recorder=None, replay_url=None):
+        self.politeness = politeness if politeness is not None else load_politeness()
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self._sleep = sleep
+        self.recorder = recorder
+        self.replay_url = replay_url
+        self._buckets = {}
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._executor = None
+
+    def bucket(self, host):
+        """Restituisce (creandolo se serve) il token bucket dell'host."""
+        with self._lock:
+            if host not in self._buckets:
+                rate, burst = self.politeness.get(host, DEFAULT_POLITENESS)
+                self._buckets[host] = TokenBucket(rate, burst)
+            return self._buckets[host]
+
+    def breaker(self, host):
+        """Restituisce (creandolo se serve) il circuit breaker dell'host."""
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+                self._stats[host] = HostStats()
+            return self._breakers[host]
+
+    def session(self):
+        """Sessione keep-alive del thread corrente."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def _count(self, host, name):
+        with self._lock:
+            stats = self._stats[host]
+            setattr(stats, name, getattr(stats, name) + 1)
+
+    def _attempt(self, host, url, headers, kwargs):
+        """Una singola richiesta, misurata; solleva le eccezioni di requests."""
+        target = url
+        if self.replay_url:
+            from http_replay import replay_target
+            target = replay_target(self.replay_url, url)
+        start = time.perf_counter()
+        try:
+            response = self.session().get(target, headers=headers, **kwargs)
+        except requests.exceptions.RequestException:
+            run_metrics.record_http("errore", 0, time.perf_counter() - start, host)
+            raise
+        elapsed = time.perf_counter() - start
+        if self.recorder is not None:
+            self.recorder.record(url, response, elapsed)
+        if kwargs.get('stream'):
+            nbytes = int(response.headers.get('Content-Length') or 0)
+        else:
+            nbytes = len(response.content)
+        run_metrics.record_http(response.status_code, nbytes, elapsed, host)
+        with self._lock:
+            self._stats[host].latencies_ms.append(elapsed * 1000)
+        return response
+
+    def get(self, url, headers=None, polite=True, **kwargs):
+        """Esegue una GET con timeout, nuovi tentativi e circuit breaker dell'host.
+
+        Con `polite` (predefinito) rispetta anche il budget di cortesia; chi ha
+        già un proprio limite di concorrenza per host (le copertine) lo disattiva.
+        Dopo l'ultimo tentativo su 429/5xx restituisce l'ultima risposta.
+        """
+        host = urlparse(url).netloc
+        breaker = self.breaker(host)
+        kwargs.setdefault('timeout', TIMEOUT)
+
+        for attempt in range(self.max_retries + 1):
+            if not breaker.allow():
+                self._count(host, "fast_failures")
+                run_metrics.incr("http_fast_fail")
+                raise HostUnavailable(f"{host} non disponibile (circuito aperto, "
+                                      f"nuova prova tra {breaker.retry_in():.0f}s): {url}")
+            if polite:
+                self.bucket(host).acquire()
+
+            try:
+                response = self._attempt(host, url, headers, kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                breaker.failure()
+                self._count(host, "errors")
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logging.warning(f"{host}: {type(e).__name__}, nuovo tentativo tra {delay:.1f}s")
+            else:
+                if response.status_code in RETRY_STATUSES:
+                    breaker.failure()
+                    self._count(host, "errors")
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if retry_after is not None and retry_after > MAX_RETRY_AFTER:
+                        # Attesa troppo lunga per questa esecuzione: l'host si ferma
+                        breaker.trip(retry_after)
+                        logging.warning(f"{host}: {response.status_code} con Retry-After {retry_after:.0f}s, "
+                                        "circuito aperto")
+                        return response
+                    if attempt == self.max_retries:
+                        return response
+                    response.close()
+                    delay = backoff_delay(attempt, retry_after)
+                    self.bucket(host).pause(delay)
+                    logging.warning(f"{host}: HTTP {response.status_code}, nuovo tentativo tra {delay:.1f}s")
+                elif not kwargs.get('stream') and is_captcha(response):
+                    breaker.trip(CAPTCHA_COOLDOWN)
+                    self._count(host, "captchas")
+                    run_metrics.incr("http_captcha")
+                    raise CaptchaError(f"Pagina captcha da {host}: circuito aperto per "
+                                       f"{CAPTCHA_COOLDOWN:.0f}s ({url})")
+                else:
+                    breaker.success()
+                    return response
+
+            self._count(host, "retries")
+            run_metrics.incr("http_retries")
+            self._sleep(delay)
+
+    def stats(self):
+        """{host: latenze (ms) ed esiti} delle richieste fatte dal processo."""
+        with self._lock:
+            return {
+                host: {
+                    **run_metrics.summarize(stats.latencies_ms),
+                    "retries": stats.retries, "errors": stats.errors, "captchas": stats.captchas,
+                    "fast_failures": stats.fast_failures,
+                    "circuit": self._breakers[host].state, "trips": self._breakers[host].trips,
+                }
+                for host, stats in sorted(self._stats.items())
+            }
+
+    def summary(self):
+        """Righe di riepilogo per host, con le latenze di coda."""
+        lines = []
+        for host, stats in self.stats().items():
+            lines.append(f"{host}: {stats['count']} risposte, p50 {stats['p50']:.0f}ms, "
+                         f"p90 {stats['p90']:.0f}ms, p99 {stats['p99']:.0f}ms, max {stats['max']:.0f}ms; "
+                         f"{stats['retries']} nuovi tentativi, {stats['errors']} errori, "
+                         f"{stats['captchas']} captcha, {stats['fast_failures']} rifiutate "
+                         f"(circuito {stats['circuit']})")
+        return "\n".join(lines)
+
+    def map(self, fn, items):
+        """Applica `fn` a ogni elemento in parallelo, restituendo i risultati in ordine."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # Le metriche dei thread del pool vanno allo stadio del chiamante
+        fn = run_metrics.bind(fn)
+        futures = [self._executor.submit(fn, item) for item in items]
+        return [future.result() for future in futures]
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Motore condiviso dal processo corrente."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            recorder = None
+            if os.environ.get('NEWBOOKS_HTTP_RECORD'):
+                from http_replay import recorder_from_env
+                recorder = recorder_from_env()
+            _engine = FetchEngine(recorder=recorder, replay_url=os.environ.get('NEWBOOKS_HTTP_REPLAY'))
+        return _engine
@@ -1,44 +1,113 @@
 import os
-import pandas as pd
-import json
+from datetime import date
 from urllib.parse import quote
 
+from book_ids import book_id
+from catalog_db import open_catalog
+from work_ids import assign_work_ids
+from prices import record_prices
+import run_metrics
+
 # Percorsi
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 ITALIAN_CSV = os.path.join(SCRIPT_DIR, "libri_italiani_links.csv")
 AMERICAN_CSV = os.path.join(SCRIPT_DIR, "libri_americani_links.csv")
-OUTPUT_JSON = os.path.join(SCRIPT_DIR, "../data/books.json")
+
+# Campi che arrivano dagli scraper: sono gli unici aggiornati dal merge.
+# Gli altri (releaseDate, cover, ...) sono arricchimenti e vengono conservati.
+SOURCE_FIELDS = ["title", "author", "categoria", "link_acquisto", "origin"]
 
 def build_annas_link(title, author):
     query = quote(f"{title} {author}")
     return f"https://annas-archive.org/search?q={query}"
 
-# Carica i CSV se esistono
-df_list = []
-
-if os.path.exists(ITALIAN_CSV):
-    df_italian = pd.read_csv(ITALIAN_CSV)
-    df_italian["origin"] = "IT"
-    df_italian = df_italian.rename(columns={"titolo": "title", "autore": "author"})
-    df_list.append(df_italian[["title", "author", "categoria", "link_acquisto", "origin"]])
-
-if os.path.exists(AMERICAN_CSV):
-    df_american = pd.read_csv(AMERICAN_CSV)
-    df_american["origin"] = "US"
-    df_american = df_american.rename(columns={"titolo": "title", "autore": "author"})
-    df_american["categoria"] = df_american.get("categoria", "Various")
-    df_list.append(df_american[["title", "author", "categoria", "link_acquisto", "origin"]])
-
-if df_list:
-    df_all = pd.concat(df_list, ignore_index=True)
-    df_all["releaseDate"] = pd.Timestamp.today().strftime("%Y-%m-%d")
-    df_all["cover"] = ""
-    df_all["annas_link"] = df_all.apply(lambda row: build_annas_link(row["title"], row["author"]), axis=1)
-    df_all = df_all.fillna("")
-
-    with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-        json.dump(df_all.to_dict(orient="records"), f, ensure_ascii=False, indent=2)
-
-    print(f"[✓] Creato {OUTPUT_JSON} come array JSON con annas_link")
-else:
-    print("[!] Nessun CSV trovato. JSON non creato.")
+def load_sources():
+    """Carica i CSV degli scraper e restituisce i record nel formato di books.json."""
+    import book_frames
+    df_italian = book_frames.read_source_csv(ITALIAN_CSV)
+    df_american = book_frames.read_source_csv(AMERICAN_CSV)
+    return records_from_frames(df_italian, df_american)
+
+def records_from_frames(df_italian, df_american):
+    """Converte i DataFrame degli scraper (None se assenti) nei record di books.json,
+    con `annas_link` già calcolato; None se non ci sono righe."""
+    import book_frames
+    frame = book_frames.catalog_frame(df_italian, df_american)
+    if frame is None:
+        return None
+    return frame.to_dict(orient="records")
+
+def merge_catalog(existing, incoming, today):
+    """Unisce i record appena importati al catalogo esistente.
+
+    I libri già presenti aggiornano solo i campi di origine cambiati e conservano
+    gli arricchimenti; i nuovi ricevono i valori iniziali. Ogni record riceve
+    `isNew` e `dirty` (nuovo o modificato in questa importazione), così gli stadi
+    successivi possono lavorare solo sul delta. I libri non più presenti negli
+    elenchi escono dal catalogo, come nella rigenerazione completa.
+    """
+    merged = {}
+    stats = {"nuovi": 0, "modificati": 0, "invariati": 0}
+
+    for record in incoming:
+        record_id = book_id(record)
+        if record_id in merged:
+            continue
+
+        old = existing.get(record_id)
+        if old is None:
+            book = {field: record[field] for field in SOURCE_FIELDS}
+            book.update({
+                "id": record_id,
+                "releaseDate": today,
+                "cover": "",
+                "annas_link": record.get("annas_link") or build_annas_link(record["title"], record["author"]),
+                "isNew": True,
+                "dirty": True,
+            })
+            stats["nuovi"] += 1
+        else:
+            book = dict(old)
+            book["id"] = record_id
+            changed = [field for field in SOURCE_FIELDS if book.get(field) != record[field]]
+            for field in changed:
+                book[field] = record[field]
+            if "title" in changed or "author" in changed or not book.get("annas_link"):
+                book["annas_link"] = record.get("annas_link") or build_annas_link(book["title"], book["author"])
+            book["isNew"] = False
+            book["dirty"] = bool(changed)
+            stats["modificati" if changed else "invariati"] += 1
+
+        merged[record_id] = book
+
+    return list(merged.values()), stats
+
+def update_catalog(incoming):
+    """Unisce i record importati al catalogo SQLite; restituisce (libri, statistiche)."""
+    today = date.today().strftime("%Y-%m-%d")
+    with open_catalog() as catalog:
+        existing = {book["id"]: book for book in catalog.books()}
+        books, stats = merge_catalog(existing, incoming, today)
+        # Quasi-duplicati (sottotitoli, punteggiatura, autore mancante) -> stessa opera
+        stats["opere"] = assign_work_ids(books)
+        catalog.replace_all(books)
+    # Serie storiche dei prezzi (solo i cambi di prezzo occupano spazio)
+    stats["prezzi_cambiati"] = record_prices(incoming, today)
+    run_metrics.incr("records_in", len(incoming))
+    run_metrics.incr("records_out", len(books))
+    return books, stats
+
+def main():
+    with run_metrics.stage("catalogo"):
+        incoming = load_sources()
+        if incoming is None:
+            print("[!] Nessun CSV trovato. Catalogo non aggiornato.")
+            return
+
+        books, stats = update_catalog(incoming)
+    run_metrics.write_report()
+    print(f"[✓] Catalogo aggiornato: {stats['nuovi']} nuovi, "
+          f"{stats['modificati']} modificati, {stats['invariati']} invariati, {stats['opere']} opere distinte")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache HTTP persistente su disco per le pagine degli elenchi, le pagine prodotto
+e le ricerche Google.
+
+- Le pagine ancora entro il loro TTL vengono servite senza toccare la rete.
+- Le pagine scadute vengono rivalidate con richieste condizionali
+  (If-None-Match / If-Modified-Since): un 304 riusa il corpo salvato.
+- La dimensione totale è limitata; oltre il limite si eliminano le pagine
+  usate meno di recente (LRU).
+- Per ogni pagina si può memorizzare il risultato del parsing: se il corpo è
+  identico byte per byte all'ultima volta e il parser non è cambiato
+  (impronta del sorgente dei suoi moduli), il parsing viene saltato.
+
+La cartella si può spostare con NEWBOOKS_HTTP_CACHE; con il valore "off"
+la cache viene disattivata e ogni richiesta va in rete.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import logging
+import functools
+import importlib.util
+
+from fetch_engine import get_engine
+import run_metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.environ.get('NEWBOOKS_HTTP_CACHE', os.path.join(SCRIPT_DIR, "..", "data", "http_cache"))
+
+# Dimensione massima dei corpi salvati
+MAX_BYTES = 200 * 1024 * 1024
+
+# TTL predefinito e regole per URL (la prima regola che corrisponde vince)
+DEFAULT_TTL = 6 * 3600
+TTL_RULES = [
+    (re.compile(r'^https://www\.google\.com/search'), 14 * 24 * 3600),
+    (re.compile(r'^https://www\.ibs\.it/.*/e/\d+'), 7 * 24 * 3600),
+    (re.compile(r'/ultimi-90-giorni'), 6 * 3600),
+    (re.compile(r'^https://www\.amazon\.com/gp/new-releases/'), 6 * 3600),
+]
+
+
+class CachedPage:
+    """Risposta servita dalla cache o dalla rete."""
+
+    def __init__(self, url, status, content, encoding, body_hash, from_cache, revalidated=False):
+        self.url = url
+        self.status_code = status
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.body_hash = body_hash
+        self.from_cache = from_cache
+        self.revalidated = revalidated
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+
+def ttl_for(url):
+    """TTL in secondi da applicare all'URL."""
+    for pattern, ttl in TTL_RULES:
+        if pattern.search(url):
+            return ttl
+    return DEFAULT_TTL
+
+
+def _default_fetch(url, headers=None):
+    return get_engine().get(url, headers=headers)
+
+
+class HttpCache:
+    """Indice SQLite con i metadati e un file per ogni corpo salvato."""
+
+    def __init__(self, path=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(path, "bodies"), exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                status INTEGER,
+                etag TEXT,
+                last_modified TEXT,
+                encoding TEXT,
+                body_hash TEXT,
+                size INTEGER,
+                fetched_at REAL,
+                accessed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS pages_accessed ON pages(accessed_at);
+            CREATE TABLE IF NOT EXISTS parsed (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT,
+                records TEXT,
+                parser TEXT
+            );
+        """)
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(parsed)")}
+        if "parser" not in existing:
+            self._db.execute("ALTER TABLE parsed ADD COLUMN parser TEXT")
+        self._db.commit()
+
+    def _body_path(self, url):
+        return os.path.join(self.path, "bodies", hashlib.sha256(url.encode('utf-8')).hexdigest())
+
+    def _row(self, url):
+        return self._db.execute(
+            "SELECT status, etag, last_modified, encoding, body_hash, fetched_at FROM pages WHERE url = ?",
+            (url,)).fetchone()
+
+    def _read_body(self, url):
+        try:
+            with open(self._body_path(url), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def get(self, url, headers=None, fetch=None, ttl=None):
+        """Restituisce la pagina come CachedPage, rivalidandola solo quando è scaduta.
+
+        `fetch(url, headers=...)` esegue la richiesta reale e deve restituire un
+        oggetto con `status_code`, `headers`, `content` ed `encoding` (come requests).
+        Le risposte di errore vengono sollevate con raise_for_status e non salvate.
+        """
+        fetch = fetch or _default_fetch
+        ttl = ttl_for(url) if ttl is None else ttl
+        now = time.time()
+
+        with self._lock:
+            row = self._row(url)
+        body = self._read_body(url) if row else None
+        if row and body is None:
+            row = None
+
+        if row:
+            status, etag, last_modified, encoding, body_hash, fetched_at = row
+            if now - fetched_at < ttl:
+                run_metrics.incr("cache_hit")
+                self._touch(url, now)
+                return CachedPage(url, status, body, encoding, body_hash, from_cache=True)
+            conditional = dict(headers or {})
+            if etag:
+                conditional['If-None-Match'] = etag
+            if last_modified:
+                conditional['If-Modified-Since'] = last_modified
+            response = fetch(url, headers=conditional)
+            if response.status_code == 304:
+                run_metrics.incr("cache_hit")
+                run_metrics.incr("cache_revalidated")
+                with self._lock:
+                    self._db.execute("UPDATE pages SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                                     (now, now, url))
+                    self._db.commit()
+                return CachedPage(url, status, body, encoding, body_hash, from_cache=True, revalidated=True)
+        else:
+            response = fetch(url, headers=headers)
+
+        run_metrics.incr("cache_miss")
+        response.raise_for_status()
+        return self._store(url, response, now)
+
+    def _store(self, url, response, now):
+        content = response.content
+        body_hash = hashlib.sha256(content).hexdigest()
+        encoding = response.encoding
+        tmp_path = self._body_path(url) + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, self._body_path(url))
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, response.status_code, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+                 encoding, body_hash, len(content), now, now))
+            self._db.commit()
+            self._evict()
+        return CachedPage(url, response.status_code, content, encoding, body_hash, from_cache=False)
+
+    def _touch(self, url, now):
+        with self._lock:
+            self._db.execute("UPDATE pages SET accessed_at = ? WHERE url = ?", (now, url))
+            self._db.commit()
+
+    def _evict(self):
+        """Elimina le pagine usate meno di recente finché la cache non rientra nel limite."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY accessed_at").fetchall():
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            self._db.execute("DELETE FROM parsed WHERE url = ?", (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+        self._db.commit()
+        logging.info(f"Cache HTTP ridotta a {total} byte")
+
+    def parsed(self, url, body_hash, parser=None):
+        """Record estratti l'ultima volta da questa pagina, se né il corpo né il parser sono cambiati."""
+        with self._lock:
+            row = self._db.execute("SELECT body_hash, records, parser FROM parsed WHERE url = ?", (url,)).fetchone()
+        if row and row[0] == body_hash and row[2] == parser:
+            return json.loads(row[1])
+        return None
+
+    def store_parsed(self, url, body_hash, records, parser=None):
+        """Memorizza i record estratti da una pagina con il suo hash e la versione del parser."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO parsed (url, body_hash, records, parser) VALUES (?, ?, ?, ?)",
+                             (url, body_hash, json.dumps(records, ensure_ascii=False), parser))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class NullCache:
+    """Sostituto senza memoria usato quando la cache è disattivata."""
+
+    def get(self, url, headers=None, fetch=None, ttl=None):
+        response = (fetch or _default_fetch)(url, headers=headers)
+        response.raise_for_status()
+        content = response.content
+        return CachedPage(url, response.status_code, content, response.encoding,
+                          hashlib.sha256(content).hexdigest(), from_cache=False)
+
+    def parsed(self, url, body_hash, parser=None):
+        return None
+
+    def store_parsed(self, url, body_hash, records, parser=None):
+        pass
+
+    def close(self):
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Cache condivisa dal processo corrente."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = NullCache() if CACHE_DIR == 'off' else HttpCache(CACHE_DIR)
+        return _cache
+
+
+@functools.lru_cache(maxsize=None)
+def parser_version(modules):
+    """Impronta del sorgente dei moduli di parsing: cambia con ogni correzione del parser."""
+    digest = hashlib.sha256()
+    for name in modules:
+        module = sys.modules.get(name)
+        path = getattr(module, "__file__", None)
+        if path is None:
+            spec = importlib.util.find_spec(name)
+            path = spec.origin if spec is not None else None
+        digest.update(name.encode('utf-8'))
+        if path and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def parse_cached(page, parse, parsers=()):
+    """Esegue `parse(page.text)` solo se il corpo o il parser sono cambiati dall'ultimo parsing.
+
+    La versione del parser è l'impronta del modulo che definisce `parse` e dei
+    moduli in `parsers` (es. "ibs_parser").
+    """
+    cache = get_cache()
+    version = parser_version((parse.__module__, *parsers))
+    records = cache.parsed(page.url, page.body_hash, version)
+    if records is None:
+        start = time.perf_counter()
+        records = parse(page.text)
+        run_metrics.observe("parse_ms", (time.perf_counter() - start) * 1000)
+        run_metrics.incr("pages_parsed")
+        cache.store_parsed(page.url, page.body_hash, records, version)
+    else:
+        run_metrics.incr("pages_parse_reused")
+    return records
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Registrazione e riproduzione delle richieste HTTP della pipeline.
+
+Registrazione: con NEWBOOKS_HTTP_RECORD=<cartella> ogni risposta ricevuta dal
+motore di fetch (scraper, copertine, date, ...) viene salvata nella cartella:
+
+    index.jsonl       una riga per risposta: url, stato, header utili,
+                      hash del corpo, latenza misurata
+    bodies/<sha256>   i corpi, salvati una volta per contenuto
+
+Riproduzione: `serve` avvia un server HTTP locale che risponde con le
+risposte registrate (l'ultima per ogni URL); con
+NEWBOOKS_HTTP_REPLAY=http://127.0.0.1:<porta> il motore di fetch invia lì ogni
+richiesta, codificando l'URL originale nel percorso. Budget di cortesia,
+circuit breaker e statistiche restano riferiti all'host originale.
+
+Il server può aggiungere latenza (fissa più jitter) e iniettare errori 503
+con una data probabilità, con un seme fisso per esecuzioni ripetibili. Gli URL
+non registrati rispondono 404 e vengono contati come mancanti.
+
+Uso:
+    NEWBOOKS_HTTP_RECORD=data/http_capture python -m scripts update-books
+    python -m scripts replay serve data/http_capture [--port 8765] [--latency-ms 50]
+        [--jitter-ms 20] [--error-rate 0.02] [--seed 1]
+    python -m scripts replay info data/http_capture
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+INDEX_NAME = "index.jsonl"
+BODIES_DIR = "bodies"
+
+# Header della risposta conservati nella registrazione
+# (i redirect sono già seguiti: si registra la risposta finale sotto l'URL richiesto)
+RECORDED_HEADERS = ["Content-Type", "ETag", "Last-Modified", "Retry-After"]
+
+
+def replay_target(base_url, url):
+    """URL del server di riproduzione che serve la risposta registrata per `url`."""
+    return f"{base_url.rstrip('/')}/{quote(url, safe='')}"
+
+
+class Recorder:
+    """Salva le risposte del motore di fetch in una cartella di registrazione."""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.join(path, BODIES_DIR), exist_ok=True)
+        self._lock = threading.Lock()
+
+    def record(self, url, response, elapsed_s):
+        # Con stream=True il corpo viene letto qui; iter_content lo riusa dalla memoria
+        content = response.content
+        digest = hashlib.sha256(content).hexdigest()
+        body_path = os.path.join(self.path, BODIES_DIR, digest)
+        entry = {
+            "url": url,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "body": digest,
+            "bytes": len(content),
+            "elapsed_ms": round(elapsed_s * 1000, 1),
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if not os.path.exists(body_path):
+                with open(body_path + ".tmp", "wb") as f:
+                    f.write(content)
+                os.replace(body_path + ".tmp", body_path)
+            with open(os.path.join(self.path, INDEX_NAME), "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+def recorder_from_env():
+    path = os.environ.get('NEWBOOKS_HTTP_RECORD')
+    return Recorder(path) if path else None
+
+
+def load_capture(path):
+    """{url: voce} con l'ultima risposta registrata per ogni URL."""
+    responses = {}
+    with open(os.path.join(path, INDEX_NAME), "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            responses[entry["url"]] = entry
+    return responses
+
+
+class ReplayServer:
+    """Server locale che riproduce una registrazione, con latenza ed errori iniettati."""
+
+    def __init__(self, capture_dir, port=0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=None):
+        self.capture_dir = capture_dir
+        self.responses = load_capture(capture_dir)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.counters = Counter()
+        self.misses = []
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def _draw(self):
+        """(ritardo in secondi, errore iniettato) per una richiesta."""
+        with self._lock:
+            delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+            return delay, self._random.random() < self.error_rate
+
+    def _count(self, name, value=1, url=None):
+        with self._lock:
+            self.counters[name] += value
+            if url is not None:
+                self.misses.append(url)
+
+    def _body(self, digest):
+        with open(os.path.join(self.capture_dir, BODIES_DIR, digest), "rb") as f:
+            return f.read()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, headers=(), body=b""):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                url = unquote(self.path.lstrip("/"))
+                delay, inject_error = server._draw()
+                if delay:
+                    time.sleep(delay)
+                entry = server.responses.get(url)
+                if entry is None:
+                    server._count("mancanti", url=url)
+                    self._reply(404, [("X-Replay", "miss")])
+                    return
+                if inject_error:
+                    server._count("errori_iniettati")
+                    self._reply(503, [("Retry-After", "1"), ("X-Replay", "error")])
+                    return
+                headers = entry["headers"]
+                if headers.get("ETag") and self.headers.get("If-None-Match") == headers["ETag"]:
+                    server._count("non_modificate")
+                    self._reply(304, [("ETag", headers["ETag"])])
+                    return
+                body = server._body(entry["body"])
+                server._count("servite")
+                server._count("byte", len(body))
+                self._reply(entry["status"], list(headers.items()), body)
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def info(capture_dir):
+    responses = load_capture(capture_dir)
+    hosts = Counter(urlparse(url).netloc for url in responses)
+    total = sum(entry["bytes"] for entry in responses.values())
+    print(f"[✓] {len(responses)} URL registrati, {total / 1024 / 1024:.1f} MiB")
+    for host, count in hosts.most_common():
+        print(f"  {host}: {count}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registrazioni HTTP della pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    serve = subparsers.add_parser("serve", help="riproduce una registrazione da un server locale")
+    serve.add_argument("capture")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--latency-ms", type=float, default=0.0)
+    serve.add_argument("--jitter-ms", type=float, default=0.0)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--seed", type=int, default=None)
+    show = subparsers.add_parser("info", help="riepilogo di una registrazione")
+    show.add_argument("capture")
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        info(args.capture)
+        return 0
+
+    server = ReplayServer(args.capture, args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    print(f"[✓] {len(server.responses)} risposte registrate servite su {server.url}")
+    print(f"    export NEWBOOKS_HTTP_REPLAY={server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+        print(f"[✓] Richieste: {server.stats()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Arricchimento dalle schede prodotto IBS.
+
+Ogni libro IBS ha già la sua scheda in `link_acquisto`: una sola richiesta
+per libro fornisce ISBN, data di pubblicazione esatta, copertina, editore e
+numero di pagine, al posto delle ricerche su Google per data e copertina
+(due richieste a terzi per libro, con esiti incerti).
+
+- Solo i libri IBS nuovi o modificati (`dirty`) vengono elaborati.
+- Le schede passano dalla cache HTTP (TTL di 7 giorni per le pagine /e/)
+  e gli esiti estratti dalla LookupCache: un libro già letto non costa nulla.
+- Le richieste procedono in parallelo su DETAILS_WORKERS thread, entro il
+  budget di cortesia di www.ibs.it del motore di fetch.
+
+La data trovata segna il libro come `dateResolved`, quindi update_release_dates
+non lo cerca più su Google; la copertina IBS rende inutile cerca-copertine.
+
+L'estrazione legge prima i dati strutturati JSON-LD (Book o Product) e poi,
+per i campi mancanti, le coppie etichetta/valore dei dettagli del prodotto
+e i meta Open Graph.
+"""
+
+import os
+import re
+import json
+import logging
+from datetime import date
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from lxml import etree, html as lxml_html
+
+from book_ids import extract_isbn
+from catalog_db import open_catalog
+from fetch_engine import get_engine
+from http_cache import get_cache
+from lookup_cache import LookupCache, make_key, HIT, DAY
+import run_metrics
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept-Language': 'it-IT,it;q=0.9,en-US;q=0.8,en;q=0.7',
+    'Referer': 'https://www.ibs.it/',
+}
+
+DETAILS_WORKERS = int(os.environ.get("NEWBOOKS_DETAILS_WORKERS", "4"))
+CHECKPOINT_EVERY = int(os.environ.get("NEWBOOKS_DETAILS_CHECKPOINT", "25"))
+
+# Libri da elaborare: IBS, nuovi o modificati nell'ultima importazione
+PENDING_WHERE = "COALESCE(dirty, 1) = 1 AND origin = 'IT'"
+
+DETAIL_FIELDS = ["isbn", "releaseDate", "cover", "publisher", "pages"]
+
+XP_JSON_LD = etree.XPath("//script[@type='application/ld+json']/text()")
+XP_OG_IMAGE = etree.XPath("//meta[@property='og:image']/@content")
+# Possibili etichette: celle, termini di definizione, span e strong nei dettagli
+XP_LABELS = etree.XPath("//dt | //th | //span | //strong | //b | //label")
+
+# Etichette dei dettagli prodotto IBS (normalizzate in minuscolo, senza ":")
+LABELS = {
+    "ean": "isbn",
+    "isbn": "isbn",
+    "editore": "publisher",
+    "data di pubblicazione": "releaseDate",
+    "in commercio dal": "releaseDate",
+    "pagine": "pages",
+    "numero pagine": "pages",
+}
+
+MESI = {
+    "gennaio": 1, "febbraio": 2, "marzo": 3, "aprile": 4, "maggio": 5, "giugno": 6,
+    "luglio": 7, "agosto": 8, "settembre": 9, "ottobre": 10, "novembre": 11, "dicembre": 12,
+}
+
+RE_ISO_DATE = re.compile(r'(\d{4})-(\d{2})-(\d{2})')
+RE_NUMERIC_DATE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4})')
+RE_TEXT_DATE = re.compile(r'(\d{1,2})\s+(' + '|'.join(MESI) + r')\s+(\d{4})', re.IGNORECASE)
+RE_ISBN13 = re.compile(r'97[89]\d{10}')
+RE_PAGES = re.compile(r'\d+')
+
+
+def parse_date(text):
+    """Data ISO (AAAA-MM-GG) da "2025-10-07", "07/10/2025" o "7 ottobre 2025"; altrimenti None."""
+    text = str(text or '')
+    match = RE_ISO_DATE.search(text)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = RE_NUMERIC_DATE.search(text)
+        if match:
+            day, month, year = match.groups()
+        else:
+            match = RE_TEXT_DATE.search(text)
+            if not match:
+                return None
+            day, month, year = match.group(1), MESI[match.group(2).lower()], match.group(3)
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        # Date impossibili (31/02, mese 13, ...) non vengono scritte nel catalogo
+        return None
+
+
+def _clean(field, value):
+    """Valore normalizzato di un campo estratto, oppure None."""
+    if isinstance(value, dict):
+        value = value.get("name") or value.get("url")
+    if isinstance(value, list):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    value = str(value).strip()
+    if field == "isbn":
+        match = RE_ISBN13.search(value.replace("-", ""))
+        return match.group(0) if match else None
+    if field == "releaseDate":
+        return parse_date(value)
+    if field == "pages":
+        match = RE_PAGES.search(value)
+        return int(match.group(0)) if match else None
+    if field == "cover":
+        return value if value.startswith("http") else None
+    return value or None
+
+
+def _json_ld_items(root):
+    for script in XP_JSON_LD(root):
+        try:
+            data = json.loads(script)
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            item = stack.pop(0)
+            if not isinstance(item, dict):
+                continue
+            stack.extend(item.get("@graph", []))
+            if isinstance(item.get("workExample"), (dict, list)):
+                stack.extend(item["workExample"] if isinstance(item["workExample"], list) else [item["workExample"]])
+            yield item
+
+
+def _from_json_ld(root):
+    details = {}
+    for item in _json_ld_items(root):
+        kind = item.get("@type")
+        kinds = kind if isinstance(kind, list) else [kind]
+        if not {"Book", "Product"} & set(kinds):
+            continue
+        candidates = {
+            "isbn": item.get("isbn") or item.get("gtin13"),
+            "releaseDate": item.get("datePublished") or item.get("releaseDate"),
+            "cover": item.get("image"),
+            "publisher": item.get("publisher") or item.get("brand"),
+            "pages": item.get("numberOfPages"),
+        }
+        for field, value in candidates.items():
+            if field not in details:
+                cleaned = _clean(field, value)
+                if cleaned is not None:
+                    details[field] = cleaned
+    return details
+
+
+def _from_labels(root):
+    """Coppie etichetta/valore: il valore è il fratello successivo o il resto del testo del genitore."""
+    details = {}
+    for element in XP_LABELS(root):
+        label = (element.text_content() or '').strip().rstrip(':').strip().lower()
+        field = LABELS.get(label)
+        if field is None or field in details:
+            continue
+        sibling = element.getnext()
+        if sibling is not None:
+            value = sibling.text_content()
+        else:
+            parent = element.getparent()
+            value = parent.text_content().replace(element.text_content(), "", 1) if parent is not None else ""
+        cleaned = _clean(field, value.strip().lstrip(':'))
+        if cleaned is not None:
+            details[field] = cleaned
+    return details
+
+
+def parse_product_page(html_content):
+    """{campo: valore} estratti da una scheda prodotto IBS (solo i campi trovati)."""
+    if not html_content:
+        return {}
+    try:
+        root = lxml_html.fromstring(html_content)
+    except (etree.ParserError, ValueError):
+        return {}
+    details = _from_json_ld(root)
+    for field, value in _from_labels(root).items():
+        details.setdefault(field, value)
+    if "cover" not in details:
+        images = XP_OG_IMAGE(root)
+        cover = _clean("cover", images[0]) if images else None
+        if cover:
+            details["cover"] = cover
+    return details
+
+
+def fetch_details(book, cache):
+    """Dettagli di un libro dalla cache degli esiti o dalla sua scheda; None se non disponibili."""
+    url = book.get("link_acquisto")
+    if not url:
+        return None
+    key = make_key(url)
+    cached = cache.get(key)
+    if cached is not None:
+        status, value = cached
+        return value if status == HIT else None
+
+    try:
+        page = get_cache().get(url, headers=HEADERS, fetch=get_engine().get)
+    except requests.exceptions.RequestException as e:
+        # Errori di rete e circuito aperto non vengono memorizzati: si riprova alla prossima esecuzione
+        logging.warning(f"Scheda IBS non disponibile per {book.get('title')}: {e}")
+        return None
+    details = parse_product_page(page.text)
+    if not details:
+        cache.put_miss(key)
+        return None
+    details.setdefault("isbn", extract_isbn(url))
+    cache.put_hit(key, details)
+    return details
+
+
+def catalog_fields(book, details):
+    """Campi del catalogo da aggiornare con i dettagli della scheda."""
+    fields = {field: details[field] for field in ("isbn", "publisher", "pages", "cover")
+              if details.get(field) is not None}
+    if details.get("releaseDate") and not book.get("dateResolved"):
+        fields["releaseDate"] = details["releaseDate"]
+        fields["dateResolved"] = True
+    return {field: value for field, value in fields.items() if book.get(field) != value}
+
+
+def enrich_books(books, workers=DETAILS_WORKERS, checkpoint_every=CHECKPOINT_EVERY):
+    """Arricchisce i libri indicati (record del catalogo, aggiornati anche in memoria).
+
+    Restituisce il numero di libri aggiornati.
+    """
+    cache = LookupCache("ibs_details", hit_ttl=180 * DAY, miss_ttl=DAY, max_miss_ttl=30 * DAY)
+    updated = 0
+    with open_catalog() as catalog, ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(run_metrics.bind(lambda book: fetch_details(book, cache)), books)
+        for done, (book, details) in enumerate(zip(books, results), 1):
+            fields = catalog_fields(book, details) if details else {}
+            if fields:
+                catalog.update(book["id"], **fields)
+                book.update(fields)
+                updated += 1
+            if done % checkpoint_every == 0:
+                catalog.commit()
+                print(f"[💾] Checkpoint: {done}/{len(books)} schede elaborate")
+    run_metrics.incr("records_in", len(books))
+    run_metrics.incr("records_out", updated)
+    return updated
+
+
+def main():
+    with run_metrics.stage("schede_ibs"):
+        with open_catalog() as catalog:
+            books = list(catalog.books(PENDING_WHERE))
+        print(f"[📚] {len(books)} libri IBS nuovi o modificati da arricchire")
+        updated = enrich_books(books)
+    run_metrics.write_report()
+    print(f"[✓] Catalogo aggiornato dalle schede IBS ({updated} libri su {len(books)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Estrattore compilato per gli elenchi IBS basato su lxml.
+Restituisce gli stessi record di scraper_libri_italiani_links.parse_book_data
+(stesse tre strategie di ricerca dei contenitori, stesse regole per autore,
+editore, anno e prezzo) ma con XPath ed espressioni regolari precompilate,
+un solo albero per pagina e il testo di ogni contenitore calcolato una volta.
+"""
+
+import re
+import logging
+from urllib.parse import urljoin
+
+from lxml import etree, html as lxml_html
+
+
+def _has_class(name):
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# Strategia 1: contenitori dei prodotti
+XP_CONTAINERS = etree.XPath(
+    f"//*[{_has_class('cc-product-list-item')}] | //div[contains(@class, 'product-list-item')]"
+)
+# Strategia 2: link ai titoli
+XP_TITLE_LINKS = etree.XPath(f"//a[{_has_class('cc-title')} or @data-tracking-item-click='link']")
+# Strategia 3: qualsiasi link a una scheda libro
+XP_BOOK_LINKS = etree.XPath("//a[contains(@href, '/e/')]")
+
+# Ricerche all'interno di un contenitore (solo discendenti, come select_one)
+XP_TITLE_LINK = etree.XPath(
+    f".//a[{_has_class('cc-title')} or @data-tracking-item-click='link' or contains(@href, '/e/')]"
+)
+XP_AUTHOR = etree.XPath(f".//a[contains(@href, 'contributor') or {_has_class('cc-author')}]")
+XP_PUBLISHER = etree.XPath(f".//a[contains(@href, 'editore') or {_has_class('cc-publisher')}]")
+XP_LINKS = etree.XPath(".//a")
+XP_HAS_IMG = etree.XPath("boolean(.//img)")
+
+# Link alla pagina successiva dell'elenco
+XP_NEXT = etree.XPath(
+    "//*[(self::a or self::link) and @rel='next']/@href"
+    f" | //*[{_has_class('cc-pagination')}]//a[{_has_class('cc-next')}]/@href"
+    " | //a[contains(translate(@aria-label, 'SUCESIV', 'sucesiv'), 'successiv')]/@href"
+)
+
+RE_YEAR = re.compile(r'(\d{4})')
+RE_PRICE = re.compile(r'(\d+[,.]\d+)\s*€')
+
+MAX_RISALITA = 5
+
+
+def _text(element):
+    return element.text_content()
+
+
+def _is_product_container(element):
+    return any('product' in c for c in (element.get('class') or '').split())
+
+
+def _find_containers(root):
+    """Stesse tre strategie di parse_book_data, valutate sull'albero lxml."""
+    containers = XP_CONTAINERS(root)
+    if containers:
+        return containers
+
+    containers = []
+    for title_link in XP_TITLE_LINKS(root):
+        container = title_link.getparent()
+        for _ in range(MAX_RISALITA):
+            if container is None:
+                break
+            if _is_product_container(container):
+                containers.append(container)
+                break
+            container = container.getparent()
+    if containers:
+        return containers
+
+    for link in XP_BOOK_LINKS(root):
+        link_text = _text(link)
+        if XP_HAS_IMG(link) or (link_text and len(link_text.strip()) > 10):
+            container = link.getparent()
+            for _ in range(MAX_RISALITA):
+                if container is None:
+                    break
+                container_text = _text(container)
+                if container_text and '€' in container_text:
+                    containers.append(container)
+                    break
+                container = container.getparent()
+    return containers
+
+
+def _extract(container, categoria, base_url):
+    title_links = XP_TITLE_LINK(container)
+    if not title_links:
+        return None
+    title_link = title_links[0]
+    title = _text(title_link).strip()
+
+    href = title_link.get('href')
+    purchase_link = urljoin(base_url, href) if href is not None else None
+
+    author_elems = XP_AUTHOR(container)
+    author_elem = author_elems[0] if author_elems else None
+    if author_elem is None:
+        for a in XP_LINKS(container):
+            if a is not title_link and _text(a).strip() and not any(x in a.get('href', '') for x in ['/e/', 'offerte']):
+                author_elem = a
+                break
+    author = _text(author_elem).strip() if author_elem is not None else "Autore non disponibile"
+
+    publisher_elems = XP_PUBLISHER(container)
+    publisher_text = _text(publisher_elems[0]).strip() if publisher_elems else ""
+    publisher = publisher_text.replace(',', '').strip()
+
+    container_text = _text(container)
+    year_match = RE_YEAR.search(container_text)
+    year = year_match.group(1) if year_match else "Anno non disponibile"
+
+    price_match = RE_PRICE.search(container_text)
+    price = price_match.group(0) if price_match else "Prezzo non disponibile"
+
+    return {
+        'titolo': title,
+        'autore': author,
+        'editore': publisher,
+        'anno': year,
+        'prezzo': price,
+        'categoria': categoria,
+        'link_acquisto': purchase_link
+    }
+
+
+def parse_listing(html_content, categoria, base_url, page_url=None):
+    """Estrae in un solo passaggio i libri e il link alla pagina successiva.
+    Restituisce (libri, url_successivo)."""
+    if not html_content:
+        return [], None
+
+    root = lxml_html.fromstring(html_content)
+    containers = _find_containers(root)
+    logging.info(f"Trovati {len(containers)} possibili contenitori di libri")
+
+    books = []
+    for container in containers:
+        try:
+            book = _extract(container, categoria, base_url)
+        except Exception as e:
+            logging.error(f"Errore durante l'estrazione dei dati di un libro: {e}")
+            continue
+        if book:
+            books.append(book)
+
+    next_hrefs = XP_NEXT(root)
+    next_url = urljoin(page_url or base_url, next_hrefs[0]) if next_hrefs else None
+    return books, next_url
+
+
+def parse_books(html_content, categoria, base_url):
+    """Solo i libri della pagina, con la stessa firma di parse_book_data."""
+    return parse_listing(html_content, categoria, base_url)[0]
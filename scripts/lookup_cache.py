@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Cache persistente degli esiti delle ricerche (copertine, date, ...).
+
+Ogni chiave registra un successo (con il valore trovato) oppure un insuccesso.
+I successi restano validi per `hit_ttl`; gli insuccessi vengono ritentati con
+backoff esponenziale: dopo il primo tentativo fallito si riprova dopo
+`miss_ttl`, poi dopo il doppio, e così via fino a `max_miss_ttl`.
+"""
+
+import os
+import time
+import json
+import hashlib
+import sqlite3
+import threading
+
+import run_metrics
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.environ.get('NEWBOOKS_LOOKUP_CACHE',
+                            os.path.join(SCRIPT_DIR, "..", "data", "lookup_cache.sqlite3"))
+
+DAY = 24 * 3600
+
+HIT = "hit"
+MISS = "miss"
+
+
+def make_key(*parts):
+    """Chiave compatta a partire da più campi (titolo, autore, id, ...)."""
+    raw = "\x1f".join(str(part or '').strip().lower() for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class LookupCache:
+    """Esiti delle ricerche di un namespace, con TTL separati per successi e insuccessi."""
+
+    def __init__(self, namespace, hit_ttl=180 * DAY, miss_ttl=DAY, max_miss_ttl=30 * DAY, path=CACHE_PATH):
+        self.namespace = namespace
+        self.hit_ttl = hit_ttl
+        self.miss_ttl = miss_ttl
+        self.max_miss_ttl = max_miss_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS lookups (
+                namespace TEXT,
+                key TEXT,
+                status TEXT,
+                value TEXT,
+                attempts INTEGER,
+                checked_at REAL,
+                retry_at REAL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._db.commit()
+
+    def get(self, key, now=None):
+        """Restituisce (HIT, valore), (MISS, None) se l'insuccesso è ancora valido,
+        oppure None se la ricerca va (ri)eseguita."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, value, retry_at FROM lookups WHERE namespace = ? AND key = ?",
+                (self.namespace, key)).fetchone()
+        if row is None or now >= row[2]:
+            run_metrics.incr("lookup_pending")
+            return None
+        status, value, _ = row
+        run_metrics.incr("lookup_cached_hit" if status == HIT else "lookup_cached_miss")
+        return (HIT, json.loads(value)) if status == HIT else (MISS, None)
+
+    def put_hit(self, key, value, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, 0, ?, ?)",
+                             (self.namespace, key, HIT, json.dumps(value, ensure_ascii=False),
+                              now, now + self.hit_ttl))
+            self._db.commit()
+
+    def put_miss(self, key, now=None):
+        """Registra un insuccesso e pianifica il prossimo tentativo con backoff."""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, attempts FROM lookups WHERE namespace = ? AND key = ?",
+                (self.namespace, key)).fetchone()
+            attempts = row[1] + 1 if row and row[0] == MISS else 1
+            delay = min(self.miss_ttl * 2 ** (attempts - 1), self.max_miss_ttl)
+            self._db.execute("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, NULL, ?, ?, ?)",
+                             (self.namespace, key, MISS, attempts, now, now + delay))
+            self._db.commit()
+
+    def stats(self):
+        """Numero di successi e insuccessi registrati nel namespace."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) FROM lookups WHERE namespace = ? GROUP BY status",
+                (self.namespace,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
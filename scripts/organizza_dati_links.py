@@ -8,25 +8,11 @@ Versione corretta per gestire i link.
 """
 
 import os
-import pandas as pd
 import re
-from docx import Document
-from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.enum.table import WD_ALIGN_VERTICAL
-from docx.oxml.shared import OxmlElement, qn
 import logging
 from datetime import datetime
 
-# Configurazione del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("organizza_dati_links.log"),
-        logging.StreamHandler()
-    ]
-)
+import run_metrics
 
 # Percorsi dei file
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -37,13 +23,38 @@ OUTPUT_DOC = os.path.join(SCRIPT_DIR, "Novità_Libri_Ultimi_30_Giorni_Con_Links.
 # Categorie da includere
 CATEGORIE = ['filosofia', 'psicologia', 'società', 'business', 'self-help']
 
+# Colonne delle tabelle (il link d'acquisto è sempre l'ultima)
+ITALIAN_HEADERS = ["Titolo", "Autore", "Editore", "Prezzo", "Link d'acquisto"]
+ITALIAN_COLUMNS = ['titolo', 'autore', 'editore', 'prezzo']
+AMERICAN_HEADERS = ["Titolo", "Autore", "Prezzo", "Link d'acquisto"]
+AMERICAN_COLUMNS = ['titolo', 'autore', 'prezzo']
+MISSING_TEXT = {
+    'titolo': "Titolo non disponibile",
+    'autore': "Autore non disponibile",
+    'editore': "Editore non disponibile",
+    'prezzo': "Prezzo non disponibile",
+}
+
+def configure_logging():
+    """Configurazione del logging quando lo script viene eseguito da solo."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("organizza_dati_links.log"),
+            logging.StreamHandler()
+        ]
+    )
+
 def load_data():
     """Carica i dati dai file CSV e li pulisce."""
     logging.info("Caricamento dei dati dai file CSV...")
+    import pandas as pd
+    from book_frames import SOURCE_DTYPES
     
     # Carica i dati italiani
     try:
-        df_italian = pd.read_csv(ITALIAN_CSV)
+        df_italian = pd.read_csv(ITALIAN_CSV, dtype=SOURCE_DTYPES)
         logging.info(f"Caricati {len(df_italian)} libri italiani")
     except Exception as e:
         logging.error(f"Errore durante il caricamento dei dati italiani: {e}")
@@ -51,92 +62,81 @@ def load_data():
     
     # Carica i dati americani
     try:
-        df_american = pd.read_csv(AMERICAN_CSV)
+        df_american = pd.read_csv(AMERICAN_CSV, dtype=SOURCE_DTYPES)
         logging.info(f"Caricati {len(df_american)} libri americani")
     except Exception as e:
         logging.error(f"Errore durante il caricamento dei dati americani: {e}")
         df_american = pd.DataFrame()
     
+    return clean_data(df_italian, df_american)
+
+def clean_data(df_italian, df_american):
+    """Pulisce i DataFrame dei libri italiani e americani.
+
+    Le trasformazioni sono vettoriali sulle colonne intere; categoria e paese
+    diventano colonne categoriali.
+    """
+    from book_frames import stripped, non_blank, as_category, constant_category
+
     # Pulisci i dati italiani
     if not df_italian.empty:
         # Rimuovi righe con titoli vuoti o mancanti
         df_italian = df_italian[df_italian['titolo'].notna()]
-        df_italian['titolo'] = df_italian['titolo'].apply(lambda x: x.strip() if isinstance(x, str) else "Titolo non disponibile")
-        
-        # Pulisci i link d'acquisto
-        df_italian['link_acquisto'] = df_italian['link_acquisto'].apply(
-            lambda x: x if isinstance(x, str) and x.strip() else None
+        df_italian = df_italian.assign(
+            titolo=stripped(df_italian['titolo']).fillna("Titolo non disponibile"),
+            # Pulisci i link d'acquisto
+            link_acquisto=non_blank(df_italian['link_acquisto']),
+            categoria=as_category(df_italian['categoria']),
+            # Aggiungi colonna per il paese
+            paese=constant_category('Italia', len(df_italian)),
         )
-        
-        # Aggiungi colonna per il paese
-        df_italian['paese'] = 'Italia'
     
     # Pulisci i dati americani
     if not df_american.empty:
         # Rimuovi righe con titoli vuoti o mancanti
         df_american = df_american[df_american['titolo'].notna()]
-        
-        # Pulisci i titoli
-        df_american['titolo'] = df_american['titolo'].apply(
-            lambda x: x if x != "Titolo non disponibile" else "Libro americano"
+        df_american = df_american.assign(
+            # Pulisci i titoli
+            titolo=df_american['titolo'].replace("Titolo non disponibile", "Libro americano"),
+            # Pulisci i link d'acquisto
+            link_acquisto=non_blank(df_american['link_acquisto']),
+            categoria=as_category(df_american['categoria']),
+            # Aggiungi colonna per il paese
+            paese=constant_category('USA', len(df_american)),
         )
-        
-        # Pulisci i link d'acquisto
-        df_american['link_acquisto'] = df_american['link_acquisto'].apply(
-            lambda x: x if isinstance(x, str) and x.strip() else None
-        )
-        
-        # Aggiungi colonna per il paese
-        df_american['paese'] = 'USA'
     
     return df_italian, df_american
 
-# Funzione per aggiungere hyperlink in Word
-def add_hyperlink(paragraph, url, text, tooltip=None):
-    """
-    Aggiunge un hyperlink al paragrafo.
-    
-    Args:
-        paragraph: Paragrafo a cui aggiungere il link
-        url: URL del link
-        text: Testo da visualizzare
-        tooltip: Testo del tooltip (opzionale)
-    """
-    # Questo è un workaround poiché python-docx non supporta direttamente i link
-    part = paragraph.part
-    r_id = part.relate_to(url, docx.opc.constants.RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
-    
-    # Crea il nodo hyperlink
-    hyperlink = OxmlElement('w:hyperlink')
-    hyperlink.set(qn('r:id'), r_id)
-    
-    if tooltip is not None:
-        hyperlink.set(qn('w:tooltip'), tooltip)
-    
-    # Crea il nodo di testo
-    new_run = OxmlElement('w:r')
-    rPr = OxmlElement('w:rPr')
-    
-    # Aggiungi stile al testo (blu e sottolineato)
-    color = OxmlElement('w:color')
-    color.set(qn('w:val'), '0000FF')
-    rPr.append(color)
-    
-    u = OxmlElement('w:u')
-    u.set(qn('w:val'), 'single')
-    rPr.append(u)
-    
-    new_run.append(rPr)
-    new_run.text = text
-    hyperlink.append(new_run)
-    
-    paragraph._p.append(hyperlink)
-    
-    return hyperlink
+def table_rows(books, columns):
+    """Righe di una tabella come tuple di stringhe, con il link d'acquisto (o None) in fondo."""
+    texts = books[columns].astype(object).fillna({column: MISSING_TEXT[column] for column in columns})
+    links = books['link_acquisto'].astype(object)
+    links = links.where(links.notna(), None)
+    return list(zip(*(texts[column].astype(str) for column in columns), links))
 
-def create_document(df_italian, df_american):
-    """Crea un documento Word con tabelle e link d'acquisto."""
-    logging.info("Creazione del documento Word...")
+def section_tables(df_italian, df_american):
+    """[(categoria, titolo della sezione, intestazioni, righe)] nell'ordine del documento."""
+    sections = []
+    for categoria in CATEGORIE:
+        for label, df, headers, columns in (
+                ("Libri Italiani", df_italian, ITALIAN_HEADERS, ITALIAN_COLUMNS),
+                ("Libri Americani", df_american, AMERICAN_HEADERS, AMERICAN_COLUMNS)):
+            books = df[df['categoria'] == categoria] if not df.empty else df
+            if not books.empty:
+                sections.append((categoria, label, headers, table_rows(books, columns)))
+    return sections
+
+def build_document(df_italian, df_american):
+    """Documento Word (non ancora salvato) con tabelle e link d'acquisto.
+
+    Le tabelle vengono generate in blocco (e in parallelo tra le sezioni) da
+    docx_tables; i link d'acquisto sono hyperlink veri.
+    """
+    # python-docx si carica solo quando il documento serve davvero
+    from docx import Document
+    from docx.shared import Length
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx_tables import build_tables, insert_table
     
     doc = Document()
     
@@ -160,118 +160,24 @@ def create_document(df_italian, df_american):
     for categoria in CATEGORIE:
         doc.add_paragraph(f"{categoria.capitalize()}", style='List Bullet')
     
+    # Tabelle di tutte le sezioni, generate prima di comporre il documento
+    section = doc.sections[0]
+    block_width = Length(section.page_width - section.left_margin - section.right_margin).twips
+    sections = section_tables(df_italian, df_american)
+    tables = build_tables([(headers, rows, block_width // len(headers), f"rIdL{index}")
+                           for index, (_, _, headers, rows) in enumerate(sections)])
+    
     # Crea una sezione per ogni categoria
     for categoria in CATEGORIE:
         doc.add_page_break()
         doc.add_heading(f"Categoria: {categoria.capitalize()}", level=1)
         
-        # Filtra i libri italiani per questa categoria
-        italian_books = df_italian[df_italian['categoria'] == categoria] if not df_italian.empty else pd.DataFrame()
-        
-        # Filtra i libri americani per questa categoria
-        american_books = df_american[df_american['categoria'] == categoria] if not df_american.empty else pd.DataFrame()
-        
-        # Aggiungi sezione per i libri italiani
-        if not italian_books.empty:
-            doc.add_heading("Libri Italiani", level=2)
-            
-            # Crea tabella
-            table = doc.add_table(rows=1, cols=5)
-            table.style = 'Table Grid'
-            
-            # Intestazioni
-            header_cells = table.rows[0].cells
-            header_cells[0].text = "Titolo"
-            header_cells[1].text = "Autore"
-            header_cells[2].text = "Editore"
-            header_cells[3].text = "Prezzo"
-            header_cells[4].text = "Link d'acquisto"
-            
-            # Formatta intestazioni
-            for cell in header_cells:
-                cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in cell.paragraphs[0].runs:
-                    run.bold = True
-            
-            # Aggiungi righe per ogni libro
-            for _, book in italian_books.iterrows():
-                row_cells = table.add_row().cells
-                
-                # Aggiungi dati
-                row_cells[0].text = book['titolo'] if not pd.isna(book['titolo']) else "Titolo non disponibile"
-                row_cells[1].text = book['autore'] if not pd.isna(book['autore']) else "Autore non disponibile"
-                row_cells[2].text = book['editore'] if not pd.isna(book['editore']) else "Editore non disponibile"
-                row_cells[3].text = book['prezzo'] if not pd.isna(book['prezzo']) else "Prezzo non disponibile"
-                
-                # Aggiungi link d'acquisto
-                if book['link_acquisto'] and not pd.isna(book['link_acquisto']):
-                    # Cancella il testo esistente nella cella
-                    row_cells[4].text = ""
-                    # Aggiungi il link come testo blu sottolineato
-                    p = row_cells[4].paragraphs[0]
-                    run = p.add_run("Link")
-                    run.font.color.rgb = RGBColor(0, 0, 255)  # Blu
-                    run.underline = True
-                    # Aggiungi una nota che indica che questo è un link
-                    p.add_run(" (Clicca per acquistare)")
-                else:
-                    row_cells[4].text = "Non disponibile"
-                
-                # Centra verticalmente il contenuto delle celle
-                for cell in row_cells:
-                    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            
-            doc.add_paragraph()
-        
-        # Aggiungi sezione per i libri americani
-        if not american_books.empty:
-            doc.add_heading("Libri Americani", level=2)
-            
-            # Crea tabella
-            table = doc.add_table(rows=1, cols=4)
-            table.style = 'Table Grid'
-            
-            # Intestazioni
-            header_cells = table.rows[0].cells
-            header_cells[0].text = "Titolo"
-            header_cells[1].text = "Autore"
-            header_cells[2].text = "Prezzo"
-            header_cells[3].text = "Link d'acquisto"
-            
-            # Formatta intestazioni
-            for cell in header_cells:
-                cell.paragraphs[0].alignment = WD_ALIGN_PARAGRAPH.CENTER
-                for run in cell.paragraphs[0].runs:
-                    run.bold = True
-            
-            # Aggiungi righe per ogni libro
-            for _, book in american_books.iterrows():
-                row_cells = table.add_row().cells
-                
-                # Aggiungi dati
-                row_cells[0].text = book['titolo'] if not pd.isna(book['titolo']) else "Titolo non disponibile"
-                row_cells[1].text = book['autore'] if not pd.isna(book['autore']) else "Autore non disponibile"
-                row_cells[2].text = book['prezzo'] if not pd.isna(book['prezzo']) else "Prezzo non disponibile"
-                
-                # Aggiungi link d'acquisto
-                if book['link_acquisto'] and not pd.isna(book['link_acquisto']):
-                    # Cancella il testo esistente nella cella
-                    row_cells[3].text = ""
-                    # Aggiungi il link come testo blu sottolineato
-                    p = row_cells[3].paragraphs[0]
-                    run = p.add_run("Link")
-                    run.font.color.rgb = RGBColor(0, 0, 255)  # Blu
-                    run.underline = True
-                    # Aggiungi una nota che indica che questo è un link
-                    p.add_run(" (Clicca per acquistare)")
-                else:
-                    row_cells[3].text = "Non disponibile"
-                
-                # Centra verticalmente il contenuto delle celle
-                for cell in row_cells:
-                    cell.vertical_alignment = WD_ALIGN_VERTICAL.CENTER
-            
-            doc.add_paragraph()
+        for (section_categoria, label, _, _), (xml, links) in zip(sections, tables):
+            if section_categoria != categoria:
+                continue
+            doc.add_heading(label, level=2)
+            # La tabella va prima del paragrafo vuoto che la separa dalla sezione successiva
+            insert_table(doc.add_paragraph(), xml, links)
     
     # Aggiungi conclusione
     doc.add_page_break()
@@ -281,7 +187,14 @@ def create_document(df_italian, df_american):
     
     # Aggiungi nota sui link
     doc.add_paragraph()
-    note = doc.add_paragraph("Nota: I link d'acquisto sono indicati come testo blu sottolineato. Per utilizzarli, è necessario aprire il documento in un editor che supporti i link (come Microsoft Word o LibreOffice Writer) e fare clic sul testo 'Link'.")
+    note = doc.add_paragraph("Nota: I link d'acquisto sono collegamenti ipertestuali (testo blu sottolineato): in Microsoft Word o LibreOffice Writer basta fare clic sul testo 'Link' per aprire la pagina del libro.")
+    return doc
+
+def create_document(df_italian, df_american):
+    """Crea e salva il documento Word con tabelle e link d'acquisto."""
+    logging.info("Creazione del documento Word...")
+    run_metrics.incr("records_in", len(df_italian) + len(df_american))
+    doc = build_document(df_italian, df_american)
     
     # Salva il documento
     try:
@@ -294,13 +207,16 @@ def create_document(df_italian, df_american):
 
 def main():
     """Funzione principale."""
+    configure_logging()
     logging.info("Inizio organizzazione dei dati...")
     
-    # Carica i dati
-    df_italian, df_american = load_data()
-    
-    # Crea il documento
-    success = create_document(df_italian, df_american)
+    with run_metrics.stage("report_docx"):
+        # Carica i dati
+        df_italian, df_american = load_data()
+        
+        # Crea il documento
+        success = create_document(df_italian, df_american)
+    run_metrics.write_report()
     
     if success:
         logging.info("Organizzazione dei dati completata con successo")
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Esecutore in-process della pipeline come grafo aciclico (DAG) di stadi.
+
+Ogni stadio dichiara:
+- `inputs`: artefatti in memoria che riceve come argomenti posizionali;
+- `outputs`: artefatti in memoria che restituisce (uno o più valori);
+- `writes`: i file che scrive su disco (i checkpoint dichiarati).
+
+Gli stadi i cui input sono pronti partono in parallelo su un pool di thread;
+i record passano da uno stadio all'altro senza rileggere CSV o JSON.
+Alla fine `report()` mostra i tempi di ogni stadio e il percorso critico,
+cioè la catena di dipendenze che determina la durata totale.
+
+Con una BuildCache (build_cache.py) gli stadi che dichiarano `deps` vengono
+saltati quando le impronte dei loro input (artefatti ricevuti, eventualmente
+proiettati con `views`, più file, configurazione e codice) coincidono con
+quelle dell'ultima esecuzione riuscita; i file prodotti vengono ripristinati
+dalla cache se mancano e gli artefatti in uscita riletti dall'archivio.
+"""
+
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import run_metrics
+
+
+class Stage:
+    """Uno stadio della pipeline."""
+
+    def __init__(self, name, run, inputs=(), outputs=(), writes=(),
+                 deps=None, views=None, produces=None, uncached=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.writes = list(writes)
+        # Cache di build: None = stadio sempre eseguito (`uncached` dice perché)
+        self.deps = None if deps is None else list(deps)
+        self.views = dict(views or {})
+        self.produces = produces
+        self.uncached = uncached or "nessuna dipendenza dichiarata"
+
+    def input_deps(self, artifacts):
+        """Dipendenze complete dello stadio: artefatti ricevuti (proiettati) più `deps`."""
+        from build_cache import Dep, fingerprint_value
+
+        def artifact_dep(name):
+            view = self.views.get(name, lambda value: value)
+            return Dep(f"artefatto:{name}", lambda: fingerprint_value(view(artifacts[name])))
+        return [artifact_dep(name) for name in self.inputs] + self.deps
+
+    def output_deps(self):
+        """Output verificati alla ripresa: `produces`, oppure i file dichiarati in `writes`."""
+        from build_cache import File
+        return list(self.produces) if self.produces is not None else [File(path) for path in self.writes]
+
+    def __repr__(self):
+        return f"Stage({self.name!r})"
+
+
+class StageTiming:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class Pipeline:
+    """Grafo di stadi collegati dagli artefatti che producono e consumano."""
+
+    def __init__(self, stages):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Stadio duplicato: {stage.name}")
+            self.stages[stage.name] = stage
+
+        producers = {}
+        for stage in stages:
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"L'artefatto {output} è prodotto da {producers[output]} e da {stage.name}")
+                producers[output] = stage.name
+
+        self.dependencies = {}
+        for stage in stages:
+            missing = [i for i in stage.inputs if i not in producers]
+            if missing:
+                raise ValueError(f"Lo stadio {stage.name} richiede artefatti non prodotti: {', '.join(missing)}")
+            self.dependencies[stage.name] = {producers[i] for i in stage.inputs}
+
+        self.order = self._topological_order()
+        self.timings = {}
+        self.skipped = set()
+
+    def _topological_order(self):
+        order = []
+        visiting = set()
+        visited = set()
+
+        def visit(name):
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo di dipendenze che coinvolge lo stadio {name}")
+            visiting.add(name)
+            for dependency in sorted(self.dependencies[name]):
+                visit(dependency)
+            visiting.discard(name)
+            visited.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name)
+        return order
+
+    def _execute(self, stage, artifacts, origin):
+        start = time.perf_counter() - origin
+        logging.info(f"Inizio stadio {stage.name}")
+        with run_metrics.stage(stage.name):
+            result = stage.run(*[artifacts[i] for i in stage.inputs])
+        end = time.perf_counter() - origin
+        logging.info(f"Fine stadio {stage.name} ({end - start:.1f}s)")
+
+        if not stage.outputs:
+            values = {}
+        elif len(stage.outputs) == 1:
+            values = {stage.outputs[0]: result}
+        else:
+            values = dict(zip(stage.outputs, result))
+        return values, StageTiming(start, end)
+
+    def _check_cache(self, stage, artifacts, cache, explain):
+        """Impronte degli input se lo stadio va eseguito, oppure None se è aggiornato."""
+        if cache is None or stage.deps is None:
+            if explain and cache is not None:
+                print(f"[→] {stage.name}: eseguito ({stage.uncached})")
+            return {}
+        from build_cache import explain as explain_stage
+        fingerprints = cache.fingerprints(stage.input_deps(artifacts))
+        fresh, reason = cache.check(stage.name, fingerprints, stage.output_deps())
+        if explain:
+            explain_stage(stage.name, not fresh, reason)
+        return None if fresh else fingerprints
+
+    def run(self, max_workers=4, cache=None, explain=False):
+        """Esegue tutti gli stadi rispettando le dipendenze e restituisce gli artefatti.
+
+        Con `cache` gli stadi aggiornati vengono saltati; `explain` stampa il
+        motivo di ogni esecuzione o salto.
+        """
+        artifacts = {}
+        pending = list(self.order)
+        done = set()
+        running = {}
+        fingerprints = {}
+        origin = time.perf_counter()
+        self.timings = {}
+        self.skipped = set()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    if self.dependencies[name] <= done:
+                        pending.remove(name)
+                        stage = self.stages[name]
+                        found = self._check_cache(stage, artifacts, cache, explain)
+                        if found is None:
+                            artifacts.update(cache.artifacts(name))
+                            now = time.perf_counter() - origin
+                            self.timings[name] = StageTiming(now, now)
+                            self.skipped.add(name)
+                            done.add(name)
+                            continue
+                        fingerprints[name] = found
+                        future = executor.submit(self._execute, stage, artifacts, origin)
+                        running[future] = name
+
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        values, timing = future.result()
+                    except Exception:
+                        logging.error(f"Stadio {name} fallito: la pipeline si interrompe")
+                        for other in running:
+                            other.cancel()
+                        raise
+                    artifacts.update(values)
+                    self.timings[name] = timing
+                    done.add(name)
+                    stage = self.stages[name]
+                    if cache is not None and stage.deps is not None:
+                        cache.record(name, fingerprints[name], stage.output_deps(), values)
+
+        self.total = time.perf_counter() - origin
+        return artifacts
+
+    def critical_path(self):
+        """Catena di stadi con la durata cumulata maggiore."""
+        best = {}
+        for name in self.order:
+            previous = max(self.dependencies[name], key=lambda d: best[d][0], default=None)
+            length = self.timings[name].duration + (best[previous][0] if previous else 0.0)
+            best[name] = (length, (best[previous][1] if previous else []) + [name])
+        return max(best.values(), key=lambda item: item[0])
+
+    def report(self):
+        """Tabella dei tempi per stadio con il percorso critico evidenziato."""
+        length, path = self.critical_path()
+        lines = [f"{'stadio':<16}{'inizio':>9}{'durata':>9}  percorso critico"]
+        for name in sorted(self.timings, key=lambda n: self.timings[n].start):
+            timing = self.timings[name]
+            marker = "*" if name in path else ""
+            if name in self.skipped:
+                marker = (marker + " (saltato)").strip()
+            lines.append(f"{name:<16}{timing.start:>8.1f}s{timing.duration:>8.1f}s  {marker}")
+        lines.append(f"Percorso critico: {' → '.join(path)} ({length:.1f}s su {self.total:.1f}s totali)")
+        return "\n".join(lines)
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Prezzi dei libri: parsing in centesimi e serie storiche compatte.
+
+Gli scraper leggono il prezzo come testo ("12,35 €", "$18.99", "Prezzo non
+disponibile"); parse_price lo converte in centesimi interi più il codice
+della valuta, già al momento dello scraping (campi `prezzo_centesimi` e
+`valuta` accanto a `prezzo`).
+
+Le osservazioni finiscono in data/prices.sqlite3, una riga per libro con la
+serie come due array impacchettati (BLOB): giorni dal PRICE_EPOCH (uint16) e
+centesimi (int32), little-endian. Si memorizzano solo i cambi di prezzo:
+un prezzo invariato per mesi occupa 6 byte, e anche milioni di osservazioni
+giornaliere restano piccole. Le colonne `last_change` (indicizzata),
+`last_cents` e `prev_cents` rispondono a "ribassi di oggi" senza leggere le
+serie; "prezzo minimo in 90 giorni" legge la serie di un solo libro.
+
+Uso:
+    python -m scripts prezzi ribassi [AAAA-MM-GG]
+    python -m scripts prezzi serie <id>
+"""
+
+import os
+import re
+import sys
+import sqlite3
+from array import array
+from bisect import bisect_right
+from datetime import date, timedelta
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PRICES_DB = os.environ.get('NEWBOOKS_PRICES_DB', os.path.join(SCRIPT_DIR, "..", "data", "prices.sqlite3"))
+
+PRICE_EPOCH = date(2020, 1, 1)
+LOWEST_WINDOW_DAYS = 90
+
+CURRENCY_SYMBOLS = {"€": "EUR", "$": "USD", "£": "GBP", "EUR": "EUR", "USD": "USD", "GBP": "GBP"}
+
+RE_PRICE = re.compile(
+    r'(?P<before>€|\$|£|EUR|USD|GBP)?\s*'
+    r'(?P<amount>\d{1,3}(?:[.,\s]\d{3})+(?:[.,]\d{1,2})?|\d+(?:[.,]\d{1,2})?)'
+    r'\s*(?P<after>€|\$|£|EUR|USD|GBP)?'
+)
+
+
+def parse_price(text, default_currency=None):
+    """(centesimi, valuta) di un prezzo testuale, oppure (None, None).
+
+    Il separatore seguito da una o due cifre finali è quello dei decimali,
+    gli altri sono separatori delle migliaia: "1.234,50 €" -> (123450, "EUR"),
+    "$1,299.00" -> (129900, "USD"), "12,35 €" -> (1235, "EUR").
+    """
+    match = RE_PRICE.search(str(text or ''))
+    if not match:
+        return None, None
+    symbol = match.group("before") or match.group("after")
+    currency = CURRENCY_SYMBOLS[symbol] if symbol else default_currency
+    if currency is None:
+        return None, None
+
+    amount = re.sub(r'\s', '', match.group("amount"))
+    decimals = re.search(r'[.,](\d{1,2})$', amount)
+    if decimals:
+        units = re.sub(r'[.,]', '', amount[:decimals.start()])
+        cents = int(units or 0) * 100 + int(decimals.group(1).ljust(2, '0'))
+    else:
+        cents = int(re.sub(r'[.,]', '', amount)) * 100
+    return cents, currency
+
+
+def add_price_fields(books, default_currency):
+    """Aggiunge `prezzo_centesimi` e `valuta` ai record degli scraper (in place)."""
+    for book in books:
+        book['prezzo_centesimi'], book['valuta'] = parse_price(book.get('prezzo'), default_currency)
+    return books
+
+
+def observation(record):
+    """(centesimi, valuta) di un record del catalogo in arrivo, oppure (None, None)."""
+    try:
+        cents = int(record.get('prezzo_centesimi'))
+    except (TypeError, ValueError):
+        # CSV precedenti senza i campi già convertiti, o valori mancanti (NaN)
+        return parse_price(record.get('prezzo'), None)
+    currency = record.get('valuta')
+    return (cents, currency) if isinstance(currency, str) and currency else (None, None)
+
+
+def day_number(day):
+    """Giorni dal PRICE_EPOCH di una data (date o stringa ISO)."""
+    if isinstance(day, str):
+        day = date.fromisoformat(day)
+    return (day - PRICE_EPOCH).days
+
+
+def day_date(number):
+    return PRICE_EPOCH + timedelta(days=number)
+
+
+def _pack(typecode, values):
+    packed = array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _unpack(typecode, blob):
+    values = array(typecode)
+    values.frombytes(blob)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+class PriceHistory:
+    """Serie storiche dei prezzi, una riga per libro."""
+
+    def __init__(self, path=PRICES_DB):
+        self.path = path
+        # Il file viene versionato: journal classico, nessun -wal accanto al database
+        self.db = sqlite3.connect(path)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS prices (
+                id TEXT PRIMARY KEY,
+                currency TEXT NOT NULL,
+                days BLOB NOT NULL,
+                cents BLOB NOT NULL,
+                last_seen INTEGER NOT NULL,
+                last_change INTEGER NOT NULL,
+                last_cents INTEGER NOT NULL,
+                prev_cents INTEGER
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS prices_last_change ON prices(last_change)")
+        self.db.commit()
+
+    def series(self, book_id):
+        """(valuta, giorni, centesimi) di un libro, oppure None."""
+        row = self.db.execute("SELECT currency, days, cents FROM prices WHERE id = ?", (book_id,)).fetchone()
+        if row is None:
+            return None
+        return row[0], _unpack("H", row[1]), _unpack("i", row[2])
+
+    def _load_series(self, book_ids, chunk=500):
+        """{id: (valuta, giorni, centesimi)} per i libri richiesti, in blocchi di query IN."""
+        found = {}
+        for start in range(0, len(book_ids), chunk):
+            block = book_ids[start:start + chunk]
+            rows = self.db.execute(
+                f"SELECT id, currency, days, cents FROM prices WHERE id IN ({', '.join('?' * len(block))})", block)
+            for row in rows:
+                found[row[0]] = (row[1], _unpack("H", row[2]), _unpack("i", row[3]))
+        return found
+
+    def record(self, observations, day=None):
+        """Registra le osservazioni [(id, centesimi, valuta)] del giorno; restituisce i prezzi cambiati.
+
+        Una seconda esecuzione nello stesso giorno corregge il valore del giorno
+        invece di aggiungere un punto.
+        """
+        today = day_number(day or date.today())
+        observations = {book_id: (cents, currency) for book_id, cents, currency in observations
+                        if cents is not None}
+        existing = self._load_series(list(observations))
+        changed, unchanged = [], []
+        for book_id, (cents, currency) in observations.items():
+            current = existing.get(book_id)
+            if current is None or current[0] != currency:
+                # Primo prezzo del libro, o cambio di valuta: la serie riparte
+                days, values = array("H", [today]), array("i", [cents])
+            else:
+                _, days, values = current
+                if values[-1] == cents:
+                    unchanged.append((today, book_id))
+                    continue
+                if days[-1] == today:
+                    values[-1] = cents
+                    if len(values) > 1 and values[-2] == cents:
+                        days.pop()
+                        values.pop()
+                else:
+                    days.append(today)
+                    values.append(cents)
+            changed.append((book_id, currency, _pack("H", days), _pack("i", values), today,
+                            days[-1], values[-1], values[-2] if len(values) > 1 else None))
+
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?, ?)", changed)
+            # Prezzo invariato: nessun nuovo punto nella serie
+            self.db.executemany("UPDATE prices SET last_seen = ? WHERE id = ?", unchanged)
+        return len(changed)
+
+    def drops_on(self, day=None):
+        """{id: (valuta, prezzo precedente, prezzo nuovo)} dei libri ribassati nel giorno."""
+        rows = self.db.execute(
+            "SELECT id, currency, prev_cents, last_cents FROM prices "
+            "WHERE last_change = ? AND prev_cents > last_cents",
+            (day_number(day or date.today()),))
+        return {row[0]: (row[1], row[2], row[3]) for row in rows}
+
+    def lowest(self, book_id, days=LOWEST_WINDOW_DAYS, day=None):
+        """Prezzo minimo in centesimi negli ultimi `days` giorni, oppure None."""
+        current = self.series(book_id)
+        if current is None:
+            return None
+        _, points, values = current
+        end = day_number(day or date.today())
+        start = end - days
+        # Il prezzo in vigore all'inizio della finestra è l'ultimo cambio precedente
+        first = max(bisect_right(points, start) - 1, 0)
+        last = bisect_right(points, end)
+        window = values[first:last]
+        return min(window) if window else None
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def record_prices(records, day=None):
+    """Registra i prezzi dei record in arrivo dagli scraper; restituisce i prezzi cambiati."""
+    from book_ids import book_id
+
+    observations = []
+    for record in records:
+        cents, currency = observation(record)
+        observations.append((book_id(record), cents, currency))
+    with PriceHistory() as history:
+        return history.record(observations, day)
+
+
+def price_drops(day=None):
+    """Ribassi del giorno con il minimo a 90 giorni: {id: campi da aggiungere al record del sito}."""
+    if not os.path.exists(PRICES_DB):
+        return {}
+    with PriceHistory() as history:
+        return {
+            book_id: {"valuta": currency, "prezzoPrecedente": before, "prezzo": after,
+                      "minimo90": history.lowest(book_id, day=day)}
+            for book_id, (currency, before, after) in history.drops_on(day).items()
+        }
+
+
+def format_cents(cents, currency):
+    return f"{cents / 100:.2f} {currency}" if cents is not None else "N/D"
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "ribassi"
+    if command == "ribassi":
+        drops = price_drops(argv[1] if len(argv) > 1 else None)
+        for book_id, drop in sorted(drops.items()):
+            print(f"  {book_id}: {format_cents(drop['prezzoPrecedente'], drop['valuta'])} -> "
+                  f"{format_cents(drop['prezzo'], drop['valuta'])} "
+                  f"(minimo 90 giorni {format_cents(drop['minimo90'], drop['valuta'])})")
+        print(f"[✓] {len(drops)} ribassi")
+    elif command == "serie" and len(argv) > 1:
+        with PriceHistory() as history:
+            current = history.series(argv[1])
+        if current is None:
+            print(f"[!] Nessun prezzo registrato per {argv[1]}")
+            return 1
+        currency, points, values = current
+        for point, cents in zip(points, values):
+            print(f"  {day_date(point).isoformat()}  {format_cents(cents, currency)}")
+    else:
+        print("Uso: python -m scripts prezzi ribassi [data] | serie <id>")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Metriche strutturate per stadio, raccolte in un unico report JSON per esecuzione.
+
+Ogni stadio (scraper, genera_books_json, arricchimenti, update_books) apre un
+contesto `stage(nome)`; i moduli condivisi registrano al suo interno:
+
+- richieste HTTP, byte trasferiti, esiti per codice di stato e latenze;
+- tempo di parsing per pagina;
+- record in ingresso e in uscita;
+- successi/insuccessi delle cache (HTTP e ricerche).
+
+`write_report()` unisce le metriche del processo nel report dell'esecuzione
+corrente (NEWBOOKS_RUN_ID, predefinito la data del giorno): gli stadi lanciati
+come processi separati finiscono nello stesso file. Quando inizia una nuova
+esecuzione il report precedente viene conservato in run_report_previous.json.
+
+Confronto con l'esecuzione precedente:
+    python scripts/run_metrics.py compare [precedente.json] [corrente.json]
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import date
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "..", "data")
+REPORT_PATH = os.environ.get('NEWBOOKS_RUN_REPORT', os.path.join(DATA_DIR, "run_report.json"))
+PREVIOUS_REPORT_PATH = os.path.join(os.path.dirname(REPORT_PATH), "run_report_previous.json")
+
+# Soglie oltre le quali il confronto segnala una regressione
+SLOWDOWN_RATIO = 1.5
+MIN_SLOWDOWN_SECONDS = 5.0
+RECORD_DROP_RATIO = 0.5
+ERROR_RATE_INCREASE = 0.1
+HIT_RATE_DROP = 0.3
+
+_current_stage = contextvars.ContextVar('newbooks_stage', default='senza_stadio')
+_lock = threading.RLock()
+_stages = {}
+
+
+class StageMetrics:
+    """Contatori, campioni e durata di uno stadio."""
+
+    def __init__(self):
+        self.counters = {}
+        self.status = {}
+        self.samples = {}
+        self.hosts = {}
+        self.duration = 0.0
+
+    def incr(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        self.samples.setdefault(name, []).append(value)
+
+    def to_dict(self):
+        result = {
+            "duration_s": round(self.duration, 3),
+            "counters": dict(sorted(self.counters.items())),
+            "http_status": dict(sorted(self.status.items())),
+        }
+        for name, values in sorted(self.samples.items()):
+            result[name] = summarize(values)
+        if self.hosts:
+            result["host_latency_ms"] = {host: summarize(values) for host, values in sorted(self.hosts.items())}
+        hits = self.counters.get("cache_hit", 0)
+        misses = self.counters.get("cache_miss", 0)
+        if hits + misses:
+            result["cache_hit_rate"] = round(hits / (hits + misses), 4)
+        return result
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(values):
+    """Conteggio, media e percentili di una serie di campioni."""
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 3) if ordered else 0.0,
+        "p50": round(percentile(ordered, 0.50), 3),
+        "p90": round(percentile(ordered, 0.90), 3),
+        "p99": round(percentile(ordered, 0.99), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+def _metrics(stage_name=None):
+    name = stage_name or _current_stage.get()
+    with _lock:
+        if name not in _stages:
+            _stages[name] = StageMetrics()
+        return _stages[name]
+
+
+@contextmanager
+def stage(name):
+    """Attribuisce allo stadio `name` le metriche registrate nel blocco e ne misura la durata."""
+    token = _current_stage.set(name)
+    start = time.perf_counter()
+    try:
+        yield _metrics(name)
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stages[name].duration += elapsed
+        _current_stage.reset(token)
+
+
+def bind(fn):
+    """Avvolge `fn` perché, eseguita in un altro thread, registri nello stadio corrente."""
+    context = contextvars.copy_context()
+
+    def bound(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return bound
+
+
+def incr(name, value=1):
+    with _lock:
+        _metrics().incr(name, value)
+
+
+def observe(name, value):
+    with _lock:
+        _metrics().observe(name, value)
+
+
+def record_http(status, nbytes, latency_s, host=None):
+    """Registra una richiesta HTTP completata (con l'host, anche la sua latenza)."""
+    metrics = _metrics()
+    with _lock:
+        metrics.incr("requests")
+        metrics.incr("bytes", nbytes)
+        key = str(status)
+        metrics.status[key] = metrics.status.get(key, 0) + 1
+        metrics.observe("fetch_latency_ms", latency_s * 1000)
+        if host:
+            metrics.hosts.setdefault(host, []).append(latency_s * 1000)
+
+
+def run_id():
+    return os.environ.get('NEWBOOKS_RUN_ID') or date.today().isoformat()
+
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_report(path=REPORT_PATH):
+    """Unisce le metriche di questo processo nel report dell'esecuzione corrente."""
+    current_id = run_id()
+    report = _load(path)
+    if report is not None and report.get("run_id") != current_id:
+        os.replace(path, PREVIOUS_REPORT_PATH)
+        report = None
+    if report is None:
+        report = {"run_id": current_id, "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "stages": {}}
+
+    with _lock:
+        for name, metrics in _stages.items():
+            report["stages"][name] = metrics.to_dict()
+    report["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return report
+
+
+def _error_rate(stage_report):
+    statuses = stage_report.get("http_status", {})
+    total = sum(statuses.values())
+    errors = sum(n for code, n in statuses.items() if not code.startswith(("2", "3")))
+    return errors / total if total else 0.0
+
+
+def compare(previous, current):
+    """Elenco delle regressioni dello stadio corrente rispetto al precedente."""
+    regressions = []
+    for name, now in sorted(current.get("stages", {}).items()):
+        before = previous.get("stages", {}).get(name)
+        if not before:
+            continue
+
+        if (now["duration_s"] > before["duration_s"] * SLOWDOWN_RATIO
+                and now["duration_s"] - before["duration_s"] > MIN_SLOWDOWN_SECONDS):
+            regressions.append(f"{name}: durata {before['duration_s']:.1f}s → {now['duration_s']:.1f}s")
+
+        records_before = before["counters"].get("records_out", 0)
+        records_now = now["counters"].get("records_out", 0)
+        if records_before and records_now < records_before * RECORD_DROP_RATIO:
+            regressions.append(f"{name}: record in uscita {records_before} → {records_now} (selettore rotto?)")
+
+        if _error_rate(now) - _error_rate(before) > ERROR_RATE_INCREASE:
+            regressions.append(f"{name}: errori HTTP {_error_rate(before):.0%} → {_error_rate(now):.0%}")
+
+        latency_before = before.get("fetch_latency_ms", {}).get("p90", 0)
+        latency_now = now.get("fetch_latency_ms", {}).get("p90", 0)
+        if latency_before and latency_now > latency_before * SLOWDOWN_RATIO:
+            regressions.append(f"{name}: latenza p90 {latency_before:.0f}ms → {latency_now:.0f}ms")
+
+        if ("cache_hit_rate" in before and "cache_hit_rate" in now
+                and before["cache_hit_rate"] - now["cache_hit_rate"] > HIT_RATE_DROP):
+            regressions.append(f"{name}: hit rate cache {before['cache_hit_rate']:.0%} → {now['cache_hit_rate']:.0%}")
+    return regressions
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "compare":
+        print("Uso: python scripts/run_metrics.py compare [precedente.json] [corrente.json]")
+        return 2
+    previous_path = argv[1] if len(argv) > 1 else PREVIOUS_REPORT_PATH
+    current_path = argv[2] if len(argv) > 2 else REPORT_PATH
+    previous, current = _load(previous_path), _load(current_path)
+    if previous is None or current is None:
+        print(f"[!] Report mancante: {previous_path if previous is None else current_path}")
+        return 0
+
+    regressions = compare(previous, current)
+    if not regressions:
+        print(f"[✓] Nessuna regressione tra {previous.get('run_id')} e {current.get('run_id')}")
+        return 0
+    print(f"[!] Regressioni tra {previous.get('run_id')} e {current.get('run_id')}:")
+    for line in regressions:
+        print(f"  - {line}")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
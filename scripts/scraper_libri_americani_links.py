@@ -8,24 +8,18 @@ Raccoglie titoli, autori e link d'acquisto (senza scaricare copertine).
 
 import os
 import requests
-from bs4 import BeautifulSoup
-import time
-import random
 import re
 from datetime import datetime, timedelta
-import pandas as pd
 from urllib.parse import urljoin
 import logging
 
-# Configurazione del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper_libri_americani_links.log"),
-        logging.StreamHandler()
-    ]
-)
+from fetch_engine import get_engine
+from http_cache import get_cache, parse_cached
+from book_sink import CsvSink
+from prices import add_price_fields
+import run_metrics
+import amazon_parser
+
 
 # Headers per simulare un browser reale
 HEADERS = {
@@ -45,23 +39,49 @@ CATEGORIE = {
     'self-help': 'https://www.amazon.com/gp/new-releases/books/4736'
 }
 
-def get_page_content(url):
-    """Ottiene il contenuto di una pagina web con gestione degli errori e ritardi casuali."""
+BASE_URL = "https://www.amazon.com"
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libri_americani_links.csv")
+CSV_FIELDS = ['titolo', 'autore', 'prezzo', 'prezzo_centesimi', 'valuta', 'categoria', 'link_acquisto', 'asin']
+
+def configure_logging():
+    """Configurazione del logging quando lo script viene eseguito da solo."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("scraper_libri_americani_links.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def fetch_page(url):
+    """Ottiene una pagina tramite la cache HTTP, che la rivalida con richieste condizionali.
+    La frequenza delle richieste è regolata dal token bucket dell'host nel motore di fetch."""
     try:
-        # Aggiungi un ritardo casuale per evitare di sovraccaricare il server
-        time.sleep(random.uniform(2, 5))
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()
-        return response.text
+        return get_cache().get(url, headers=HEADERS, fetch=get_engine().get)
     except requests.exceptions.RequestException as e:
         logging.error(f"Errore durante il recupero della pagina {url}: {e}")
         return None
 
+def get_page_content(url):
+    """Ottiene il contenuto di una pagina web con gestione degli errori."""
+    page = fetch_page(url)
+    return page.text if page else None
+
 def parse_book_data(html_content, categoria, base_url):
-    """Estrae i dati dei libri dalla pagina HTML di Amazon."""
+    """Estrae i dati dei libri dalla pagina HTML di Amazon in un solo passaggio lineare,
+    deduplicando per ASIN."""
+    return amazon_parser.parse_books(html_content, categoria, base_url)
+
+def parse_book_data_bs4(html_content, categoria, base_url):
+    """Estrae i dati dei libri dalla pagina HTML di Amazon con BeautifulSoup.
+    Implementazione di riferimento per i confronti di bench_parser.py."""
     if not html_content:
         return []
     
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, 'html.parser')
     books = []
     
@@ -133,40 +153,46 @@ def parse_book_data(html_content, categoria, base_url):
     
     return books
 
-def scrape_category(categoria, url):
-    """Scrapa tutti i libri di una categoria."""
+def scrape_category(categoria, url, sink=None):
+    """Scrapa tutti i libri di una categoria.
+    Con un sink i record vengono scritti subito e la funzione restituisce solo il conteggio."""
     logging.info(f"Iniziando lo scraping della categoria: {categoria}")
     
-    html_content = get_page_content(url)
-    if not html_content:
+    html_page = fetch_page(url)
+    if not html_page:
         logging.error(f"Impossibile ottenere il contenuto della pagina per la categoria {categoria}")
-        return []
+        return [] if sink is None else 0
     
-    base_url = "https://www.amazon.com"
-    books = parse_book_data(html_content, categoria, base_url)
+    # Se la pagina è identica all'ultima volta si riusano i record già estratti
+    books = parse_cached(html_page, lambda html: parse_book_data(html, categoria, BASE_URL),
+                         parsers=("amazon_parser", "book_ids"))
+    add_price_fields(books, default_currency="USD")
     logging.info(f"Trovati {len(books)} libri nella categoria {categoria}")
     
+    if sink is not None:
+        sink.write_many(books)
+        return len(books)
     return books
 
+def scrape_all(sink):
+    """Scrapa tutte le categorie verso il sink e restituisce il numero di libri."""
+    # Le categorie vengono scaricate in parallelo entro il budget di cortesia dell'host
+    count = sum(get_engine().map(lambda item: scrape_category(*item, sink=sink), CATEGORIE.items()))
+    run_metrics.incr("records_out", count)
+    return count
+
 def main():
     """Funzione principale che coordina lo scraping di tutte le categorie."""
+    configure_logging()
     logging.info("Iniziando lo scraping dei libri americani...")
     
-    all_books = []
-    
-    for categoria, url in CATEGORIE.items():
-        books = scrape_category(categoria, url)
-        all_books.extend(books)
-        
-        # Pausa tra le categorie per evitare di sovraccaricare il server
-        time.sleep(random.uniform(3, 7))
+    # I record vengono accodati al CSV man mano che arrivano
+    with run_metrics.stage("scraper_us"), CsvSink(CSV_PATH, CSV_FIELDS) as sink:
+        scrape_all(sink)
+    run_metrics.write_report()
     
-    # Salva i dati in un file CSV
-    if all_books:
-        df = pd.DataFrame(all_books)
-        csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libri_americani_links.csv")
-        df.to_csv(csv_path, index=False, encoding='utf-8')
-        logging.info(f"Dati salvati in {csv_path}")
+    if sink.count:
+        logging.info(f"Salvati {sink.count} libri in {CSV_PATH}")
     else:
         logging.warning("Nessun libro trovato durante lo scraping")
     
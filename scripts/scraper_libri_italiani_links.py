@@ -9,24 +9,18 @@ Versione aggiornata con selettori CSS corretti.
 
 import os
 import requests
-from bs4 import BeautifulSoup
-import time
-import random
 import re
 from datetime import datetime, timedelta
-import pandas as pd
 from urllib.parse import urljoin
 import logging
 
-# Configurazione del logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper_libri_italiani_links.log"),
-        logging.StreamHandler()
-    ]
-)
+from fetch_engine import get_engine
+from http_cache import get_cache, parse_cached
+from book_sink import CsvSink
+from prices import add_price_fields
+import run_metrics
+import ibs_parser
+
 
 # Headers per simulare un browser reale
 HEADERS = {
@@ -46,23 +40,51 @@ CATEGORIE = {
     'self-help': 'https://www.ibs.it/libri/self-help-e-valorizzazione-personale/ultimi-90-giorni'
 }
 
-def get_page_content(url):
-    """Ottiene il contenuto di una pagina web con gestione degli errori e ritardi casuali."""
+BASE_URL = "https://www.ibs.it"
+
+# Numero massimo di pagine seguite per ogni categoria
+MAX_PAGINE = 50
+
+CSV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libri_italiani_links.csv")
+CSV_FIELDS = ['titolo', 'autore', 'editore', 'anno', 'prezzo', 'prezzo_centesimi', 'valuta', 'categoria', 'link_acquisto']
+
+def configure_logging():
+    """Configurazione del logging quando lo script viene eseguito da solo."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("scraper_libri_italiani_links.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+def fetch_page(url):
+    """Ottiene una pagina tramite la cache HTTP, che la rivalida con richieste condizionali.
+    La frequenza delle richieste è regolata dal token bucket dell'host nel motore di fetch."""
     try:
-        # Aggiungi un ritardo casuale per evitare di sovraccaricare il server
-        time.sleep(random.uniform(1, 3))
-        response = requests.get(url, headers=HEADERS)
-        response.raise_for_status()
-        return response.text
+        return get_cache().get(url, headers=HEADERS, fetch=get_engine().get)
     except requests.exceptions.RequestException as e:
         logging.error(f"Errore durante il recupero della pagina {url}: {e}")
         return None
 
+def get_page_content(url):
+    """Ottiene il contenuto di una pagina web con gestione degli errori."""
+    page = fetch_page(url)
+    return page.text if page else None
+
 def parse_book_data(html_content, categoria, base_url):
-    """Estrae i dati dei libri dalla pagina HTML."""
+    """Estrae i dati dei libri dalla pagina HTML con l'estrattore lxml compilato."""
+    return ibs_parser.parse_books(html_content, categoria, base_url)
+
+def parse_book_data_bs4(html_content, categoria, base_url):
+    """Estrae i dati dei libri dalla pagina HTML con BeautifulSoup.
+    Implementazione di riferimento per i confronti di bench_parser.py."""
     if not html_content:
         return []
     
+    from bs4 import BeautifulSoup
+
     soup = BeautifulSoup(html_content, 'html.parser')
     books = []
     
@@ -158,40 +180,74 @@ def parse_book_data(html_content, categoria, base_url):
     
     return books
 
-def scrape_category(categoria, url):
-    """Scrapa tutti i libri di una categoria."""
+def parse_listing_page(html_content, categoria, page_url):
+    """Libri della pagina e link alla pagina successiva, estratti in un solo passaggio."""
+    books, next_url = ibs_parser.parse_listing(html_content, categoria, BASE_URL, page_url)
+    return {'books': books, 'next': next_url}
+
+def iter_category_books(categoria, url):
+    """Generatore dei libri di una categoria: segue i link alla pagina successiva
+    e restituisce i record di ogni pagina appena vengono estratti."""
+    visited = set()
+    page = 1
+    while url and url not in visited and page <= MAX_PAGINE:
+        visited.add(url)
+        html_page = fetch_page(url)
+        if not html_page:
+            if page == 1:
+                logging.error(f"Impossibile ottenere il contenuto della pagina per la categoria {categoria}")
+            else:
+                logging.error(f"Impossibile ottenere la pagina {page} della categoria {categoria}")
+            return
+        
+        # Se la pagina è identica all'ultima volta si riusano i record già estratti
+        parsed = parse_cached(html_page, lambda html: parse_listing_page(html, categoria, html_page.url),
+                              parsers=("ibs_parser",))
+        books = add_price_fields(parsed['books'], default_currency="EUR")
+        logging.info(f"Trovati {len(books)} libri nella pagina {page} della categoria {categoria}")
+        if not books:
+            return
+        yield books
+        
+        url = parsed['next']
+        page += 1
+
+def scrape_category(categoria, url, sink=None):
+    """Scrapa tutti i libri di una categoria, pagina per pagina.
+    Con un sink i record vengono scritti man mano e la funzione restituisce solo il conteggio."""
     logging.info(f"Iniziando lo scraping della categoria: {categoria}")
     
-    html_content = get_page_content(url)
-    if not html_content:
-        logging.error(f"Impossibile ottenere il contenuto della pagina per la categoria {categoria}")
-        return []
-    
-    base_url = "https://www.ibs.it"
-    books = parse_book_data(html_content, categoria, base_url)
-    logging.info(f"Trovati {len(books)} libri nella categoria {categoria}")
+    books = []
+    count = 0
+    for page_books in iter_category_books(categoria, url):
+        count += len(page_books)
+        if sink is not None:
+            sink.write_many(page_books)
+        else:
+            books.extend(page_books)
+    logging.info(f"Trovati {count} libri nella categoria {categoria}")
     
-    return books
+    return books if sink is None else count
+
+def scrape_all(sink):
+    """Scrapa tutte le categorie verso il sink e restituisce il numero di libri."""
+    # Le categorie vengono scaricate in parallelo entro il budget di cortesia dell'host
+    count = sum(get_engine().map(lambda item: scrape_category(*item, sink=sink), CATEGORIE.items()))
+    run_metrics.incr("records_out", count)
+    return count
 
 def main():
     """Funzione principale che coordina lo scraping di tutte le categorie."""
+    configure_logging()
     logging.info("Iniziando lo scraping dei libri italiani...")
     
-    all_books = []
-    
-    for categoria, url in CATEGORIE.items():
-        books = scrape_category(categoria, url)
-        all_books.extend(books)
-        
-        # Pausa tra le categorie per evitare di sovraccaricare il server
-        time.sleep(random.uniform(2, 5))
+    # I record vengono accodati al CSV man mano che arrivano
+    with run_metrics.stage("scraper_it"), CsvSink(CSV_PATH, CSV_FIELDS) as sink:
+        scrape_all(sink)
+    run_metrics.write_report()
     
-    # Salva i dati in un file CSV
-    if all_books:
-        df = pd.DataFrame(all_books)
-        csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "libri_italiani_links.csv")
-        df.to_csv(csv_path, index=False, encoding='utf-8')
-        logging.info(f"Dati salvati in {csv_path}")
+    if sink.count:
+        logging.info(f"Salvati {sink.count} libri in {CSV_PATH}")
     else:
         logging.warning("Nessun libro trovato durante lo scraping")
     
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Indice di ricerca full-text precalcolato per il sito.
+
+Indice invertito su titolo, autore, categoria ed editore (se presente):
+ogni token punta agli id dei libri che lo contengono. I token sono
+normalizzati come nel resto della pipeline (minuscole, senza accenti) e gli
+apostrofi separano le parole, quindi "L'arte" si trova cercando "arte" e
+"perché" cercando "perche". Articoli e preposizioni più comuni non vengono
+indicizzati.
+
+L'indice è diviso in shard per prefisso del token (le prime PREFIX_LENGTH
+lettere): per cercare "filo" il browser scarica solo lo shard "fi" e ne
+confronta le chiavi per prefisso. Ogni shard contiene anche la categoria dei
+libri citati, così la pagina carica solo gli shard di categoria necessari.
+
+La ricostruzione è incrementale: search/state.json conserva, per ogni
+libro, l'impronta dei campi indicizzati e i prefissi in cui compare. Solo gli
+shard che contengono libri aggiunti, modificati o rimossi vengono riletti e
+riscritti; gli altri restano intatti (stesso file, stesso hash).
+"""
+
+import os
+import json
+import hashlib
+
+from book_ids import normalize_text, AUTORE_NON_DISPONIBILE
+
+SEARCH_FIELDS = ["title", "author", "categoria", "publisher"]
+SEARCH_DIR = "search"
+STATE_NAME = f"{SEARCH_DIR}/state.json"
+STATE_VERSION = 1
+
+PREFIX_LENGTH = 2
+MIN_TOKEN_LENGTH = 2
+HASH_LENGTH = 10
+
+# Parole troppo frequenti per essere utili come token completi
+STOPWORDS = {
+    "il", "lo", "la", "gli", "le", "un", "una", "uno", "di", "da", "in", "con", "su", "per",
+    "tra", "fra", "ed", "al", "ai", "del", "dei", "della", "delle", "degli", "dello", "dell",
+    "alla", "alle", "agli", "allo", "all", "nel", "nei", "nella", "nelle", "negli", "nell",
+    "sul", "sulla", "sull", "dal", "dalla", "dall", "che", "non",
+    "the", "of", "and", "an", "to", "on", "for", "with", "at", "by", "from",
+}
+
+
+def tokens(text):
+    """Token ricercabili di un testo: normalizzati, senza parole vuote."""
+    return {token for token in normalize_text(text).split()
+            if len(token) >= MIN_TOKEN_LENGTH and token not in STOPWORDS}
+
+
+def book_tokens(book):
+    """Token di tutti i campi indicizzati di un libro (l'autore segnaposto non conta)."""
+    found = set()
+    for field in SEARCH_FIELDS:
+        value = book.get(field)
+        if value and not (field == "author" and value == AUTORE_NON_DISPONIBILE):
+            found |= tokens(value)
+    return found
+
+
+def fingerprint(book):
+    """Impronta dei campi indicizzati: cambia solo se cambiano i token del libro."""
+    values = [book.get(field) or "" for field in SEARCH_FIELDS]
+    return hashlib.sha1(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+
+def shard_key(token):
+    return token[:PREFIX_LENGTH]
+
+
+def _shard_name(prefix, digest):
+    # Prefissi non ASCII (caratteri senza scomposizione, es. "ß" o ideogrammi) in esadecimale
+    stem = prefix if prefix.isascii() and prefix.isalnum() else "x" + prefix.encode("utf-8").hex()
+    return f"{SEARCH_DIR}/{stem}.{digest}.json"
+
+
+def _encode_shard(postings, categories):
+    """Shard compatto: tabella locale [id, categoria] e token -> indici nella tabella."""
+    ids = sorted({book_id for members in postings.values() for book_id in members})
+    position = {book_id: i for i, book_id in enumerate(ids)}
+    shard = {
+        "docs": [[book_id, categories.get(book_id, "")] for book_id in ids],
+        "tokens": {token: sorted(position[book_id] for book_id in postings[token])
+                   for token in sorted(postings)},
+    }
+    return json.dumps(shard, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode_shard(path):
+    with open(path, "r", encoding="utf-8") as f:
+        shard = json.load(f)
+    ids = [doc[0] for doc in shard["docs"]]
+    return {token: {ids[i] for i in members} for token, members in shard["tokens"].items()}
+
+
+def _load_state(site_dir):
+    path = os.path.join(site_dir, STATE_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("version") != STATE_VERSION or state.get("prefix_length") != PREFIX_LENGTH:
+        return None
+    # Uno shard mancante rende lo stato inutilizzabile: si ricostruisce tutto
+    if not all(os.path.exists(os.path.join(site_dir, entry["file"])) for entry in state["shards"].values()):
+        return None
+    return state
+
+
+def _write_state(site_dir, state):
+    path = os.path.join(site_dir, STATE_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def build_search(books, site_dir, store, variants):
+    """Aggiorna l'indice di ricerca in `site_dir`.
+
+    `store(name, data)` scrive uno shard con le sue versioni compresse,
+    `variants(name)` elenca i file che ne derivano. Restituisce la sezione del
+    manifest e l'insieme dei file dell'indice da conservare.
+    """
+    current = {}
+    categories = {}
+    for book in books:
+        current[book["id"]] = (fingerprint(book), book)
+        categories[book["id"]] = book.get("categoria") or ""
+
+    state = _load_state(site_dir)
+    previous_docs = state["docs"] if state else {}
+    previous_shards = state["shards"] if state else {}
+
+    changed = {book_id for book_id, (digest, _) in current.items()
+               if previous_docs.get(book_id, [None])[0] != digest}
+    removed = set(previous_docs) - set(current)
+
+    new_tokens = {book_id: book_tokens(current[book_id][1]) for book_id in changed}
+    affected = set()
+    for book_id in changed | removed:
+        affected.update(previous_docs.get(book_id, [None, []])[1])
+    for found in new_tokens.values():
+        affected.update(shard_key(token) for token in found)
+    # Shard invariati a cui manca una versione compressa (es. brotli installato dopo)
+    affected.update(prefix for prefix, entry in previous_shards.items()
+                    if not all(os.path.exists(os.path.join(site_dir, variant)) for variant in variants(entry["file"])))
+
+    # Solo gli shard toccati vengono riletti dal disco e aggiornati
+    postings = {}
+    for prefix in affected:
+        entry = previous_shards.get(prefix)
+        shard = _decode_shard(os.path.join(site_dir, entry["file"])) if entry else {}
+        for token in list(shard):
+            shard[token] -= changed | removed
+            if not shard[token]:
+                del shard[token]
+        postings[prefix] = shard
+    for book_id, found in new_tokens.items():
+        for token in found:
+            postings[shard_key(token)].setdefault(token, set()).add(book_id)
+
+    shards = {prefix: entry for prefix, entry in previous_shards.items() if prefix not in affected}
+    rewritten = 0
+    for prefix, shard in postings.items():
+        if not shard:
+            continue
+        data = _encode_shard(shard, categories)
+        name = _shard_name(prefix, hashlib.sha256(data).hexdigest()[:HASH_LENGTH])
+        store(name, data)
+        shards[prefix] = {"file": name, "tokens": len(shard), "bytes": len(data)}
+        rewritten += 1
+
+    docs = {book_id: previous_docs[book_id] for book_id in current if book_id not in changed}
+    for book_id, found in new_tokens.items():
+        docs[book_id] = [current[book_id][0], sorted({shard_key(token) for token in found})]
+    state = {"version": STATE_VERSION, "prefix_length": PREFIX_LENGTH,
+             "docs": dict(sorted(docs.items())), "shards": dict(sorted(shards.items()))}
+    _write_state(site_dir, state)
+
+    keep = {STATE_NAME}
+    for entry in shards.values():
+        keep.update(variants(entry["file"]))
+    print(f"[✓] Indice di ricerca: {len(shards)} shard, {rewritten} aggiornati "
+          f"({len(changed)} libri nuovi o modificati, {len(removed)} rimossi)")
+    section = {"prefix_length": PREFIX_LENGTH, "min_token": MIN_TOKEN_LENGTH,
+               "stopwords": sorted(STOPWORDS),
+               "shards": {prefix: entry["file"] for prefix, entry in sorted(shards.items())}}
+    return section, keep
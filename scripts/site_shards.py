@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Dati statici del sito divisi in shard e precompressi.
+
+Dal catalogo (un record per opera, come books.json) vengono scritti in
+data/site/:
+- un file per categoria e uno per giorno (releaseDate);
+- new_today, con i soli libri aggiunti nell'ultima esecuzione;
+- ribassi, con i libri il cui prezzo è sceso oggi (vedi prices.py);
+- l'indice di ricerca in search/ (vedi search_index.py);
+- manifest.json con, per ogni shard, nome del file, numero di libri, byte e hash.
+
+Gli shard sono JSON compatti con il solo sottoinsieme di campi usato dalle
+pagine e il nome contiene l'hash del contenuto (filosofia.1a2b3c4d5e.json):
+uno shard che non cambia mantiene lo stesso URL e resta nella cache del
+browser. Solo manifest.json va riletto a ogni visita.
+
+Ogni file viene scritto anche come .gz e, se il modulo `brotli` è installato,
+come .br, per i server che servono direttamente i file precompressi.
+
+Uso:
+    python -m scripts shards
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+from collections import defaultdict
+
+from book_ids import normalize_text
+from search_index import build_search
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SITE_DIR = os.environ.get('NEWBOOKS_SITE_DIR', os.path.join(SCRIPT_DIR, "..", "data", "site"))
+
+# Campi usati da index.html e new_today.html
+SITE_FIELDS = ["id", "title", "author", "categoria", "origin", "releaseDate", "cover"]
+
+MANIFEST_NAME = "manifest.json"
+HASH_LENGTH = 10
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 11
+
+RE_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+def slugify(value):
+    """Nome di file sicuro per una categoria ("società" -> "societa")."""
+    return normalize_text(value).replace(' ', '-') or "senza-categoria"
+
+
+def site_record(book):
+    return {field: book[field] for field in SITE_FIELDS if book.get(field) not in (None, "")}
+
+
+def encode(records):
+    """JSON compatto (senza spazi) in UTF-8."""
+    return json.dumps(records, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _compressors():
+    compressors = [(".gz", lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))]
+    try:
+        import brotli
+    except ImportError:
+        return compressors
+    compressors.append((".br", lambda data: brotli.compress(data, quality=BROTLI_QUALITY)))
+    return compressors
+
+
+def _write(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def write_file(site_dir, name, data, compressors):
+    """Scrive `data` e le sue versioni compresse; restituisce i byte di ogni variante."""
+    path = os.path.join(site_dir, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sizes = {"json": len(data)}
+    _write(path, data)
+    for suffix, compress in compressors:
+        compressed = compress(data)
+        _write(path + suffix, compressed)
+        sizes[suffix.lstrip(".")] = len(compressed)
+    return sizes
+
+
+def _variants(name, compressors):
+    return [name] + [name + suffix for suffix, _ in compressors]
+
+
+def store(site_dir, name, data, compressors):
+    """Come write_file, ma non riscrive un file con hash nel nome che esiste già."""
+    # Stesso hash = stesso contenuto: il file (e le sue versioni compresse) non si riscrive
+    if all(os.path.exists(os.path.join(site_dir, variant)) for variant in _variants(name, compressors)):
+        return {"json": len(data)}
+    return write_file(site_dir, name, data, compressors)
+
+
+def group_books(books):
+    """Raggruppa i record del sito in shard: {(tipo, chiave): [record, ...]}."""
+    shards = defaultdict(list)
+    for book in books:
+        record = site_record(book)
+        shards[("categorie", book.get("categoria") or "")].append(record)
+        release = book.get("releaseDate") or ""
+        if RE_DATE.match(release):
+            shards[("giorni", release)].append(record)
+        if book.get("addedToday"):
+            shards[("new_today", "")].append(record)
+    shards.setdefault(("new_today", ""), [])
+    return shards
+
+
+def drop_records(books, drops):
+    """Record del sito dei libri ribassati, con prezzi in centesimi e minimo a 90 giorni."""
+    return [dict(site_record(book), **drops[book["id"]]) for book in books if book["id"] in drops]
+
+
+def _shard_name(kind, key, digest):
+    if kind in ("new_today", "ribassi"):
+        return f"{kind}.{digest}.json"
+    stem = slugify(key) if kind == "categorie" else key
+    return f"{kind}/{stem}.{digest}.json"
+
+
+def build_site(books, site_dir=SITE_DIR, drops=None):
+    """Scrive shard, versioni compresse e manifest; elimina gli shard non più elencati.
+
+    `drops` sono i ribassi di prezzo del giorno ({id: campi}, vedi
+    prices.price_drops). Restituisce il manifest.
+    """
+    compressors = _compressors()
+    manifest = {"total": 0, "categorie": {}, "giorni": {}, "new_today": None, "ribassi": None,
+                "compressioni": [suffix.lstrip(".") for suffix, _ in compressors]}
+    books = list(books)
+    shards = group_books(books)
+    shards[("ribassi", "")] = drop_records(books, drops or {})
+    written = set()
+    for (kind, key), records in sorted(shards.items()):
+        data = encode(records)
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        name = _shard_name(kind, key, digest)
+        sizes = store(site_dir, name, data, compressors)
+        written.update(_variants(name, compressors))
+        entry = {"file": name, "count": len(records), "hash": digest, "bytes": sizes["json"]}
+        if kind in ("new_today", "ribassi"):
+            manifest[kind] = entry
+        else:
+            manifest[kind][key] = entry
+    manifest["total"] = sum(entry["count"] for entry in manifest["categorie"].values())
+
+    manifest["search"], search_files = build_search(
+        books, site_dir,
+        store=lambda name, data: store(site_dir, name, data, compressors),
+        variants=lambda name: _variants(name, compressors))
+    written.update(search_files)
+
+    write_file(site_dir, MANIFEST_NAME, encode(manifest), compressors)
+    written.update(_variants(MANIFEST_NAME, compressors))
+    _prune(site_dir, written)
+    return manifest
+
+
+def _prune(site_dir, keep):
+    """Elimina gli shard delle esecuzioni precedenti non più referenziati dal manifest."""
+    for root, _, files in os.walk(site_dir):
+        for file_name in files:
+            relative = os.path.relpath(os.path.join(root, file_name), site_dir).replace(os.sep, "/")
+            if relative not in keep:
+                os.remove(os.path.join(root, file_name))
+
+
+def main(argv=None):
+    from catalog_db import open_catalog, EXPORT_WHERE
+    from prices import price_drops
+
+    with open_catalog() as catalog:
+        manifest = build_site(catalog.books(EXPORT_WHERE), drops=price_drops())
+    print(f"[✓] Sito aggiornato in {SITE_DIR}: {manifest['total']} libri, "
+          f"{len(manifest['categorie'])} categorie, {len(manifest['giorni'])} giorni, "
+          f"{manifest['new_today']['count']} nuovi oggi, {manifest['ribassi']['count']} ribassi "
+          f"(compressioni: {', '.join(manifest['compressioni'])})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
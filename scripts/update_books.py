@@ -1,50 +1,142 @@
-import subprocess
-import sys
 import os
-import json
+import argparse
+import logging
+
+import scraper_libri_italiani_links as scraper_it
+import scraper_libri_americani_links as scraper_us
+import organizza_dati_links
+import genera_books_json
+import aggiungi_copertine
+import ibs_details
+from book_sink import CsvSink, ListSink, TeeSink
+from catalog_db import open_catalog, DB_PATH, BOOKS_JSON, EXPORT_WHERE
+from cover_downloader import COVERS_DIR
+from pipeline import Pipeline, Stage
+from fetch_engine import get_engine
+from build_cache import BuildCache, Code, Config, View
+from site_shards import build_site, SITE_DIR
+from catalog_history import record_catalog, HISTORY_DIR
+from prices import price_drops, PRICES_DB
+import run_metrics
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-scripts = [
-    "scraper_libri_italiani_links.py",
-    "scraper_libri_americani_links.py",
-    "organizza_dati_links.py",
-    "genera_books_json.py",
-    "aggiungi_copertine.py"
+
+def scrape_to_memory(scraper):
+    """Scrapa tutte le categorie: il CSV viene scritto in streaming come checkpoint
+    e i record restano in memoria per gli stadi successivi."""
+    records = ListSink()
+    with CsvSink(scraper.CSV_PATH, scraper.CSV_FIELDS) as csv_sink:
+        scraper.scrape_all(TeeSink(csv_sink, records))
+    return records.records
+
+
+def build_report(libri_it, libri_us):
+    import pandas as pd
+    df_italian, df_american = organizza_dati_links.clean_data(pd.DataFrame(libri_it), pd.DataFrame(libri_us))
+    if not organizza_dati_links.create_document(df_italian, df_american):
+        raise RuntimeError("Creazione del documento Word non riuscita")
+
+
+def build_catalog(libri_it, libri_us):
+    import pandas as pd
+    incoming = genera_books_json.records_from_frames(pd.DataFrame(libri_it), pd.DataFrame(libri_us))
+    if incoming is None:
+        raise RuntimeError("Nessun libro raccolto dagli scraper: catalogo non aggiornato")
+    books, stats = genera_books_json.update_catalog(incoming)
+    print(f"[✓] Catalogo aggiornato: {stats['nuovi']} nuovi, "
+          f"{stats['modificati']} modificati, {stats['invariati']} invariati, {stats['opere']} opere distinte")
+    return books
+
+
+def enrich_from_ibs(catalogo):
+    """Schede prodotto dei libri IBS nuovi o modificati (aggiornati anche in memoria)."""
+    books = [book for book in catalogo if book.get("dirty") and book.get("origin") == "IT"]
+    updated = ibs_details.enrich_books(books)
+    print(f"[✓] Schede IBS: {updated} libri aggiornati su {len(books)}")
+    return catalogo
+
+
+def download_covers(catalogo):
+    aggiungi_copertine.download_covers([book for book in catalogo if book.get("cover")])
+
+
+def publish(catalogo):
+    with open_catalog() as catalog:
+        # I libri nuovi rispetto al catalogo precedente sono quelli marcati isNew dal merge
+        with catalog.db:
+            catalog.db.execute("UPDATE books SET addedToday = COALESCE(isNew, 0)")
+
+        # Esportazione unica di books.json dal catalogo
+        catalog.export_json()
+        # Shard per categoria e per giorno, precompressi, per le pagine del sito
+        build_site(catalog.books(EXPORT_WHERE), drops=price_drops())
+        # Delta rispetto all'esecuzione precedente nello storico append-only
+        record_catalog(catalog.books(EXPORT_WHERE), run=run_metrics.run_id())
+        run_metrics.incr("records_out", catalog.count())
+
+
+def cover_view(catalogo):
+    """Le sole colonne del catalogo che contano per le copertine."""
+    return sorted([book["id"], book["cover"]] for book in catalogo if book.get("cover"))
+
+
+def cover_files():
+    return sorted(os.listdir(COVERS_DIR)) if os.path.isdir(COVERS_DIR) else []
+
+
+# Gli scraper IBS e Amazon sono indipendenti e partono insieme; report DOCX e
+# catalogo dipendono da entrambi ma non l'uno dall'altro; le schede IBS
+# completano il catalogo prima di copertine e pubblicazione.
+# Con la cache di build il report e le copertine vengono saltati se i loro input
+# non cambiano; scraper, catalogo e pubblicazione ripartono sempre.
+STAGES = [
+    Stage("scraper_it", lambda: scrape_to_memory(scraper_it), outputs=["libri_it"], writes=[scraper_it.CSV_PATH],
+          uncached="dipende dal sito remoto"),
+    Stage("scraper_us", lambda: scrape_to_memory(scraper_us), outputs=["libri_us"], writes=[scraper_us.CSV_PATH],
+          uncached="dipende dal sito remoto"),
+    Stage("report_docx", build_report, inputs=["libri_it", "libri_us"], writes=[organizza_dati_links.OUTPUT_DOC],
+          deps=[Config("CATEGORIE", organizza_dati_links.CATEGORIE),
+                Code("update_books", "organizza_dati_links", "docx_tables", "book_frames")]),
+    Stage("catalogo", build_catalog, inputs=["libri_it", "libri_us"], outputs=["catalogo"], writes=[DB_PATH, PRICES_DB],
+          uncached="marca i libri nuovi e registra i prezzi del giorno"),
+    Stage("schede_ibs", enrich_from_ibs, inputs=["catalogo"], outputs=["catalogo_arricchito"], writes=[DB_PATH],
+          uncached="legge le schede remote dei libri nuovi o modificati"),
+    # Le copertine non si ripristinano dalla cache (le immagini sono già
+    # archiviate per contenuto dal downloader): se i file cambiano lo stadio riparte
+    Stage("copertine", download_covers, inputs=["catalogo_arricchito"], writes=[COVERS_DIR],
+          views={"catalogo_arricchito": cover_view}, produces=[View("file_copertine", cover_files)],
+          deps=[Code("update_books", "aggiungi_copertine", "cover_downloader")]),
+    Stage("pubblica", publish, inputs=["catalogo_arricchito"], writes=[BOOKS_JSON, SITE_DIR, HISTORY_DIR],
+          uncached="addedToday, storico e ribassi dipendono dal giorno"),
 ]
 
-# 1. Esecuzione pipeline scraping
-for script in scripts:
-    print(f"▶️ Eseguo: {script}")
-    subprocess.run([sys.executable, os.path.join(current_dir, script)], check=True)
-
-# 2. Percorsi dei file JSON
-data_dir = os.path.join(current_dir, "..", "data")
-current_path = os.path.join(data_dir, "books.json")
-previous_path = os.path.join(data_dir, "books_previous.json")
-
-# 3. Carica books.json attuale
-with open(current_path, 'r', encoding='utf-8') as f:
-    current_books = json.load(f)
-
-# 4. Carica books_previous.json se esiste
-try:
-    with open(previous_path, 'r', encoding='utf-8') as f:
-        previous_books = json.load(f)
-        previous_keys = { (b['title'], b.get('author', '')) for b in previous_books }
-except FileNotFoundError:
-    previous_keys = set()
-
-# 5. Segna i nuovi libri
-for book in current_books:
-    key = (book['title'], book.get('author', ''))
-    book['addedToday'] = key not in previous_keys
-
-# 6. Sovrascrivi entrambi i file
-with open(current_path, 'w', encoding='utf-8') as f:
-    json.dump(current_books, f, ensure_ascii=False, indent=2)
-
-with open(previous_path, 'w', encoding='utf-8') as f:
-    json.dump(current_books, f, ensure_ascii=False, indent=2)
-
-print("✅ books.json aggiornato e differenze registrate con 'addedToday'")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pipeline completa come DAG di stadi")
+    parser.add_argument('--no-cache', action='store_true', help="esegue tutti gli stadi ignorando la cache di build")
+    parser.add_argument('--explain', action='store_true', help="motiva l'esecuzione o il salto di ogni stadio")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(current_dir, "update_books.log")),
+            logging.StreamHandler()
+        ]
+    )
+
+    pipeline = Pipeline(STAGES)
+    with run_metrics.stage("update_books"):
+        pipeline.run(cache=None if args.no_cache else BuildCache(), explain=args.explain)
+    run_metrics.write_report()
+    print(pipeline.report())
+    # Latenze di coda ed esiti per host del client HTTP condiviso
+    if get_engine().stats():
+        print(get_engine().summary())
+    print("✅ books.json aggiornato e differenze registrate con 'addedToday'")
+
+
+if __name__ == "__main__":
+    main()
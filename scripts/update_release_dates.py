@@ -1,14 +1,28 @@
 import os
-import json
 import re
-import time
-import requests
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import quote_plus
 
-BOOKS_PATH = os.path.join("data", "books.json")
+import requests
+
+from http_cache import get_cache
+from catalog_db import open_catalog
+from fetch_engine import get_engine
+from lookup_cache import LookupCache, make_key, HIT, DAY
+import run_metrics
+
 HEADERS = {"User-Agent": "Mozilla/5.0"}
 
+# Ricerche in parallelo: il limite di frequenza globale è il budget di
+# cortesia di www.google.com nel motore di fetch
+DATE_WORKERS = int(os.environ.get("NEWBOOKS_DATE_WORKERS", "4"))
+
+# Ogni quanti libri le date trovate vengono salvate nel catalogo
+CHECKPOINT_EVERY = int(os.environ.get("NEWBOOKS_DATE_CHECKPOINT", "25"))
+
+# Data di importazione (AAAA-MM-GG) messa da genera_books_json ai libri nuovi
+RE_IMPORT_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
 DATE_LABELS = [
     "Originally published",
     "First published",
@@ -19,11 +33,15 @@ DATE_LABELS = [
 ]
 
 def search_google_info_box(title, author):
+    from bs4 import BeautifulSoup
+
     query = quote_plus(f"{title} {author}")
     url = f"https://www.google.com/search?q={query}"
 
+    # Le ricerche già fatte vengono servite dalla cache HTTP su disco;
+    # gli errori di rete e HTTP vengono sollevati al chiamante
+    response = get_cache().get(url, headers=HEADERS, fetch=get_engine().get)
     try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
         soup = BeautifulSoup(response.text, "html.parser")
 
         # Cerca in tutti i div visibili
@@ -48,33 +66,65 @@ def search_google_info_box(title, author):
 
     return None
 
-def main():
-    with open(BOOKS_PATH, "r", encoding="utf-8") as f:
-        books = json.load(f)
-
-    for book in books:
-        title = book.get("title", "")
-        author = book.get("author", "")
-        release_date = book.get("releaseDate", "")
-
-        if release_date and not release_date.startswith("202"):
-            continue
-
-        print(f"[🔍] Cerco data per: {title} di {author}")
+def needs_lookup(book):
+    """True se la data del libro è ancora quella predefinita dell'importazione."""
+    if book.get("dateResolved"):
+        return False
+    release_date = book.get("releaseDate", "")
+    return not release_date or bool(RE_IMPORT_DATE.match(release_date))
+
+def lookup_release_date(book, cache):
+    """Data di uscita del libro, dalla cache degli esiti o da una nuova ricerca."""
+    title = book.get("title", "")
+    author = book.get("author", "")
+    key = make_key(title, author, book.get("id"))
+
+    cached = cache.get(key)
+    if cached is not None:
+        status, value = cached
+        return value if status == HIT else None
+
+    print(f"[🔍] Cerco data per: {title} di {author}")
+    try:
         date_found = search_google_info_box(title, author)
-
-        if date_found:
-            print(f"[📅] Trovata: {date_found}")
-            book["releaseDate"] = date_found
-        else:
-            print(f"[❌] Nessuna data trovata")
-
-        time.sleep(1.5)
-
-    with open(BOOKS_PATH, "w", encoding="utf-8") as f:
-        json.dump(books, f, ensure_ascii=False, indent=2)
-
-    print("[✅] books.json aggiornato con le date trovate da Google.")
+    except requests.exceptions.RequestException as e:
+        # Errori temporanei: nessun esito in cache, si riprova alla prossima esecuzione
+        print(f"[!] Ricerca non riuscita per {title}: {e}")
+        return None
+    if date_found:
+        cache.put_hit(key, date_found)
+    else:
+        cache.put_miss(key)
+    return date_found
+
+def main(workers=DATE_WORKERS, checkpoint_every=CHECKPOINT_EVERY):
+    cache = LookupCache("release_date", hit_ttl=365 * DAY, miss_ttl=7 * DAY, max_miss_ttl=90 * DAY)
+
+    with run_metrics.stage("date_uscita"), open_catalog() as catalog:
+        # Solo i libri con la data di importazione: quelli già risolti vengono
+        # saltati, così un'esecuzione interrotta riprende da dove si era fermata
+        books = [book for book in catalog.books("COALESCE(dateResolved, 0) = 0") if needs_lookup(book)]
+        print(f"[📚] {len(books)} libri senza data di uscita verificata")
+
+        found = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(run_metrics.bind(lambda book: lookup_release_date(book, cache)), books)
+            for done, (book, date_found) in enumerate(zip(books, results), 1):
+                if date_found:
+                    print(f"[📅] Trovata: {date_found} ({book['title']})")
+                    catalog.update(book["id"], releaseDate=date_found, dateResolved=True)
+                    found += 1
+                else:
+                    print(f"[❌] Nessuna data trovata ({book['title']})")
+
+                if done % checkpoint_every == 0:
+                    catalog.commit()
+                    print(f"[💾] Checkpoint: {done}/{len(books)} libri elaborati")
+        run_metrics.incr("records_in", len(books))
+        run_metrics.incr("records_out", found)
+
+    run_metrics.write_report()
+    print(f"[✅] Catalogo aggiornato con {found} date trovate da Google.")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Formato compatto (opzionale) del catalogo per il trasferimento al sito.
+
+Rispetto a books.json:
+- JSON minificato e organizzato per colonne (una lista per campo);
+- categoria e origin codificati come indici in un dizionario di valori;
+- prefissi comuni degli URL raccolti in una tabella di stringhe;
+- parametri di tracciamento rimossi dai link (inventoryId, queryId di IBS,
+  /ref=... e psc di Amazon);
+- campi derivabili omessi: annas_link (ricalcolato da titolo e autore),
+  id quando coincide con quello calcolato dal link, copertina segnaposto,
+  autore segnaposto; i flag interni della pipeline (isNew, dirty, ...) non
+  vengono trasmessi.
+
+`decode` è il decodificatore di riferimento: restituisce i record nella forma
+di `canonical(book)`, cioè quella di books.json senza tracciamento né campi
+interni. Il confronto con il formato attuale è in bench_wire.py.
+
+Uso:
+    python -m scripts wire encode [books.json] [books.wire.json]
+    python -m scripts wire decode books.wire.json [books.json]
+"""
+
+import os
+import sys
+import json
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from book_ids import book_id, AUTORE_NON_DISPONIBILE
+from genera_books_json import build_annas_link
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(SCRIPT_DIR, "..", "data")
+BOOKS_JSON = os.path.join(DATA_DIR, "books.json")
+WIRE_JSON = os.path.join(DATA_DIR, "books.wire.json")
+
+VERSION = 1
+PLACEHOLDER_COVER = "https://via.placeholder.com/300x450?text=Nessuna+Copertina"
+
+# Parametri di tracciamento da eliminare dagli URL
+TRACKING_PARAMS = {"inventoryId", "queryId", "psc", "ref", "ref_", "pd_rd_i", "pd_rd_r", "pf_rd_r", "pf_rd_p"}
+
+# Campi trasmessi, nell'ordine dei record decodificati
+TEXT_FIELDS = ["title", "author", "releaseDate", "work_id"]
+DICT_FIELDS = ["categoria", "origin"]
+URL_FIELDS = ["link_acquisto", "cover"]
+FLAG_FIELDS = ["addedToday"]
+FIELDS = ["title", "author", "categoria", "link_acquisto", "origin", "releaseDate",
+          "cover", "annas_link", "id", "work_id", "addedToday"]
+
+# Un prefisso entra nella tabella solo se condiviso da almeno tante URL
+MIN_PREFIX_USES = 2
+
+
+def strip_tracking(url):
+    """URL senza parametri di tracciamento né segmenti /ref=... (Amazon)."""
+    if not url:
+        return url
+    parts = urlsplit(url)
+    path = parts.path
+    ref = path.find("/ref=")
+    if ref != -1:
+        path = path[:ref]
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                       if k not in TRACKING_PARAMS and not k.startswith("utm_")])
+    return urlunsplit((parts.scheme, parts.netloc, path, query, parts.fragment))
+
+
+def canonical(book):
+    """Il record come lo restituisce il decodificatore: campi pubblici, link puliti."""
+    record = {}
+    for field in FIELDS:
+        if field == "annas_link":
+            record[field] = build_annas_link(record["title"], record["author"])
+        elif field == "id":
+            record[field] = book.get("id") or book_id(record)
+        elif field == "cover":
+            # Copertina mancante e segnaposto si codificano allo stesso modo
+            record[field] = strip_tracking(book.get(field) or "") or PLACEHOLDER_COVER
+        elif field in URL_FIELDS:
+            record[field] = strip_tracking(book.get(field) or "")
+        elif field in FLAG_FIELDS:
+            record[field] = bool(book.get(field))
+        else:
+            record[field] = book.get(field) or ""
+    if not record["work_id"]:
+        del record["work_id"]
+    return record
+
+
+def _prefix_table(urls):
+    """Prefissi di directory (fino a una "/") condivisi da più URL."""
+    counts = Counter()
+    for url in urls:
+        start = url.find("//") + 2 if "//" in url else 0
+        for index in range(start, len(url)):
+            if url[index] == "/":
+                counts[url[:index + 1]] += 1
+    return sorted(prefix for prefix, uses in counts.items() if uses >= MIN_PREFIX_USES)
+
+
+def _longest_prefix(url, table, index):
+    """Indice del prefisso più lungo di `url` presente nella tabella, oppure None."""
+    position = len(url)
+    while True:
+        position = url.rfind("/", 0, position)
+        if position == -1:
+            return None
+        found = index.get(url[:position + 1])
+        if found is not None:
+            return found
+
+
+def encode(books):
+    """Codifica i record di books.json nel formato compatto (un dict pronto per json.dumps)."""
+    records = [canonical(book) for book in books]
+    urls = {field: [record[field] for record in records] for field in URL_FIELDS}
+    urls["cover"] = ["" if url == PLACEHOLDER_COVER else url for url in urls["cover"]]
+
+    table = _prefix_table(url for column in urls.values() for url in column if url)
+    table_index = {prefix: i for i, prefix in enumerate(table)}
+
+    columns = {}
+    for field in TEXT_FIELDS:
+        columns[field] = [record.get(field, "") for record in records]
+    columns["author"] = [None if author == AUTORE_NON_DISPONIBILE else author for author in columns["author"]]
+
+    dictionaries = {}
+    for field in DICT_FIELDS:
+        values = sorted({record[field] for record in records})
+        position = {value: i for i, value in enumerate(values)}
+        dictionaries[field] = values
+        columns[field] = [position[record[field]] for record in records]
+
+    for field, column in urls.items():
+        encoded = []
+        for url in column:
+            prefix = _longest_prefix(url, table, table_index) if url else None
+            encoded.append(url if prefix is None else [prefix, url[len(table[prefix]):]])
+        columns[field] = encoded
+
+    # id solo dove non si ricava dal link (record senza ISBN/ASIN con id storici)
+    columns["id"] = [None if record["id"] == book_id(record) else record["id"] for record in records]
+    for field in FLAG_FIELDS:
+        columns[field] = [i for i, record in enumerate(records) if record[field]]
+
+    return {"v": VERSION, "n": len(records), "prefixes": table, "dict": dictionaries, "cols": columns}
+
+
+def dumps(payload):
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+
+def decode(payload):
+    """Decodificatore di riferimento: dal formato compatto ai record canonici."""
+    if payload.get("v") != VERSION:
+        raise ValueError(f"Versione del formato non supportata: {payload.get('v')}")
+    table = payload["prefixes"]
+    dictionaries = payload["dict"]
+    columns = payload["cols"]
+    flags = {field: set(columns[field]) for field in FLAG_FIELDS}
+
+    def url(value):
+        return table[value[0]] + value[1] if isinstance(value, list) else value
+
+    books = []
+    for i in range(payload["n"]):
+        book = {
+            "title": columns["title"][i],
+            "author": columns["author"][i] if columns["author"][i] is not None else AUTORE_NON_DISPONIBILE,
+            "categoria": dictionaries["categoria"][columns["categoria"][i]],
+            "link_acquisto": url(columns["link_acquisto"][i]),
+            "origin": dictionaries["origin"][columns["origin"][i]],
+            "releaseDate": columns["releaseDate"][i],
+            "cover": url(columns["cover"][i]) or PLACEHOLDER_COVER,
+        }
+        book["annas_link"] = build_annas_link(book["title"], book["author"])
+        book["id"] = columns["id"][i] or book_id(book)
+        if columns["work_id"][i]:
+            book["work_id"] = columns["work_id"][i]
+        for field in FLAG_FIELDS:
+            book[field] = i in flags[field]
+        books.append({field: book[field] for field in FIELDS if field in book})
+    return books
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else "encode"
+    if command == "encode":
+        source = argv[1] if len(argv) > 1 else BOOKS_JSON
+        target = argv[2] if len(argv) > 2 else WIRE_JSON
+        with open(source, "r", encoding="utf-8") as f:
+            books = json.load(f)
+        data = dumps(encode(books))
+        with open(target, "w", encoding="utf-8") as f:
+            f.write(data)
+        print(f"[✓] {len(books)} libri codificati in {target} ({len(data.encode('utf-8'))} byte)")
+    elif command == "decode" and len(argv) > 1:
+        target = argv[2] if len(argv) > 2 else None
+        with open(argv[1], "r", encoding="utf-8") as f:
+            books = decode(json.load(f))
+        data = json.dumps(books, ensure_ascii=False, indent=2)
+        if target:
+            with open(target, "w", encoding="utf-8") as f:
+                f.write(data)
+            print(f"[✓] {len(books)} libri decodificati in {target}")
+        else:
+            print(data)
+    else:
+        print("Uso: python -m scripts wire encode [books.json] [uscita] | decode <file> [uscita]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
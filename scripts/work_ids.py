@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Riconoscimento dei quasi-duplicati e identificatori di opera (`work_id`).
+
+Lo stesso libro può arrivare più volte con id diversi: varianti del
+sottotitolo, punteggiatura, "Autore non disponibile" al posto dell'autore,
+edizioni IT e US con lo stesso titolo. Qui i record vengono raggruppati per
+opera in tempo quasi lineare:
+
+1. chiavi normalizzate: titolo principale (senza sottotitolo, accenti e
+   punteggiatura), numeri del titolo e insieme delle parole dell'autore;
+2. blocking con MinHash LSH sui trigrammi di carattere del titolo principale:
+   solo i record che finiscono nello stesso bucket vengono confrontati;
+3. verifica delle coppie candidate (somiglianza di Jaccard dei trigrammi e
+   autori compatibili) e unione dei gruppi con union-find. I record senza
+   autore si uniscono per ultimi, solo a un gruppo non ambiguo.
+
+Ogni gruppo riceve un `work_id` stabile e un solo record primario
+(`workPrimary`), l'unico esportato in books.json.
+
+Le traduzioni con titolo diverso non sono riconoscibili dal solo testo e
+restano opere distinte.
+"""
+
+import re
+import zlib
+import hashlib
+from collections import defaultdict
+
+from book_ids import normalize_text, normalize_author
+
+PLACEHOLDER_COVER = "https://via.placeholder.com/300x450?text=Nessuna+Copertina"
+
+# MinHash: NUM_PERM permutazioni divise in BANDS bande da NUM_PERM // BANDS righe.
+# Con 8 bande da 4 righe una coppia con somiglianza 0.8 diventa candidata
+# nel 98% dei casi, una con somiglianza 0.3 in meno del 7%.
+NUM_PERM = 32
+BANDS = 8
+SHINGLE_SIZE = 3
+MERSENNE_PRIME = (1 << 61) - 1
+SEED = 20240501
+MAX_BUCKET = 500
+
+# Soglie di verifica delle coppie candidate
+TITLE_SIMILARITY = 0.8
+AUTHOR_OVERLAP = 0.5
+
+RE_SUBTITLE = re.compile(r'\s*(?::|\s-\s|\s–\s|\.\s|\(|\[)')
+RE_NUMBER = re.compile(r'\d+')
+
+
+def main_title(title):
+    """Titolo senza sottotitolo (dopo ':', ' - ', '. ' o parentesi), normalizzato."""
+    text = str(title or '')
+    head = RE_SUBTITLE.split(text, maxsplit=1)[0]
+    return normalize_text(head) or normalize_text(text)
+
+
+def title_numbers(title):
+    """Numeri presenti nel titolo completo (volumi, edizioni, "100 storie", ...)."""
+    return frozenset(RE_NUMBER.findall(str(title or '')))
+
+
+def author_tokens(author):
+    """Parole dell'autore normalizzato; vuoto per il segnaposto."""
+    return frozenset(normalize_author(author).split())
+
+
+def shingles(text):
+    """Trigrammi di carattere (con un separatore ai bordi)."""
+    padded = f" {text} "
+    if len(padded) <= SHINGLE_SIZE:
+        return {padded}
+    return {padded[i:i + SHINGLE_SIZE] for i in range(len(padded) - SHINGLE_SIZE + 1)}
+
+
+def jaccard(a, b):
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    """Firme MinHash con permutazioni (a*x + b) mod p fisse e riproducibili."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=SEED):
+        import numpy as np
+        self.np = np
+        rng = np.random.RandomState(seed)
+        self.a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        np = self.np
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingle_set),
+                             dtype=np.uint64, count=len(shingle_set))
+        # a, b < 2^31 e hash < 2^32: il prodotto resta entro 2^64
+        permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) % MERSENNE_PRIME
+        return permuted.min(axis=1)
+
+
+def candidate_pairs(signatures, bands=BANDS, max_bucket=MAX_BUCKET):
+    """Coppie di indici che condividono almeno un bucket LSH.
+
+    I bucket più grandi di `max_bucket` (trigrammi comuni a troppi titoli
+    brevissimi) vengono ignorati per non ricadere nel confronto quadratico.
+    """
+    rows = len(signatures[0]) // bands if signatures else 0
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for index, signature in enumerate(signatures):
+            buckets[signature[band * rows:(band + 1) * rows].tobytes()].append(index)
+        for members in buckets.values():
+            if len(members) > max_bucket:
+                continue
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    pairs.add((members[i], members[j]))
+    return pairs
+
+
+def same_work(a, b):
+    """Verifica una coppia candidata: titoli simili e autori compatibili."""
+    if a["numbers"] != b["numbers"]:
+        # Vol. 1 e Vol. 2 sono opere diverse anche con titoli quasi uguali
+        return False
+    if jaccard(a["shingles"], b["shingles"]) < TITLE_SIMILARITY:
+        return False
+    authors_a, authors_b = a["authors"], b["authors"]
+    if not authors_a or not authors_b:
+        # Senza autore da un lato serve lo stesso titolo principale
+        return a["title"] == b["title"]
+    overlap = len(authors_a & authors_b) / min(len(authors_a), len(authors_b))
+    return overlap >= AUTHOR_OVERLAP
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+def _completeness(book):
+    """Punteggio per scegliere il record primario di un gruppo."""
+    return (
+        bool(normalize_author(book.get("author"))),
+        bool(book.get("cover")) and book.get("cover") != PLACEHOLDER_COVER,
+        bool(book.get("dateResolved")),
+    )
+
+
+def work_groups(books):
+    """Gruppi di indici di `books` che descrivono la stessa opera."""
+    # I record con le stesse chiavi normalizzate sono già la stessa opera:
+    # l'LSH lavora sulle chiavi distinte, non sui record
+    by_key = defaultdict(list)
+    for index, book in enumerate(books):
+        title = book.get("title")
+        by_key[(main_title(title), title_numbers(title), author_tokens(book.get("author")))].append(index)
+    keys = [{"title": title, "numbers": numbers, "shingles": shingles(title), "authors": authors}
+            for title, numbers, authors in by_key]
+    members = list(by_key.values())
+    if not keys:
+        return []
+
+    hasher = MinHasher()
+    signatures = [hasher.signature(key["shingles"]) for key in keys]
+
+    # Prima si uniscono i record con autore; quelli senza autore si agganciano
+    # dopo, e solo se corrispondono a un unico gruppo: altrimenti farebbero da
+    # ponte tra opere omonime di autori diversi
+    union_find = UnionFind(len(keys))
+    anonymous = defaultdict(set)
+    for i, j in candidate_pairs(signatures):
+        if not same_work(keys[i], keys[j]):
+            continue
+        if keys[i]["authors"] and keys[j]["authors"]:
+            union_find.union(i, j)
+        elif keys[i]["authors"]:
+            anonymous[j].add(i)
+        elif keys[j]["authors"]:
+            anonymous[i].add(j)
+    for key_index, partners in anonymous.items():
+        roots = {union_find.find(partner) for partner in partners}
+        if len(roots) == 1:
+            union_find.union(key_index, roots.pop())
+
+    groups = defaultdict(list)
+    for key_index, indexes in enumerate(members):
+        groups[union_find.find(key_index)].extend(indexes)
+    return [sorted(indexes) for indexes in groups.values()]
+
+
+def assign_work_ids(books):
+    """Imposta `work_id` e `workPrimary` su ogni libro; restituisce il numero di opere.
+
+    Il work_id deriva dall'id più piccolo del gruppo, quindi resta stabile
+    finché quel record è nel catalogo. Il primario è il record più completo
+    (autore, copertina, data verificata), a parità il primo nel catalogo.
+    """
+    groups = work_groups(books)
+    for members in groups:
+        anchor = min(books[i]["id"] for i in members)
+        work_id = "work:" + hashlib.sha1(anchor.encode('utf-8')).hexdigest()[:16]
+        primary = max(members, key=lambda i: (_completeness(books[i]), -i))
+        for index in members:
+            books[index]["work_id"] = work_id
+            books[index]["workPrimary"] = index == primary
+    return len(groups)
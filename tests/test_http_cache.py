@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+"""
+Test della cache HTTP contro un server locale (http.server) che sostituisce
+i siti reali: TTL, rivalidazione con 304, eviction LRU e versione del parser.
+
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from http_cache import HttpCache, parser_version  # noqa: E402
+
+
+class StandInServer:
+    """Server locale con pagine fisse, ETag e conteggio delle richieste."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.requests.append((self.path, self.headers.get("If-None-Match")))
+                body = server.pages.get(self.path)
+                if body is None:
+                    self._reply(404, b"")
+                    return
+                etag = f'"{len(body)}-{hash(body) & 0xffff}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._reply(304, b"", etag)
+                    return
+                self._reply(200, body, etag)
+
+            def _reply(self, status, body, etag=None):
+                self.send_response(status)
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_port}{path}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def fetch(url, headers=None):
+    return requests.get(url, headers=headers, timeout=5)
+
+
+class HttpCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix="newbooks-http-cache-")
+        self.server = StandInServer({
+            "/a": b"<html>a</html>" * 10,
+            "/b": b"<html>b</html>" * 10,
+            "/c": b"<html>c</html>" * 10,
+        })
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_ttl_hit_skips_network(self):
+        cache = HttpCache(self.dir)
+        first = cache.get(self.server.url("/a"), fetch=fetch, ttl=3600)
+        second = cache.get(self.server.url("/a"), fetch=fetch, ttl=3600)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(len(self.server.requests), 1)
+        cache.close()
+
+    def test_expired_page_is_revalidated_with_304(self):
+        cache = HttpCache(self.dir)
+        first = cache.get(self.server.url("/a"), fetch=fetch, ttl=0)
+        second = cache.get(self.server.url("/a"), fetch=fetch, ttl=0)
+        self.assertTrue(second.revalidated)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second.body_hash, first.body_hash)
+        self.assertIsNotNone(self.server.requests[1][1], "la seconda richiesta deve essere condizionale")
+        cache.close()
+
+    def test_changed_page_is_downloaded_again(self):
+        cache = HttpCache(self.dir)
+        first = cache.get(self.server.url("/a"), fetch=fetch, ttl=0)
+        self.server.pages["/a"] = b"<html>nuova</html>"
+        second = cache.get(self.server.url("/a"), fetch=fetch, ttl=0)
+        self.assertFalse(second.from_cache)
+        self.assertNotEqual(second.body_hash, first.body_hash)
+        cache.close()
+
+    def test_lru_eviction_keeps_recently_used_pages(self):
+        size = len(self.server.pages["/a"])
+        cache = HttpCache(self.dir, max_bytes=2 * size)
+        cache.get(self.server.url("/a"), fetch=fetch, ttl=3600)
+        cache.get(self.server.url("/b"), fetch=fetch, ttl=3600)
+        cache.get(self.server.url("/a"), fetch=fetch, ttl=3600)  # /a usata più di recente di /b
+        cache.get(self.server.url("/c"), fetch=fetch, ttl=3600)
+        self.assertTrue(cache.get(self.server.url("/a"), fetch=fetch, ttl=3600).from_cache)
+        self.assertFalse(cache.get(self.server.url("/b"), fetch=fetch, ttl=3600).from_cache)
+        cache.close()
+
+    def test_error_responses_are_not_stored(self):
+        cache = HttpCache(self.dir)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            cache.get(self.server.url("/mancante"), fetch=fetch, ttl=3600)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            cache.get(self.server.url("/mancante"), fetch=fetch, ttl=3600)
+        self.assertEqual(len(self.server.requests), 2)
+        cache.close()
+
+    def test_parsed_records_depend_on_parser_version(self):
+        cache = HttpCache(self.dir)
+        page = cache.get(self.server.url("/a"), fetch=fetch, ttl=3600)
+        cache.store_parsed(page.url, page.body_hash, [{"title": "a"}], parser="v1")
+        self.assertEqual(cache.parsed(page.url, page.body_hash, "v1"), [{"title": "a"}])
+        self.assertIsNone(cache.parsed(page.url, page.body_hash, "v2"))
+        self.assertIsNone(cache.parsed(page.url, "altro-corpo", "v1"))
+        cache.close()
+
+    def test_parser_version_follows_module_source(self):
+        self.assertEqual(parser_version(("ibs_parser",)), parser_version(("ibs_parser",)))
+        self.assertNotEqual(parser_version(("ibs_parser",)), parser_version(("amazon_parser",)))
+
+
+if __name__ == "__main__":
+    unittest.main()